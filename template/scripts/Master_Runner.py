@@ -18,11 +18,22 @@ import pandas as pd
 sys.path.append("scripts")
 #sys.path.append("D:/Clients/Projects/odot/Tasks/Contingency526/nonmotorized/scripts")
 from Properties import Properties
+import tripMatrices
+import spatialIndex
+import networkSnapshot
+import zoneCrosswalk
+import columnarCache
+import omxWriter
+import tapSkims
+import accessPaths
+import skimChange
+import vdfData
 import warnings
 import tables
 
 import openmatrix as omx
 import numpy
+import scipy.sparse
 warnings.simplefilter('ignore', tables.NaturalNameWarning)
 
 ############################################################
@@ -38,6 +49,7 @@ def startVisum():
 def loadVersion(Visum, fileName):
   print("load version file: " + os.getcwd() + "/" + fileName)
   Visum.LoadVersion(os.getcwd() + "/" + fileName)
+  networkSnapshot.clear(Visum)
   pathNo = [8,69,2,37,12]
   for i in range(0,len(pathNo)):
     Visum.SetPath(pathNo[i], os.getcwd())
@@ -49,6 +61,7 @@ def saveVersion(Visum, fileName):
 
 def closeVisum(Visum):
   print("close Visum")
+  networkSnapshot.clear(Visum)
   Visum = 0
 
 def loadProcedure(Visum,parFileName,execute=True):
@@ -56,6 +69,7 @@ def loadProcedure(Visum,parFileName,execute=True):
   Visum.Procedures.Open(parFileName)
   if execute:
     Visum.Procedures.Execute()
+    networkSnapshot.clear(Visum)
 
 def removeAllMatrices(Visum):
   matrixIds = Visum.Net.Matrices.GetMultiAttValues("No")
@@ -63,28 +77,54 @@ def removeAllMatrices(Visum):
   for Id in matrixIds.keys():
     Visum.Net.RemoveMatrix(Visum.Net.Matrices.ItemByKey(Id[1]))
 
+FEET_PER_MILE = 5280.0 #network coordinates are in feet
+RUN_TIME = time.strftime("%Y-%m-%d %H:%M:%S") #start of this Master_Runner step
+
 def calcDist(x1,x2,y1,y2):
   return(((x1-x2)**2 + (y1-y2)**2)**0.5)
 
-def getClosestN(from_x,from_y,to_ids,to_xs,to_ys,n):
-  nearest = [(-1,999999999)]*n #list of tuples of node id and distance
-  for k in range(len(to_ids)):
-    dist = calcDist(from_x, to_xs[k], from_y, to_ys[k])
-    if dist < max([near[1] for near in nearest]):
-      nearest[n-1] = (to_ids[k],dist)
-      nearest.sort(key=lambda x: x[1])
-  return([near[0] for near in nearest])
+def getSpatialCache():
+  #disk cache of candidate nodes and neighbour lists, off if no folder is set
+  properties = Properties()
+  properties.loadPropertyFile("config\orramp.properties")
+  return(spatialIndex.NeighbourCache(properties.get('Spatial.Cache.Folder', '../spatialCache').strip(),
+    int(properties.get('Spatial.Cache.Max.Entries', '16')), float(properties.get('Spatial.Cache.Keep.Days', '30'))))
+
+def createZoneCrosswalk(Visum):
+  #maz/seqmaz/taz crosswalk from the zones of the maz version, saved for later steps
+  properties = Properties()
+  properties.loadPropertyFile("config\orramp.properties")
+  crosswalkFileName = properties.get('Zone.Crosswalk.File', 'outputs/other/zone_crosswalk.npz')
+
+  print("create zone crosswalk")
+  crosswalk = zoneCrosswalk.ZoneCrosswalk(networkSnapshot.GetMulti(Visum, "Zones", "NO"),
+    networkSnapshot.GetMulti(Visum, "Zones", "SEQMAZ"), networkSnapshot.GetMulti(Visum, "Zones", "TAZ"))
+  crosswalk.save(crosswalkFileName)
+  return(crosswalk)
+
+def loadZoneCrosswalk(Visum):
+  #saved crosswalk, or from the mainzones (mazs) if maz_initial has not been run
+  properties = Properties()
+  properties.loadPropertyFile("config\orramp.properties")
+  crosswalkFileName = properties.get('Zone.Crosswalk.File', 'outputs/other/zone_crosswalk.npz')
+
+  if os.path.exists(crosswalkFileName):
+    return(zoneCrosswalk.load(crosswalkFileName))
+  return(zoneCrosswalk.ZoneCrosswalk(networkSnapshot.GetMulti(Visum, "MainZones", "NO"),
+    networkSnapshot.GetMulti(Visum, "MainZones", "SEQMAZ"), networkSnapshot.GetMulti(Visum, "MainZones", "TAZ")))
 
 def getCandidateNodesForMAZConnectors(Visum):
 
-  nodeNo       =  VisumPy.helpers.GetMulti(Visum.Net.Nodes, "No", False)
-  nodeTSs      =  VisumPy.helpers.GetMulti(Visum.Net.Nodes, "Concatenate:OutLinks\TSysSet", False)
-  nodeX        =  VisumPy.helpers.GetMulti(Visum.Net.Nodes, "XCoord", False)
-  nodeY        =  VisumPy.helpers.GetMulti(Visum.Net.Nodes, "YCoord", False)
-  nodeCandidate=  [False] * len(nodeY) #will be calculated below
+  nodeNo       =  networkSnapshot.GetMulti(Visum, "Nodes", "No")
+  nodeX        =  networkSnapshot.GetMulti(Visum, "Nodes", "XCoord")
+  nodeY        =  networkSnapshot.GetMulti(Visum, "Nodes", "YCoord")
 
-  for i in range(len(nodeNo)):
-    nodeCandidate[i] = True if ('Walk' in set(nodeTSs[i].split(","))) or ('Bike' in set(nodeTSs[i].split(","))) else False
+  #candidate if any out link allows Walk or Bike
+  rowPtr, nodeTSs = networkSnapshot.snapshot(Visum).ragged("Nodes", "Concatenate:OutLinks\TSysSet")
+  def candidates():
+    rows = numpy.repeat(numpy.arange(len(nodeNo)), numpy.diff(rowPtr))
+    return({"candidate":numpy.bincount(rows, weights=numpy.isin(nodeTSs, ['Walk','Bike']), minlength=len(nodeNo)) > 0})
+  nodeCandidate = getSpatialCache().get("mazConnectorNodes", [nodeNo, rowPtr, nodeTSs], candidates)["candidate"]
 
   nodeNo_out = []
   nodeX_out =  []
@@ -101,18 +141,18 @@ def getCandidateNodesForMAZConnectors(Visum):
 
 def getCandidateNodesForConnectors(Visum, facTypeList):
 
-  nodeNo       =  VisumPy.helpers.GetMulti(Visum.Net.Nodes, "No", False)
-  nodeFTs      =  VisumPy.helpers.GetMulti(Visum.Net.Nodes, "Concatenate:OutLinks\PLANNO", False)
-  nodeX        =  VisumPy.helpers.GetMulti(Visum.Net.Nodes, "XCoord", False)
-  nodeY        =  VisumPy.helpers.GetMulti(Visum.Net.Nodes, "YCoord", False)
-  nodeCandidate=  [False] * len(nodeY) #will be calculated below
+  nodeNo       =  networkSnapshot.GetMulti(Visum, "Nodes", "No")
+  nodeX        =  networkSnapshot.GetMulti(Visum, "Nodes", "XCoord")
+  nodeY        =  networkSnapshot.GetMulti(Visum, "Nodes", "YCoord")
 
-  for i in range(len(nodeNo)):
-    for j in nodeFTs[i].split(","):
-      if j not in facTypeList:
-        nodeCandidate[i] = False
-      else:
-        nodeCandidate[i] = True
+  #candidate if the last out link facility type is in the list
+  rowPtr, nodeFTs = networkSnapshot.snapshot(Visum).ragged("Nodes", "Concatenate:OutLinks\PLANNO")
+  def candidates():
+    hasLinks = numpy.diff(rowPtr) > 0
+    nodeCandidate = numpy.zeros(len(nodeNo), dtype=bool)
+    nodeCandidate[hasLinks] = numpy.isin(nodeFTs[rowPtr[1:][hasLinks]-1], facTypeList)
+    return({"candidate":nodeCandidate})
+  nodeCandidate = getSpatialCache().get("connectorNodes", [nodeNo, rowPtr, nodeFTs, facTypeList], candidates)["candidate"]
 
   nodeNo_out = []
   nodeX_out =  []
@@ -126,52 +166,144 @@ def getCandidateNodesForConnectors(Visum, facTypeList):
 
   return(nodeNo_out, nodeX_out, nodeY_out)
 
+def writeNetFile(fileName, tables):
+  #write a Visum network file with one table per (name, columns, rows) for an additive read
+  f = open(fileName, 'w')
+  f.write("$VISION\n* Southern Oregon ABM zone system\n*\n")
+  f.write("$VERSION:VERSNR;FILETYPE;LANGUAGE;UNIT\n10.000;Net;ENG;MI\n\n")
+  for tableName, columns, rows in tables:
+    f.write("$" + tableName + ":" + ";".join(columns) + "\n")
+    for row in rows:
+      f.write(";".join(map(str,row)) + "\n")
+    f.write("\n")
+  f.close()
+
+def loadNetFile(Visum, fileName):
+  print("read network file additive: " + os.getcwd() + "/" + fileName)
+  Visum.IO.LoadNet(os.getcwd() + "/" + fileName, True)
+  networkSnapshot.clear(Visum)
+
+def getConnectorTSysSet(Visum):
+  #transport systems Visum opens new connectors to, i.e. all PrT and PuT-Walk ones
+  tSysCodes = networkSnapshot.GetMulti(Visum, "TSystems", "Code")
+  tSysTypes = networkSnapshot.GetMulti(Visum, "TSystems", "Type")
+  return(",".join(code for code, tSysType in zip(tSysCodes, tSysTypes) if str(tSysType).upper() in ["PRT","PUTWALK"]))
+
+def addZonesAndConnectors(Visum, zoneRows, connectors, netFileName):
+  #add zones (NO,XCOORD,YCOORD) and two-way connectors (zone,node) with one network file read
+  #connectors get the direct zone to node distance (miles) and default transport systems, as AddConnector
+  tables = []
+  if len(zoneRows) > 0:
+    tables.append(("ZONE", ["NO","XCOORD","YCOORD"], zoneRows))
+  if len(connectors) > 0:
+    zoneXY = dict(zip(map(int, networkSnapshot.GetMulti(Visum, "Zones", "No")),
+      zip(networkSnapshot.GetMulti(Visum, "Zones", "Xcoord"), networkSnapshot.GetMulti(Visum, "Zones", "Ycoord"))))
+    zoneXY.update((int(no), (x, y)) for no, x, y in zoneRows)
+    nodeXY = dict(zip(map(int, networkSnapshot.GetMulti(Visum, "Nodes", "No")),
+      zip(networkSnapshot.GetMulti(Visum, "Nodes", "XCoord"), networkSnapshot.GetMulti(Visum, "Nodes", "YCoord"))))
+    tSysSet = getConnectorTSysSet(Visum)
+    conRows = []
+    for zone, node in connectors:
+      lenMiles = calcDist(zoneXY[zone][0], nodeXY[node][0], zoneXY[zone][1], nodeXY[node][1]) / FEET_PER_MILE
+      conRows.append((zone, node, "O", "%.6f" % lenMiles, tSysSet))
+      conRows.append((zone, node, "D", "%.6f" % lenMiles, tSysSet))
+    tables.append(("CONNECTOR", ["ZONENO","NODENO","DIRECTION","LENGTH","TSYSSET"], conRows))
+  if len(tables) > 0:
+    writeNetFile(netFileName, tables)
+    loadNetFile(Visum, netFileName)
+    checkConnectors(Visum, connectors)
+
+def checkConnectors(Visum, connectors):
+  #opt-in check of the connectors read from the network file: re-add a sample of them with
+  #AddConnector and stop on any length or transport system difference, so a run only goes on
+  #with connectors identical to the AddConnector ones in these attributes
+  properties = Properties()
+  properties.loadPropertyFile("config\orramp.properties")
+  sampleSize = int(properties.get('Connector.Check.Sample', 0))
+  if sampleSize <= 0 or len(connectors) == 0:
+    return
+  print("check " + str(min(sampleSize, len(connectors))) + " connectors against AddConnector")
+  differences = []
+  for zone, node in connectors[::max(len(connectors) // sampleSize, 1)][:sampleSize]:
+    zoneObj = Visum.Net.Zones.ItemByKey(zone)
+    nodeObj = Visum.Net.Nodes.ItemByKey(node)
+    conObjs = [Visum.Net.Connectors.SourceItemByKey(zoneObj, nodeObj), Visum.Net.Connectors.DestItemByKey(nodeObj, zoneObj)]
+    written = [(c.AttValue("Length"), c.AttValue("TSysSet")) for c in conObjs]
+    Visum.Net.RemoveConnector(conObjs[0])
+    Visum.Net.AddConnector(zoneObj, nodeObj)
+    conObjs = [Visum.Net.Connectors.SourceItemByKey(zoneObj, nodeObj), Visum.Net.Connectors.DestItemByKey(nodeObj, zoneObj)]
+    added = [(c.AttValue("Length"), c.AttValue("TSysSet")) for c in conObjs]
+    for (wLen, wTSys), (aLen, aTSys) in zip(written, added):
+      if abs(wLen - aLen) > 0.001 or set(wTSys.split(",")) != set(aTSys.split(",")):
+        differences.append("zone=" + str(zone) + " node=" + str(node) + ": length " +
+          str(wLen) + " vs " + str(aLen) + ", tsys " + wTSys + " vs " + aTSys)
+  networkSnapshot.clear(Visum)
+  if len(differences) > 0:
+    raise ValueError("connectors differ from AddConnector:\n" + "\n".join(differences))
+
+def getConnectorKeys(Visum):
+  zoneNos = networkSnapshot.GetMulti(Visum, "Connectors", "ZoneNo")
+  nodeNos = networkSnapshot.GetMulti(Visum, "Connectors", "NodeNo")
+  return(set(zip(map(int,zoneNos), map(int,nodeNos))))
+
+def setConnectorTimes(Visum, connectors, tSysList, speedMph):
+  #set T0 by transport system from length for the given (zone,node) connectors, both directions
+  connectors = set(connectors)
+  zoneNos = networkSnapshot.GetMulti(Visum, "Connectors", "ZoneNo")
+  nodeNos = networkSnapshot.GetMulti(Visum, "Connectors", "NodeNo")
+  lenMiles = numpy.array(networkSnapshot.GetMulti(Visum, "Connectors", "Length"), dtype=float)
+  isNew = numpy.array([(int(z),int(n)) in connectors for z, n in zip(zoneNos, nodeNos)], dtype=bool)
+  t0 = lenMiles * (60.0 / speedMph) * 60
+  for tSys in tSysList:
+    attName = "T0_TSys(" + tSys + ")"
+    curT0 = numpy.array(networkSnapshot.GetMulti(Visum, "Connectors", attName), dtype=float)
+    networkSnapshot.SetMulti(Visum, "Connectors", attName, numpy.where(isNew, t0, curT0))
+
 def codeTAZConnectors(Visum):
 
   #TAZ connector speeds and delete connector if too close distance
   defaultSpeed = 25
   tooCloseDistFeet = 500
   internalTazStart = 100
+  autoModes = ['SOV','SOVToll','HOV2','HOV2Toll','HOV3','HOV3Toll','Truck'] #,'TruckToll'
 
   #get candidate nodes
   print('get candidate nodes')
   nodeNo, nodeX, nodeY = getCandidateNodesForConnectors(Visum,['3','4','5','6'])
+  nodeIndex = spatialIndex.SpatialIndex(nodeNo, nodeX, nodeY, getSpatialCache())
 
   #assign to nearest and create connector
   print('assign tazs to nearest nodes and create connectors')
   Visum.Graphic.StopDrawing=True
-  zoneIds = Visum.Net.Zones.GetMultiAttValues("No")
-  zoneXs = Visum.Net.Zones.GetMultiAttValues("Xcoord")
-  zoneYs = Visum.Net.Zones.GetMultiAttValues("Ycoord")
-
+  zoneIds = networkSnapshot.GetMulti(Visum, "Zones", "No")
+  zoneXs = networkSnapshot.GetMulti(Visum, "Zones", "Xcoord")
+  zoneYs = networkSnapshot.GetMulti(Visum, "Zones", "Ycoord")
+  zoneNearest = nodeIndex.nearest(zoneXs, zoneYs, 4)
+
+  #existing connectors are left as is
+  existingCons = getConnectorKeys(Visum)
+  newCons = []
   for i in range(len(zoneIds)):
-    if zoneIds[i][1] >= internalTazStart:
-      zoneObj = Visum.Net.Zones.ItemByKey(zoneIds[i][1])
-      nodeids = getClosestN(zoneXs[i][1], zoneYs[i][1], nodeNo, nodeX, nodeY, 4)
-      for j in range(len(nodeids)):
-        nodeObj = Visum.Net.Nodes.ItemByKey(nodeids[j])
-        if not Visum.Net.Connectors.ExistsByKey(nodeObj, zoneObj):
-
-          conObj = Visum.Net.AddConnector(zoneObj, nodeObj)
-          lenMiles = conObj.AttValue("Length")
-          for mode in ['SOV','SOVToll','HOV2','HOV2Toll','HOV3','HOV3Toll','Truck']: #,'TruckToll'
-            conObj.SetAttValue("T0_TSys(" + mode + ")",lenMiles * (60.0 / defaultSpeed) * 60)
-
-          conObj = Visum.Net.Connectors.DestItemByKey(nodeObj, zoneObj)
-          lenMiles = conObj.AttValue("Length")
-          for mode in ['SOV','SOVToll','HOV2','HOV2Toll','HOV3','HOV3Toll','Truck']: #,'TruckToll'
-            conObj.SetAttValue("T0_TSys(" + mode + ")",lenMiles * (60.0 / defaultSpeed) * 60)
+    if zoneIds[i] >= internalTazStart:
+      for nid in zoneNearest[i]:
+        con = (int(zoneIds[i]), int(nid))
+        if nid >= 0 and con not in existingCons:
+          newCons.append(con)
+  addZonesAndConnectors(Visum, [], newCons, "outputs/networks/TAZ_Connectors.net")
+  setConnectorTimes(Visum, newCons, autoModes, defaultSpeed)
 
   #delete connectors if too close to one another
   print('delete connectors if too close to one another')
+  zoneIds = networkSnapshot.GetMulti(Visum, "Zones", "No")
+  zoneNodeNos = networkSnapshot.GetMulti(Visum, "Zones", r"Concatenate:OrigConnectors\Node\No")
+  zoneNodeXs = networkSnapshot.GetMulti(Visum, "Zones", r"Concatenate:OrigConnectors\Node\XCoord")
+  zoneNodeYs = networkSnapshot.GetMulti(Visum, "Zones", r"Concatenate:OrigConnectors\Node\YCoord")
   for i in range(len(zoneIds)):
-    zoneObj = Visum.Net.Zones.ItemByKey(zoneIds[i][1])
-    nodeNos = zoneObj.AttValue(r"Concatenate:OrigConnectors\Node\No")
-    nodeXs = zoneObj.AttValue(r"Concatenate:OrigConnectors\Node\XCoord")
-    nodeYs = zoneObj.AttValue(r"Concatenate:OrigConnectors\Node\YCoord")
-    nodeNos = list(map(int,nodeNos.split(",")))
-    nodeXs = list(map(float,nodeXs.split(",")))
-    nodeYs = list(map(float,nodeYs.split(",")))
+    if zoneNodeNos[i] == "":
+      continue
+    nodeNos = list(map(int,zoneNodeNos[i].split(",")))
+    nodeXs = list(map(float,zoneNodeXs[i].split(",")))
+    nodeYs = list(map(float,zoneNodeYs[i].split(",")))
 
     for j in range(len(nodeNos)):
       if j == 0:
@@ -179,11 +311,13 @@ def codeTAZConnectors(Visum):
         previous_y = nodeYs[j]
       else:
         if calcDist(nodeXs[j],previous_x,nodeYs[j],previous_y) < tooCloseDistFeet:
+          zoneObj = Visum.Net.Zones.ItemByKey(int(zoneIds[i]))
           nodeObj = Visum.Net.Nodes.ItemByKey(nodeNos[j])
           conObj = Visum.Net.Connectors.SourceItemByKey(zoneObj, nodeObj)
           Visum.Net.RemoveConnector(conObj)
         previous_x = nodeXs[j]
         previous_y = nodeYs[j]
+  networkSnapshot.clear(Visum)
 
   Visum.Graphic.StopDrawing=False
 
@@ -196,14 +330,14 @@ def switchZoneSystem(Visum, zoneSystem):
 
   #remove TAZs
   print("remove tazs")
-  zoneIds = Visum.Net.Zones.GetMultiAttValues("No")
-  for Id in zoneIds:
-    Visum.Net.RemoveZone(Visum.Net.Zones.ItemByKey(Id[1]))
+  for zoneObj in Visum.Net.Zones.GetAll:
+    Visum.Net.RemoveZone(zoneObj)
 
   print("remove taz UDAs")
   for i in Visum.Net.Zones.Attributes.GetAll:
     if i.category=="User-defined attributes":
       Visum.Net.Zones.DeleteUserDefinedAttribute(i.Name)
+  networkSnapshot.clear(Visum)
 
   #mazs from mainzones to tazs
   if zoneSystem=="maz":
@@ -217,33 +351,33 @@ def switchZoneSystem(Visum, zoneSystem):
 
     #get candidate nodes and their attributes
     nodeNo, nodeX, nodeY = getCandidateNodesForMAZConnectors(Visum)
+    nodeIndex = spatialIndex.SpatialIndex(nodeNo, nodeX, nodeY, getSpatialCache())
 
-    mazIds = Visum.Net.MainZones.GetMultiAttValues("No")
-    mazXs = Visum.Net.MainZones.GetMultiAttValues("Xcoord")
-    mazYs = Visum.Net.MainZones.GetMultiAttValues("Ycoord")
+    mazIds = networkSnapshot.GetMulti(Visum, "MainZones", "No")
+    mazXs = networkSnapshot.GetMulti(Visum, "MainZones", "Xcoord")
+    mazYs = networkSnapshot.GetMulti(Visum, "MainZones", "Ycoord")
+    mazNearest = nodeIndex.nearest(mazXs, mazYs, 4)
 
+    #Add zones and connectors - note only distance used later for skimming
     print("create zones, add connectors")
+    zoneRows = []
+    connectors = []
     for i in range(len(mazIds)):
-      zoneObj = Visum.Net.AddZone(mazIds[i][1])
-      zoneObj.SetAttValue("Xcoord",mazXs[i][1])
-      zoneObj.SetAttValue("Ycoord",mazYs[i][1])
-
-      #Add connectors - note only distance used later for skimming
-      nodeids = getClosestN(mazXs[i][1], mazYs[i][1], nodeNo, nodeX, nodeY, 4)
-      for nid in nodeids:
-        nodeObj = Visum.Net.Nodes.ItemByKey(nid)
-        if not Visum.Net.Connectors.ExistsByKey(nodeObj, zoneObj):
-          Visum.Net.AddConnector(zoneObj, nodeObj)
+      zoneRows.append((int(mazIds[i]), mazXs[i], mazYs[i]))
+      for nid in mazNearest[i]:
+        if nid >= 0:
+          connectors.append((int(mazIds[i]), int(nid)))
+    addZonesAndConnectors(Visum, zoneRows, connectors, "outputs/networks/MAZ_Zone_System.net")
 
     print("copy UDAs and polygons")
     for i in Visum.Net.MainZones.Attributes.GetAll:
       if i.category=="User-defined attributes":
-        attData = VisumPy.helpers.GetMulti(Visum.Net.MainZones, i.Name)
-        VisumPy.helpers.SetMulti(Visum.Net.Zones, i.Name, attData)
+        attData = networkSnapshot.GetMulti(Visum, "MainZones", i.Name)
+        networkSnapshot.SetMulti(Visum, "Zones", i.Name, attData)
 
-      #create zone polygon as well
-      attData = VisumPy.helpers.GetMulti(Visum.Net.MainZones, "WKTSurface")
-      VisumPy.helpers.SetMulti(Visum.Net.Zones, "WKTSurface", attData)
+    #create zone polygon as well
+    attData = networkSnapshot.GetMulti(Visum, "MainZones", "WKTSurface")
+    networkSnapshot.SetMulti(Visum, "Zones", "WKTSurface", attData)
 
   #taps from stop areas to tazs
   if zoneSystem=="tap":
@@ -255,58 +389,49 @@ def switchZoneSystem(Visum, zoneSystem):
       if i.category=="User-defined attributes":
         Visum.Net.Zones.AddUserDefinedAttribute(i.Name,i.Name,i.Name,i.ValueType) #1=int, 2=float, 5=text
 
-    tapIds = Visum.Net.StopAreas.GetMultiAttValues("No")
-    tapXs = Visum.Net.StopAreas.GetMultiAttValues("Xcoord")
-    tapYs = Visum.Net.StopAreas.GetMultiAttValues("Ycoord")
-    tapNodes = Visum.Net.StopAreas.GetMultiAttValues("NodeNo")
+    tapIds = networkSnapshot.GetMulti(Visum, "StopAreas", "No")
+    tapXs = networkSnapshot.GetMulti(Visum, "StopAreas", "Xcoord")
+    tapYs = networkSnapshot.GetMulti(Visum, "StopAreas", "Ycoord")
+    tapNodes = networkSnapshot.GetMulti(Visum, "StopAreas", "NodeNo")
 
-    print("create zones, add connectors, copy over UDAs, copy over polygons")
+    print("create zones, add connectors")
+    zoneRows = []
+    connectors = []
     for i in range(len(tapIds)):
-      zoneObj = Visum.Net.AddZone(tapIds[i][1])
-      zoneObj.SetAttValue("Xcoord",tapXs[i][1])
-      zoneObj.SetAttValue("Ycoord",tapYs[i][1])
-
-      #Add connector
-      nodeObj = Visum.Net.Nodes.ItemByKey(tapNodes[i][1])
-      if not Visum.Net.Connectors.ExistsByKey(nodeObj, zoneObj):
-        conObj = Visum.Net.AddConnector(zoneObj, nodeObj)
-        lenMiles = conObj.AttValue("Length")
-        conObj.SetAttValue("T0_TSys(TransitWalk)",lenMiles * (60.0 / defaultWalkSpeed) * 60)
-
-        conObj = Visum.Net.Connectors.DestItemByKey(nodeObj, zoneObj)
-        lenMiles = conObj.AttValue("Length")
-        conObj.SetAttValue("T0_TSys(TransitWalk)",lenMiles * (60.0 / defaultWalkSpeed) * 60)
-
-      #set attributes
-      tapObj = Visum.Net.StopAreas.ItemByKey(tapIds[i][1])
-      for i in Visum.Net.StopAreas.Attributes.GetAll:
-        if i.category=="User-defined attributes":
-          zoneObj.SetAttValue(i.Name,tapObj.AttValue(i.Name))
+      zoneRows.append((int(tapIds[i]), tapXs[i], tapYs[i]))
+      connectors.append((int(tapIds[i]), int(tapNodes[i])))
+    addZonesAndConnectors(Visum, zoneRows, connectors, "outputs/networks/TAP_Zone_System.net")
+    setConnectorTimes(Visum, connectors, ['TransitWalk'], defaultWalkSpeed)
+
+    #set attributes - zones and stop areas are both keyed by tap number
+    print("copy over UDAs")
+    for i in Visum.Net.StopAreas.Attributes.GetAll:
+      if i.category=="User-defined attributes":
+        attData = networkSnapshot.GetMulti(Visum, "StopAreas", i.Name)
+        networkSnapshot.SetMulti(Visum, "Zones", i.Name, attData)
 
   Visum.Graphic.StopDrawing=False
 
 def assignStopAreasToAccessNodes(Visum):
   print("assign stop areas to access nodes")
   nodeNo, nodeX, nodeY = getCandidateNodesForConnectors(Visum,['3','4','5','6','7'])
+  nodeIndex = spatialIndex.SpatialIndex(nodeNo, nodeX, nodeY, getSpatialCache())
 
-  tapIds = Visum.Net.StopAreas.GetMultiAttValues("No")
-  tapXs = Visum.Net.StopAreas.GetMultiAttValues("Xcoord")
-  tapYs = Visum.Net.StopAreas.GetMultiAttValues("Ycoord")
-
-  for i in range(len(tapIds)):
-    nodeids = getClosestN(tapXs[i][1], tapYs[i][1], nodeNo, nodeX, nodeY, 1)
-    Visum.Net.StopAreas.ItemByKey(tapIds[i][1]).SetAttValue("NodeNo",nodeids[0])
+  tapXs = networkSnapshot.GetMulti(Visum, "StopAreas", "Xcoord")
+  tapYs = networkSnapshot.GetMulti(Visum, "StopAreas", "Ycoord")
+  tapNearest = nodeIndex.nearest(tapXs, tapYs, 1)
+  networkSnapshot.SetMulti(Visum, "StopAreas", "NodeNo", tapNearest[:,0].tolist())
 
 def createTapLines(Visum, fileName):
   print("create tap lines file")
-  tapIds = Visum.Net.StopAreas.GetMultiAttValues("No")
-  tapLines = Visum.Net.StopAreas.GetMultiAttValues("CONCATENATE:STOPPOINTS\CONCATENATE:LINEROUTES\LINENAME")
+  tapIds = networkSnapshot.GetMulti(Visum, "StopAreas", "No")
+  tapLines = networkSnapshot.GetMulti(Visum, "StopAreas", "CONCATENATE:STOPPOINTS\CONCATENATE:LINEROUTES\LINENAME")
   f = open(fileName,"wt")
   f.write("TAP,LINES\n")
   for i in range(len(tapIds)):
-    tap = tapIds[i][1]
-    if tapLines[i][1] != "":
-      lines = tapLines[i][1].replace(","," ")
+    tap = tapIds[i]
+    if tapLines[i] != "":
+      lines = tapLines[i].replace(","," ")
     f.write("%s,%s\n" % (tap,lines))
   f.close()
 
@@ -325,8 +450,15 @@ def createMazToTap(Visum, mode, outFolder):
   tSys = mode
 
   #get all stop area nodes
-  tapIds = Visum.Net.StopAreas.GetMultiAttValues("No")
-  tapNodes = Visum.Net.StopAreas.GetMultiAttValues("NodeNo")
+  tapIds = networkSnapshot.GetMulti(Visum, "StopAreas", "No")
+  tapNodes = networkSnapshot.GetMulti(Visum, "StopAreas", "NodeNo")
+
+  properties = Properties()
+  properties.loadPropertyFile("config\orramp.properties")
+  if properties.get('MazToTap.Engine', 'visum').strip().lower() == 'python':
+    createMazToTapPython(Visum, tSys, tapIds, tapNodes, MaxTime, BackToMiles, outFolder + "/tap2maz_" + mode + ".csv",
+      int(properties.get('MazToTap.Workers', 1)), int(properties.get('MazToTap.Batch.Size', accessPaths.DEFAULT_BATCH_SIZE)))
+    return
 
   #filter
   filter = Visum.Filters.ZoneFilter()
@@ -341,8 +473,8 @@ def createMazToTap(Visum, mode, outFolder):
   #loop though nodes and run isochrones
   Visum.Graphic.StopDrawing = True
   for i in range(len(tapNodes)):
-    tap = tapIds[i][1]
-    node = tapNodes[i][1]
+    tap = tapIds[i]
+    node = int(tapNodes[i])
     print("Get nearby MAZs by " + mode + " for TAP: " + str(tap) + " node: " + str(node))
     IsocNodes = Visum.CreateNetElements()
     Node = Visum.Net.Nodes.ItemByKey(node)
@@ -360,6 +492,74 @@ def createMazToTap(Visum, mode, outFolder):
   Visum.Graphic.StopDrawing = False
   Visum.Filters.InitAll()
 
+def getConnectorDirections(Visum):
+  #True for origin (zone to node) connectors, False for destination ones
+  directions = [str(d).strip().upper() for d in networkSnapshot.GetMulti(Visum, "Connectors", "Direction")]
+  unknown = set(directions) - set(["O","D"])
+  if len(unknown) > 0:
+    raise ValueError("unknown connector directions: " + ",".join(sorted(unknown)))
+  return(numpy.array(directions) == "O")
+
+def tSysOpen(snapshot, table, tSys):
+  #True for the rows of a table whose TSysSet includes tSys
+  rowPtr, tSysCodes = snapshot.ragged(table, "TSysSet")
+  rows = numpy.repeat(numpy.arange(len(rowPtr)-1), numpy.diff(rowPtr))
+  return(numpy.bincount(rows, weights=(tSysCodes == tSys), minlength=len(rowPtr)-1) > 0)
+
+def getAccessGraph(Visum, tSys, linkCost=None, connectorCost=None, zoneOrigins=False):
+
+  #links, turns and origin/destination connectors open to tSys with their tSys times (seconds),
+  #or the given link and connector cost attributes without turn times (e.g. Length)
+  #main node turns are not modelled, only the turns of each node
+  turnCost = None
+  if linkCost is None:
+    linkCost = "T0_PrTSys(" + tSys + ")"
+    turnCost = "T0_PrTSys(" + tSys + ")"
+  if connectorCost is None:
+    connectorCost = "T0_TSys(" + tSys + ")"
+  snapshot = networkSnapshot.snapshot(Visum)
+  linkOpen = tSysOpen(snapshot, "Links", tSys)
+  connOpen = tSysOpen(snapshot, "Connectors", tSys)
+  connOrigin = getConnectorDirections(Visum)
+  orig = connOpen & connOrigin
+  dest = connOpen & ~connOrigin
+  connZones = snapshot.column("Connectors", "ZoneNo", numpy.int64)
+  connNodes = snapshot.column("Connectors", "NodeNo", numpy.int64)
+  connCosts = snapshot.column("Connectors", connectorCost, numpy.float64)
+  turnFrom = snapshot.column("Turns", "FromNodeNo", numpy.int64)
+  turnTimes = snapshot.column("Turns", turnCost, numpy.float64) if turnCost is not None else numpy.zeros(len(turnFrom))
+
+  return(accessPaths.AccessGraph(snapshot.column("Nodes", "No", numpy.int64),
+    snapshot.column("Links", "FromNodeNo", numpy.int64)[linkOpen],
+    snapshot.column("Links", "ToNodeNo", numpy.int64)[linkOpen],
+    snapshot.column("Links", linkCost, numpy.float64)[linkOpen],
+    snapshot.column("Zones", "No", numpy.int64),
+    connZones[orig], connNodes[orig], connCosts[orig],
+    connZones[dest], connNodes[dest], connCosts[dest],
+    (turnFrom, snapshot.column("Turns", "ViaNodeNo", numpy.int64), snapshot.column("Turns", "ToNodeNo", numpy.int64),
+      turnTimes, tSysOpen(snapshot, "Turns", tSys)), zoneOrigins))
+
+def createMazToTapPython(Visum, tSys, tapIds, tapNodes, MaxTime, BackToMiles, fileName, workers, batchSize):
+
+  #bounded shortest paths from all TAP nodes at once instead of an isochrone per TAP,
+  #over the turns open to tSys and with the origin and destination connectors kept apart
+  print("build " + tSys + " access graph")
+  graph = getAccessGraph(Visum, tSys)
+  seqMazs = numpy.array(networkSnapshot.GetMulti(Visum, "Zones", "SEQMAZ")).astype(numpy.int64) #seq maz
+  tapIds = numpy.array(tapIds).astype(numpy.int64)
+  tapPos = graph.nodeIndex(numpy.array(tapNodes).astype(numpy.int64))
+
+  print("get nearby MAZs by " + tSys + " for " + str(len(tapIds)) + " TAPs with " + str(workers) + " workers")
+  header = True
+  for taps, zones, times in accessPaths.zoneTimesBySource(graph, tapPos, MaxTime, workers, batchSize):
+    #taps with a single MAZ are skipped, as with the isochrones
+    keep = numpy.bincount(taps, minlength=len(tapIds))[taps] > 1
+    pairs = pd.DataFrame({"TAP":tapIds[taps[keep]], "MAZ":seqMazs[zones[keep]], "DISTMILES":times[keep] / BackToMiles})
+    pairs.to_csv(fileName, mode='w' if header else 'a', header=header, index=False, float_format="%.2f")
+    header = False
+  if header:
+    pd.DataFrame(columns=["TAP","MAZ","DISTMILES"]).to_csv(fileName, index=False)
+
 def createNearbyMazsFile(Visum, mode, outFolder):
 
   print("create nearby MAZs file")
@@ -369,92 +569,164 @@ def createNearbyMazsFile(Visum, mode, outFolder):
     MaxDistMiles = 2
   elif mode == "Bike":
     MaxDistMiles = 5
-  DistMat = VisumPy.helpers.GetMatrix(Visum, 1) #numpy matrix
-  Mazs = VisumPy.helpers.GetMulti(Visum.Net.Zones, "SEQMAZ") #seq maz
+  Mazs = numpy.array(networkSnapshot.GetMulti(Visum, "Zones", "SEQMAZ")).astype(numpy.int64) #seq maz
 
-  #create output file
-  f = open(outFolder + "/maz2maz_" + mode + ".csv", 'w')
-  f.write("OMAZ,DMAZ,DISTMILES\n")
-  for i in range(len(Mazs)):
-    for j in range(len(Mazs)):
-      if(DistMat[i][j]<MaxDistMiles):
-        f.write("%i,%i,%.2f\n" % (Mazs[i],Mazs[j],DistMat[i][j]))
-  f.close()
+  properties = Properties()
+  properties.loadPropertyFile("config\orramp.properties")
+  writeBinary = properties.get('Nearby.Mazs.Binary', 'false').strip().lower() == 'true'
+  if getMazSkimEngine() == 'python':
+    blocks = skimNearbyMazs(Visum, mode, MaxDistMiles, int(properties.get('Maz.Skim.Workers', 1)),
+      int(properties.get('Maz.Skim.Batch.Size', accessPaths.DEFAULT_BATCH_SIZE)))
+  else:
+    blocks = nearbyMazsFromMatrix(numpy.asarray(VisumPy.helpers.GetMatrix(Visum, 1)), MaxDistMiles) #numpy matrix
+
+  #nearby pairs a block of origins at a time, in origin then destination order
+  fileName = outFolder + "/maz2maz_" + mode + ".csv"
+  rowCounts = numpy.zeros(len(Mazs), dtype=numpy.int64)
+  cols = []
+  dists = []
+  header = True
+  for i, j, dist in blocks:
+    rowCounts += numpy.bincount(i, minlength=len(Mazs))
+    pairs = pd.DataFrame({"OMAZ":Mazs[i], "DMAZ":Mazs[j], "DISTMILES":dist})
+    pairs.to_csv(fileName, mode='w' if header else 'a', header=header, index=False, float_format="%.2f")
+    header = False
+    if writeBinary:
+      cols.append(j)
+      dists.append(dist)
+
+  #CSR arrays of the nearby pairs for Python consumers, row and col are positions in maz
+  if writeBinary:
+    rowPtr = numpy.zeros(len(Mazs)+1, dtype=numpy.int64)
+    rowPtr[1:] = numpy.cumsum(rowCounts)
+    with open(outFolder + "/maz2maz_" + mode + ".npz", "wb") as f:
+      numpy.savez(f, maz=Mazs, rowPtr=rowPtr, cols=numpy.concatenate(cols).astype(numpy.int32), dist=numpy.concatenate(dists))
+
+def getMazSkimEngine():
+  properties = Properties()
+  properties.loadPropertyFile("config\orramp.properties")
+  return(properties.get('Maz.Skim.Engine', 'visum').strip().lower())
+
+def nearbyMazsFromMatrix(DistMat, MaxDistMiles, blockRows=1000):
+  #(origin, destination, distance) of pairs under MaxDistMiles in a skimmed matrix, by blocks of origins
+  for start in range(0, len(DistMat), blockRows):
+    i, j = numpy.nonzero(DistMat[start:start+blockRows] < MaxDistMiles)
+    yield(start + i, j, DistMat[start:start+blockRows][i, j])
+
+def skimNearbyMazs(Visum, tSys, MaxDistMiles, workers, batchSize):
+
+  #(origin, destination, distance) of pairs under MaxDistMiles by shortest distance paths
+  #over the tSys network and its open turns, only searching up to MaxDistMiles from each origin,
+  #leaving origins by their origin connectors and reaching destinations by their destination connectors
+  print("skim " + tSys + " MAZ distances up to " + str(MaxDistMiles) + " miles with " + str(workers) + " workers")
+  graph = getAccessGraph(Visum, tSys, "Length", "Length", zoneOrigins=True)
+  numZones = len(graph.zoneIds)
+  diagNumZones = 3 #intrazonal is half the average of the 3 nearest zones, as the Visum skim
+  diagFactor = 0.5
+
+  def nearestMean(rows, dist, origins):
+    #mean of the diagNumZones smallest distances of each origin, inf if fewer
+    order = numpy.lexsort((dist, rows))
+    rank = numpy.arange(len(order)) - numpy.searchsorted(rows[order], rows[order])
+    nearest = order[rank < diagNumZones]
+    total = numpy.bincount(rows[nearest], weights=dist[nearest], minlength=numZones)[origins]
+    count = numpy.bincount(rows[nearest], minlength=numZones)[origins]
+    return(numpy.where(count == diagNumZones, total / diagNumZones, numpy.inf))
+
+  sources = graph.zoneIndex(numpy.arange(numZones))
+  for k, (rows, cols, dist) in enumerate(accessPaths.zoneTimesBySource(graph, sources, MaxDistMiles, workers, batchSize)):
+    offDiag = rows != cols
+    rows, cols, dist = rows[offDiag], cols[offDiag], dist[offDiag]
+
+    #intrazonal, searching origins without a cutoff if fewer than diagNumZones zones are within it
+    batch = numpy.arange(k * batchSize, min((k+1) * batchSize, numZones))
+    diag = nearestMean(rows, dist, batch)
+    few = numpy.isinf(diag)
+    if few.any():
+      fewRows, fewCols, fewDist = graph.zoneTimes(sources[batch[few]], numpy.inf)
+      fewRows = batch[few][fewRows]
+      keep = fewRows != fewCols
+      diag[few] = nearestMean(fewRows[keep], fewDist[keep], batch[few])
+    diag = diagFactor * diag
+
+    #skim values have 3 decimals
+    rows = numpy.concatenate((rows, batch))
+    cols = numpy.concatenate((cols, batch))
+    dist = numpy.round(numpy.concatenate((dist, diag)), 3)
+    keep = dist < MaxDistMiles
+    rows, cols, dist = rows[keep], cols[keep], dist[keep]
+    order = numpy.lexsort((cols, rows))
+    yield(rows[order], cols[order], dist[order])
 
 def tazsToTapsForDriveAccess(Visum, fileName, tapFileName):
 
   print("get all drive access taps by taz")
 
-  tSysList = ['Bus'] #List of transit submodes
-  maxDistByTsysList = [4] #List of max miles to each submode
+  properties = Properties()
+  properties.loadPropertyFile("config\orramp.properties")
+  tSysList = [t.strip() for t in properties.get('Drive.Access.TSys', 'Bus').split(",")] #List of transit submodes
+  maxDistByTsysList = [float(d) for d in properties.get('Drive.Access.Max.Miles', '4').split(",")] #List of max miles to each submode
+  if len(tSysList) != len(maxDistByTsysList):
+    raise ValueError("Drive.Access.TSys and Drive.Access.Max.Miles must have the same number of entries")
   default_lot_capacity = 1
 
   #get TAZs and skims
-  zoneIds = VisumPy.helpers.GetMulti(Visum.Net.Zones, "No")
-  zoneXs = VisumPy.helpers.GetMulti(Visum.Net.Zones, "Xcoord")
-  zoneYs = VisumPy.helpers.GetMulti(Visum.Net.Zones, "Ycoord")
-  TimeMat = VisumPy.helpers.GetMatrix(Visum, 2) #SOV numpy matrix
-  DistMat = VisumPy.helpers.GetMatrix(Visum, 3) #SOV
-  TollMat = VisumPy.helpers.GetMatrix(Visum, 8) #SOVToll
+  zoneIds = networkSnapshot.GetMulti(Visum, "Zones", "No")
+  zoneXs = networkSnapshot.GetMulti(Visum, "Zones", "Xcoord")
+  zoneYs = networkSnapshot.GetMulti(Visum, "Zones", "Ycoord")
+  TimeMat = numpy.asarray(VisumPy.helpers.GetMatrix(Visum, 2)) #SOV numpy matrix
+  DistMat = numpy.asarray(VisumPy.helpers.GetMatrix(Visum, 3)) #SOV
+  TollMat = numpy.asarray(VisumPy.helpers.GetMatrix(Visum, 8)) #SOVToll
 
   #get TAPs
-  tapIds = VisumPy.helpers.GetMulti(Visum.Net.StopAreas,"No")
-  tapTsys = VisumPy.helpers.GetMulti(Visum.Net.StopAreas,"CONCATENATE:STOPPOINTS\CONCATENATE:LINEROUTES\TSYSCODE")
-  tapXs = VisumPy.helpers.GetMulti(Visum.Net.StopAreas,"Xcoord")
-  tapYs = VisumPy.helpers.GetMulti(Visum.Net.StopAreas,"Ycoord")
-  tapCanPnr = VisumPy.helpers.GetMulti(Visum.Net.StopAreas,"CANPNR")
-  tapTaz = [-1]*len(tapIds)
+  tapIds = networkSnapshot.GetMulti(Visum, "StopAreas", "No")
+  tapRowPtr, tapTsys = networkSnapshot.snapshot(Visum).ragged("StopAreas", "CONCATENATE:STOPPOINTS\CONCATENATE:LINEROUTES\TSYSCODE")
+  tapXs = networkSnapshot.GetMulti(Visum, "StopAreas", "Xcoord")
+  tapYs = networkSnapshot.GetMulti(Visum, "StopAreas", "Ycoord")
+  tapCanPnr = networkSnapshot.GetMulti(Visum, "StopAreas", "CANPNR")
 
   #assign TAP to TAZ
   print("assign stop areas to tazs")
-  for i in range(len(tapIds)):
-    nodeids = getClosestN(tapXs[i], tapYs[i], zoneIds, zoneXs, zoneYs, 1)
-    tapTaz[i] = nodeids[0]
+  zoneIndex = spatialIndex.SpatialIndex(zoneIds, zoneXs, zoneYs, getSpatialCache())
+  tapTaz = zoneIndex.nearest(tapXs, tapYs, 1)[:,0].tolist()
+
+  #add taz order and tap tazs to the zone crosswalk
+  crosswalk = loadZoneCrosswalk(Visum)
+  crosswalk.setTazs(zoneIds)
+  crosswalk.setTaps(tapIds, tapTaz)
+  crosswalk.save(properties.get('Zone.Crosswalk.File', 'outputs/other/zone_crosswalk.npz'))
+  tapTazIndex = crosswalk.tapIndexToTazIndex(numpy.arange(len(tapIds)))
 
   #write TAP file
   print("write tap data file")
-  f = open(tapFileName, 'w')
-  f.write("tap,taz,lotid,capacity\n")
-  for j in range(len(tapIds)):
-    tap = tapIds[j]
-    taz = tapTaz[j]
-    f.write("%i,%i,%i,%i\n" % (tap,taz,tap,default_lot_capacity))
-  f.close()
-
-  #write all near TAPs that CANPNR
+  tapIds = numpy.array(tapIds).astype(numpy.int64)
+  tapTaz = numpy.array(tapTaz).astype(numpy.int64)
+  pd.DataFrame({"tap":tapIds, "taz":tapTaz, "lotid":tapIds, "capacity":default_lot_capacity}).to_csv(tapFileName, index=False)
+
+  #TAPs that CANPNR (true or false) by submode served
+  tapRows = numpy.repeat(numpy.arange(len(tapIds)), numpy.diff(tapRowPtr))
+  canPnr = numpy.array(tapCanPnr) == 1
+  tapBySubmode = numpy.column_stack([canPnr & (numpy.bincount(tapRows, weights=(tapTsys == mode), minlength=len(tapIds)) > 0)
+    for mode in tSysList]) if len(tapIds) > 0 else numpy.zeros((0, len(tSysList)), dtype=bool)
+  maxDist = numpy.array(maxDistByTsysList)
+
+  #write all near TAPs that CANPNR, by taz, tap and submode, a block of tazs at a time
   print("write all near TAPs for drive access")
-  f = open(fileName, 'w')
-  f.write("FTAZ,MODE,PERIOD,TTAP,TMAZ,TTAZ,DTIME,DDIST,DTOLL,WDIST\n")
-  for i in range(len(zoneIds)):
-    for j in range(len(tapIds)):
-
-      if tapCanPnr[j]==1: #CANPNR true or false
-
-        for k in range(len(tSysList)):
-
-          #get data
-          ftaz = zoneIds[i]
-          mode = tSysList[k]
-          period = 0 #anytime of the day
-          ttap = tapIds[j]
-          tmaz = 0 #doesn't matter?
-          ttaz = tapTaz[j]
-
-          #get skim data
-          tapsTazIndex = zoneIds.index(ttaz)
-          dtime = TimeMat[i][tapsTazIndex]
-          ddist = DistMat[i][tapsTazIndex]
-          dtoll = TollMat[i][tapsTazIndex]
-          wdist = 0 #doesn't matter
-
-          #output if near; by modes served
-          maxDist = maxDistByTsysList[k]
-          modesServed = tapTsys[j].split(",")
-          if(ddist < maxDist and mode in modesServed):
-            dataItems = (ftaz,mode,period,ttap,tmaz,ttaz,dtime,ddist,dtoll,wdist)
-            f.write("%i,%s,%i,%i,%i,%i,%.2f,%.2f,%.2f,%.2f\n" % dataItems)
-
-  f.close()
+  zoneIds = numpy.array(zoneIds).astype(numpy.int64)
+  tSysArray = numpy.array(tSysList)
+  blockRows = 500
+  header = True
+  for start in range(0, len(zoneIds), blockRows):
+    ddist = DistMat[start:start+blockRows][:, tapTazIndex]
+    i, j, k = numpy.nonzero(tapBySubmode[numpy.newaxis,:,:] & (ddist[:,:,numpy.newaxis] < maxDist))
+    near = pd.DataFrame({"FTAZ":zoneIds[start+i], "MODE":tSysArray[k], "PERIOD":0, #anytime of the day
+      "TTAP":tapIds[j], "TMAZ":0, "TTAZ":tapTaz[j], #tmaz doesn't matter?
+      "DTIME":TimeMat[start+i, tapTazIndex[j]], "DDIST":ddist[i, j], "DTOLL":TollMat[start+i, tapTazIndex[j]],
+      "WDIST":0.0}) #wdist doesn't matter
+    near.to_csv(fileName, mode='w' if header else 'a', header=header, index=False, float_format="%.2f")
+    header = False
+  if header:
+    pd.DataFrame(columns=["FTAZ","MODE","PERIOD","TTAP","TMAZ","TTAZ","DTIME","DDIST","DTOLL","WDIST"]).to_csv(fileName, index=False)
 
 def saveLinkSpeeds(Visum, fileName):
 
@@ -462,9 +734,9 @@ def saveLinkSpeeds(Visum, fileName):
   print("save link assigned speed " + speedField + " for TTFs")
 
   #get TAZs and skims
-  fn = VisumPy.helpers.GetMulti(Visum.Net.Links, "FROMNODENO")
-  tn = VisumPy.helpers.GetMulti(Visum.Net.Links, "TONODENO")
-  speed = VisumPy.helpers.GetMulti(Visum.Net.Links, speedField)
+  fn = networkSnapshot.GetMulti(Visum, "Links", "FROMNODENO")
+  tn = networkSnapshot.GetMulti(Visum, "Links", "TONODENO")
+  speed = networkSnapshot.GetMulti(Visum, "Links", speedField)
   f = open(fileName, 'w')
   f.write("FROMNODE,TONODE,V0PRT\n")
   for i in range(len(fn)):
@@ -487,7 +759,7 @@ def loadLinkSpeeds(Visum, fileName):
         speeds.append(float(row[2]))
       i=i+1
 
-  VisumPy.helpers.SetMulti(Visum.Net.Links, "V0PrT", speeds)
+  networkSnapshot.SetMulti(Visum, "Links", "V0PrT", speeds)
 
 def createAltFiles(Visum, outFolder):
 
@@ -495,8 +767,9 @@ def createAltFiles(Visum, outFolder):
   default_park_area = 4
 
   #get mazs
-  real_mazs = VisumPy.helpers.GetMulti(Visum.Net.Zones, "NO")
-  mazs = VisumPy.helpers.GetMulti(Visum.Net.Zones, "SEQMAZ") #seq maz
+  real_mazs = networkSnapshot.GetMulti(Visum, "Zones", "NO")
+  mazs = networkSnapshot.GetMulti(Visum, "Zones", "SEQMAZ") #seq maz
+  mazTazs = loadZoneCrosswalk(Visum).mazToTaz(real_mazs)
 
   #create output file
   f_pl_a = open(outFolder + "/ParkLocationAlts.csv", 'w')
@@ -513,7 +786,7 @@ def createAltFiles(Visum, outFolder):
   taz_alt_i = 0
   for i in range(len(mazs)):
 
-    taz = int(str(int(real_mazs[i]))[0:-2]) #taz id inside maz id
+    taz = mazTazs[i]
 
     f_pl_a.write("%i,%i,%i\n" % (i+1,mazs[i],default_park_area))
     f_dc_a.write("%i,%i,%i\n" % (i+1,mazs[i],taz))
@@ -532,6 +805,11 @@ def calculateDensityMeasures(Visum):
 
   print("create MAZ density measures")
 
+  #buffer radius for density measures
+  properties = Properties()
+  properties.loadPropertyFile("config\orramp.properties")
+  bufferFeet = float(properties.get('Density.Buffer.Radius.Feet', 5280/2))
+
   #create attributes if needed
   print("create density attributes if needed")
   udaNames = []
@@ -550,83 +828,59 @@ def calculateDensityMeasures(Visum):
     Visum.Net.Zones.AddUserDefinedAttribute("RETDEN","RETDEN","RETDEN",2,3) #1=int, 2=float, 5=text
 
   #get attributes
-  mazIds = VisumPy.helpers.GetMulti(Visum.Net.Zones,"No")
-  mazXs = VisumPy.helpers.GetMulti(Visum.Net.Zones,"Xcoord")
-  mazYs = VisumPy.helpers.GetMulti(Visum.Net.Zones,"Ycoord")
-
-  du = VisumPy.helpers.GetMulti(Visum.Net.Zones, "HH")
-  pop = VisumPy.helpers.GetMulti(Visum.Net.Zones, "POP")
-  emp = VisumPy.helpers.GetMulti(Visum.Net.Zones, "EMP_TOTAL")
-  ret = VisumPy.helpers.GetMulti(Visum.Net.Zones, "EMP_RETAIL")
-  sqmi = VisumPy.helpers.GetMulti(Visum.Net.Zones, "AreaMi2")
-
-  duden = VisumPy.helpers.GetMulti(Visum.Net.Zones, "DUDEN")
-  empden = VisumPy.helpers.GetMulti(Visum.Net.Zones, "EMPDEN")
-  totint = VisumPy.helpers.GetMulti(Visum.Net.Zones, "TOTINT")
-  popden = VisumPy.helpers.GetMulti(Visum.Net.Zones, "POPDEN")
-  retden = VisumPy.helpers.GetMulti(Visum.Net.Zones, "RETDEN")
-  av1 = VisumPy.helpers.GetMulti(Visum.Net.Zones, "AddVal1") #accumulate acres
+  mazIds = networkSnapshot.GetMulti(Visum, "Zones", "No")
+  mazXs = networkSnapshot.GetMulti(Visum, "Zones", "Xcoord")
+  mazYs = networkSnapshot.GetMulti(Visum, "Zones", "Ycoord")
+
+  du = networkSnapshot.GetMulti(Visum, "Zones", "HH")
+  pop = networkSnapshot.GetMulti(Visum, "Zones", "POP")
+  emp = networkSnapshot.GetMulti(Visum, "Zones", "EMP_TOTAL")
+  ret = networkSnapshot.GetMulti(Visum, "Zones", "EMP_RETAIL")
+  sqmi = networkSnapshot.GetMulti(Visum, "Zones", "AreaMi2")
+  av1 = networkSnapshot.GetMulti(Visum, "Zones", "AddVal1") #accumulate acres
 
   #node data for intersection calculation
-  nodeIds = VisumPy.helpers.GetMulti(Visum.Net.Nodes,"No")
-  nodeXs = VisumPy.helpers.GetMulti(Visum.Net.Nodes,"Xcoord")
-  nodeYs = VisumPy.helpers.GetMulti(Visum.Net.Nodes,"Ycoord")
-  nodeLegs = VisumPy.helpers.GetMulti(Visum.Net.Nodes,"NumLinks")
-
-  #accumulate measures
-  for i in range(len(mazIds)):
-
-    #taz measures
-    duden[i] = 0
-    empden[i] = 0
-    popden[i] = 0
-    retden[i] = 0
-    for j in range(len(mazIds)):
-      dist = calcDist(mazXs[i],mazXs[j],mazYs[i],mazYs[j])
-      if dist < (5280/2):
-        duden[i] = duden[i] + du[j]
-        empden[i] = empden[i] + emp[j]
-        popden[i] = popden[i] + pop[j]
-        retden[i] = retden[i] + ret[j]
-        av1[i] = av1[i] + sqmi[j] * 640 #sqmi to acres
-
-    #divide by acres
-    if av1[i] > 0:
-      duden[i] = duden[i] / av1[i]
-      empden[i] = empden[i] / av1[i]
-      popden[i] = popden[i] / av1[i]
-      retden[i] = retden[i] / av1[i]
-    else:
-      duden[i] = 0
-      empden[i] = 0
-      popden[i] = 0
-      retden[i] = 0
-
-    #total intersections
-    totint[i] = 0
-    for k in range(len(nodeIds)):
-      if nodeLegs[k] > 3:
-        dist = calcDist(mazXs[i],nodeXs[k],mazYs[i],nodeYs[k])
-        if dist < (5280/2):
-          totint[i] = totint[i] + 1
+  nodeIds = networkSnapshot.GetMulti(Visum, "Nodes", "No")
+  nodeXs = networkSnapshot.GetMulti(Visum, "Nodes", "Xcoord")
+  nodeYs = networkSnapshot.GetMulti(Visum, "Nodes", "Ycoord")
+  nodeLegs = networkSnapshot.GetMulti(Visum, "Nodes", "NumLinks")
+
+  #accumulate measures over all mazs within the buffer
+  mazIndex = spatialIndex.SpatialIndex(mazIds, mazXs, mazYs, getSpatialCache())
+  mazValues = numpy.column_stack((du, emp, pop, ret, numpy.array(sqmi, dtype=float) * 640)) #sqmi to acres
+  mazSums = mazIndex.sumWithinRadius(mazXs, mazYs, bufferFeet, mazValues)
+
+  #divide by acres
+  acres = numpy.array(av1, dtype=float) + mazSums[:,4]
+  hasAcres = acres > 0
+  acres[~hasAcres] = 1
+  duden = numpy.where(hasAcres, mazSums[:,0] / acres, 0)
+  empden = numpy.where(hasAcres, mazSums[:,1] / acres, 0)
+  popden = numpy.where(hasAcres, mazSums[:,2] / acres, 0)
+  retden = numpy.where(hasAcres, mazSums[:,3] / acres, 0)
+
+  #total intersections
+  isInt = numpy.array(nodeLegs) > 3
+  intIndex = spatialIndex.SpatialIndex(numpy.array(nodeIds)[isInt], numpy.array(nodeXs)[isInt], numpy.array(nodeYs)[isInt], getSpatialCache())
+  totint = intIndex.sumWithinRadius(mazXs, mazYs, bufferFeet, numpy.ones(len(intIndex)))[:,0]
 
   #set attributes
-  VisumPy.helpers.SetMulti(Visum.Net.Zones, "DUDEN", duden)
-  VisumPy.helpers.SetMulti(Visum.Net.Zones, "EMPDEN", empden)
-  VisumPy.helpers.SetMulti(Visum.Net.Zones, "TOTINT", totint)
-  VisumPy.helpers.SetMulti(Visum.Net.Zones, "POPDEN", popden)
-  VisumPy.helpers.SetMulti(Visum.Net.Zones, "RETDEN", retden)
+  networkSnapshot.SetMulti(Visum, "Zones", "DUDEN", duden)
+  networkSnapshot.SetMulti(Visum, "Zones", "EMPDEN", empden)
+  networkSnapshot.SetMulti(Visum, "Zones", "TOTINT", totint)
+  networkSnapshot.SetMulti(Visum, "Zones", "POPDEN", popden)
+  networkSnapshot.SetMulti(Visum, "Zones", "RETDEN", retden)
 
 
 def setSeqMaz(Visum):
 
   print("set SEQMAZ for CT-RAMP")
 
-  zoneNum = VisumPy.helpers.GetMulti(Visum.Net.Zones,"NO")
-  seqMaz = VisumPy.helpers.GetMulti(Visum.Net.Zones,"SEQMAZ")
+  zoneNum = networkSnapshot.GetMulti(Visum, "Zones", "NO")
+  seqMaz = networkSnapshot.GetMulti(Visum, "Zones", "SEQMAZ")
   for i in range(len(zoneNum)):
     seqMaz[i] = i+1
-  VisumPy.helpers.SetMulti(Visum.Net.Zones, "SEQMAZ", seqMaz)
+  networkSnapshot.SetMulti(Visum, "Zones", "SEQMAZ", seqMaz)
 
 def updateMazTotals(Visum):
 
@@ -642,8 +896,8 @@ def updateMazTotals(Visum):
 
   # Read seq MAZ and TAZ IDs from MAZ data table
   maz_data = pd.DataFrame()
-  maz_data['maz'] = VisumPy.helpers.GetMulti(Visum.Net.Zones, "NO")
-  maz_data['taz'] = VisumPy.helpers.GetMulti(Visum.Net.Zones, "TAZ")
+  maz_data['maz'] = networkSnapshot.GetMulti(Visum, "Zones", "NO")
+  maz_data['taz'] = networkSnapshot.GetMulti(Visum, "Zones", "TAZ")
   maz_data['HH'] = 0
   maz_data['POP'] = 0
   maz_data['HHP'] = 0
@@ -665,9 +919,9 @@ def updateMazTotals(Visum):
   maz_data.loc[hhs.index,'POP'] = maz_data.loc[hhs.index,'POP'] + hhs.sum(axis=1)
 
   # Set HH, HHP and POP in MAZ table
-  VisumPy.helpers.SetMulti(Visum.Net.Zones, "HH", maz_data.HH.tolist())
-  VisumPy.helpers.SetMulti(Visum.Net.Zones, "HHP", maz_data.HHP.tolist())
-  VisumPy.helpers.SetMulti(Visum.Net.Zones, "POP", maz_data.POP.tolist())
+  networkSnapshot.SetMulti(Visum, "Zones", "HH", maz_data.HH.tolist())
+  networkSnapshot.SetMulti(Visum, "Zones", "HHP", maz_data.HHP.tolist())
+  networkSnapshot.SetMulti(Visum, "Zones", "POP", maz_data.POP.tolist())
 
 
 def updateInputSyntheticPopulation(Visum):
@@ -684,14 +938,9 @@ def updateInputSyntheticPopulation(Visum):
   perFilename = properties['PopulationSynthesizer.PersonFile']
   per = pd.read_csv(perFilename.strip("/"))
 
-  maz_xwalk = pd.DataFrame()
-  maz_xwalk['maz'] = VisumPy.helpers.GetMulti(Visum.Net.Zones, "NO")
-  maz_xwalk['seq_maz'] = VisumPy.helpers.GetMulti(Visum.Net.Zones, "SEQMAZ")
-
   # Copy seq MAZs to input HH file
   print("Copy seq MAZs from Visum maz_data to input HH file")
-  maz_xwalk.index = maz_xwalk.maz
-  hh.maz = maz_xwalk.loc[hh.maz].seq_maz.tolist()
+  hh.maz = loadZoneCrosswalk(Visum).mazToSeqMaz(hh.maz)
 
   # Order HH and Person file
   hh.sort_values(by = ['hhid'], inplace=True)
@@ -740,7 +989,7 @@ def writeMazDataFile(Visum, fileName):
   for i in range(len(fieldsToExport)):
     if fieldsToExport[i] in factor_vars:
         var_factor = float(factors[factor_vars.index(fieldsToExport[i])])
-        uda = VisumPy.helpers.GetMulti(Visum.Net.Zones, fieldsToExport[i])
+        uda = networkSnapshot.GetMulti(Visum, "Zones", fieldsToExport[i])
         if i==0:
           for j in range(len(uda)):
             row.append(str(uda[j] * var_factor))
@@ -748,7 +997,7 @@ def writeMazDataFile(Visum, fileName):
           for j in range(len(uda)):
             row[j] = row[j] + "," + str(float(uda[j]) * var_factor)
     else:
-        uda = VisumPy.helpers.GetMulti(Visum.Net.Zones, fieldsToExport[i])
+        uda = networkSnapshot.GetMulti(Visum, "Zones", fieldsToExport[i])
         if i==0:
           for j in range(len(uda)):
             row.append(str(uda[j]))
@@ -770,19 +1019,19 @@ def setLinkCapacityTODFactors(Visum, tp):
   #factors to convert hourly link capacities to time period capacities
   #updated by BMP to read TOD factors from the input network 11/15/18
   attName = "Network\TOD_FACTOR_" + tp.upper()
-  capFac = VisumPy.helpers.GetMulti(Visum.Net.Links, attName)
+  capFac = networkSnapshot.GetMulti(Visum, "Links", attName)
 
-  vdf_mid_link_cap = VisumPy.helpers.GetMulti(Visum.Net.Links, "vdf_mid_link_cap")
-  vdf_int_cap = VisumPy.helpers.GetMulti(Visum.Net.Links, "vdf_int_cap")
+  vdf_mid_link_cap = networkSnapshot.GetMulti(Visum, "Links", "vdf_mid_link_cap")
+  vdf_int_cap = networkSnapshot.GetMulti(Visum, "Links", "vdf_int_cap")
 
   #convert from hourly to time period
-  VisumPy.helpers.SetMulti(Visum.Net.Links, "vdf_mid_link_cap", numpy.multiply(numpy.array(vdf_mid_link_cap), numpy.array(capFac)))
-  VisumPy.helpers.SetMulti(Visum.Net.Links, "vdf_int_cap", numpy.multiply(numpy.array(vdf_int_cap), numpy.array(capFac)))
+  networkSnapshot.SetMulti(Visum, "Links", "vdf_mid_link_cap", numpy.multiply(numpy.array(vdf_mid_link_cap), numpy.array(capFac)))
+  networkSnapshot.SetMulti(Visum, "Links", "vdf_int_cap", numpy.multiply(numpy.array(vdf_int_cap), numpy.array(capFac)))
 
   ## Copy the minimum of intersection and mid-link capacity to CapPrt field
-  #tod_vdf_mid_link_cap = VisumPy.helpers.GetMulti(Visum.Net.Links, "vdf_mid_link_cap")
-  #tod_vdf_int_cap = VisumPy.helpers.GetMulti(Visum.Net.Links, "vdf_int_cap")
-  #VisumPy.helpers.SetMulti(Visum.Net.Links, "CapPrt", numpy.minimum(numpy.array(tod_vdf_mid_link_cap), numpy.array(tod_vdf_int_cap)))
+  #tod_vdf_mid_link_cap = networkSnapshot.GetMulti(Visum, "Links", "vdf_mid_link_cap")
+  #tod_vdf_int_cap = networkSnapshot.GetMulti(Visum, "Links", "vdf_int_cap")
+  #networkSnapshot.SetMulti(Visum, "Links", "CapPrt", numpy.minimum(numpy.array(tod_vdf_mid_link_cap), numpy.array(tod_vdf_int_cap)))
 
 def setLinkSpeedTODFactors(Visum, linkSpeedsFileName):
 
@@ -804,89 +1053,63 @@ def setLinkSpeedTODFactors(Visum, linkSpeedsFileName):
   print("loop through links and set speed by TOD")
   tods = ["EA","AM","MD","PM","EV"]
   for tod in tods:
-    fc = VisumPy.helpers.GetMulti(Visum.Net.Links, "PLANNO")
-    ffspeed = VisumPy.helpers.GetMulti(Visum.Net.Links, "V0PRT")
-    speed = VisumPy.helpers.GetMulti(Visum.Net.Links, tod+"_Speed")
+    fc = networkSnapshot.GetMulti(Visum, "Links", "PLANNO")
+    ffspeed = networkSnapshot.GetMulti(Visum, "Links", "V0PRT")
+    speed = networkSnapshot.GetMulti(Visum, "Links", tod+"_Speed")
     for i in range(len(fc)):
       speed[i] = float(speeds_lookup[str(int(fc[i])) + "," + str(int(ffspeed[i])) + "," + tod])
-  VisumPy.helpers.SetMulti(Visum.Net.Links, tod+"_Speed", speed)
+  networkSnapshot.SetMulti(Visum, "Links", tod+"_Speed", speed)
 
 def createTapFareMatrix(Visum, faresFileName, fileName):
 
   print("create OD fare matrix")
 
   print("read fare input file")
-  odfare = []
-  with open(faresFileName, 'r') as csvfile:
-    freader = csv.reader(csvfile, skipinitialspace=True)
-    for row in freader:
-      odfare.append(row)
-  odfare_col_names = odfare.pop(0)
-
-  #create dictionary for fare lookup
-  fare_lookup = dict()
-  for row in odfare:
-    fare_lookup[row[0] + "," + row[1]] = row[2]
-
-  print("loop through TAP TAP ODs and set fare")
-  fzs = VisumPy.helpers.GetMulti(Visum.Net.Zones, "FareZone")
-  mat = numpy.zeros((len(fzs),len(fzs)))
-  for i in range(len(fzs)):
-    for j in range(len(fzs)):
-      mat[i][j] = float(fare_lookup[fzs[i] + "," + fzs[j]])
+  odfare = pd.read_csv(faresFileName, dtype=str, skipinitialspace=True)
+  fzs = numpy.array(networkSnapshot.GetMulti(Visum, "Zones", "FareZone"), dtype=str)
+
+  #code fare zones as integers and create fare zone x fare zone fare table, NaN if not in the file
+  fareZones, codes = numpy.unique(numpy.concatenate((fzs, odfare.iloc[:,0].values, odfare.iloc[:,1].values)), return_inverse=True)
+  tapCodes = codes[0:len(fzs)]
+  fromCodes = codes[len(fzs):len(fzs)+len(odfare)]
+  toCodes = codes[len(fzs)+len(odfare):]
+  fare_table = numpy.full((len(fareZones),len(fareZones)), numpy.nan)
+  fare_table[fromCodes, toCodes] = odfare.iloc[:,2].astype(float).values #last row wins for repeated pairs
+
+  print("gather TAP TAP OD fares")
+  mat = fare_table[numpy.ix_(tapCodes, tapCodes)]
+  if numpy.isnan(mat).any():
+    missing = numpy.argwhere(numpy.isnan(mat))[0]
+    raise ValueError("fare not found: " + fzs[missing[0]] + "," + fzs[missing[1]])
 
   #write fare matrix
-  omxFile = omx.open_file(fileName,'w')
-  omxFile['fare'] = mat
+  omxFile = openOmxFile(fileName,'w')
+  writeOmxMatrix(omxFile, 'fare', mat)
   omxFile.close()
 
-def updateFareSkim(Visum, inputFareOmxFile, inputMatName, updateFareOmxFile, updateMatName):
+def updateFareSkims(inputFareOmxFile, inputMatName, updateFareOmxFiles, updateMatName):
 
-  print("update skimmed fare matrix with OD-based created earlier")
+  print("update skimmed fare matrices with OD-based created earlier")
 
-  omxFile = omx.open_file(inputFareOmxFile,'a')
+  omxFile = omx.open_file(inputFareOmxFile,'r')
   fare = numpy.array(omxFile[inputMatName])
   omxFile.close()
 
-  omxUpdateFile = omx.open_file(updateFareOmxFile,'a')
-  omxUpdateFile[updateMatName][:] = fare #[:] update items, not object
-  omxUpdateFile.close()
+  for updateFareOmxFile in updateFareOmxFiles:
+    omxUpdateFile = omx.open_file(updateFareOmxFile,'a')
+    omxUpdateFile[updateMatName][:] = fare #[:] update items, not object
+    omxUpdateFile.close()
 
-def reviseDuplicateSkims(Visum, omxFile1, omxFile2, omxFile3):
+def reviseDuplicateSkimPeriods(timePeriods):
 
   print("NA duplicate OD pairs that have the same total time across skim sets")
 
-  #parameters
-  NA = 0
-  skims = ["1","2","3","4","5","6","7","8","9","10"]
-
-  omxFile1 = omx.open_file(omxFile1,'a')
-  omxFile2 = omx.open_file(omxFile2,'a')
-  omxFile3 = omx.open_file(omxFile3,'a')
-
-  #if total time (IVT+OWT+TWT+WKT) is equal, then set skims to NA
-  timeSet1 = numpy.array(omxFile1["1"]) + numpy.array(omxFile1["2"]) + numpy.array(omxFile1["3"]) + numpy.array(omxFile1["4"])
-  timeSet2 = numpy.array(omxFile2["1"]) + numpy.array(omxFile2["2"]) + numpy.array(omxFile2["3"]) + numpy.array(omxFile2["4"])
-  timeSet3 = numpy.array(omxFile3["1"]) + numpy.array(omxFile3["2"]) + numpy.array(omxFile3["3"]) + numpy.array(omxFile3["4"])
-
-  # round to six sigificant digits
-  # temporary code to deal with Visum 2020 producing non identical transit matrices.
-  # AB 4-21-20
-  # The visum 2020 issue is no corrected (turned off demand rounding in procedure files)
-  # But keeping rounding in just as added protection since this the set1-3 aspect of SOABM really isn't functional anyway.
-  timeSet1 = numpy.around(timeSet1,decimals=-2)
-  timeSet2 = numpy.around(timeSet2,decimals=-2)
-  timeSet3 = numpy.around(timeSet3,decimals=-2)
-
-  #compare sets
-  for skim in skims:
-    omxFile2[skim][timeSet1 == timeSet2] = NA
-    omxFile3[skim][timeSet1 == timeSet3] = NA
-    omxFile3[skim][timeSet2 == timeSet3] = NA
-
-  omxFile1.close()
-  omxFile2.close()
-  omxFile3.close()
+  properties = Properties()
+  properties.loadPropertyFile("config\orramp.properties")
+  workers = int(properties.get('Skim.Revise.Workers', 1))
+
+  periodFileNames = [["outputs/skims/tap_skim_" + tp + "_set" + setid + ".omx" for setid in ['1','2','3']] for tp in timePeriods]
+  tapSkims.reviseDuplicateSkimPeriods(periodFileNames, workers)
 
 def loadTripMatrices(Visum, outputsFolder, timeperiod, type, setid=-1, pkHrFlag=False):
 
@@ -903,7 +1126,7 @@ def loadTripMatrices(Visum, outputsFolder, timeperiod, type, setid=-1, pkHrFlag=
   if type=="taz":
 
     #create matrices
-    tazIds = VisumPy.helpers.GetMulti(Visum.Net.Zones, "No")
+    tazIds = networkSnapshot.GetMulti(Visum, "Zones", "No")
     sov = numpy.zeros((len(tazIds),len(tazIds)))
     hov2 = numpy.zeros((len(tazIds),len(tazIds)))
     hov3 = numpy.zeros((len(tazIds),len(tazIds)))
@@ -962,7 +1185,7 @@ def loadTripMatrices(Visum, outputsFolder, timeperiod, type, setid=-1, pkHrFlag=
     sovHandle = Visum.Net.Matrices.ItemByKey(sovMatNum)
     sovHandle.SetAttValue("DSEGCODE","SOV")
     sovHandle.SetAttValue("NAME","SOV Demand")
-    VisumPy.helpers.SetMatrix(Visum, sovMatNum, sov)
+    VisumPy.helpers.SetMatrix(Visum, sovMatNum, toMatrixPrecision(sov, "SOV Demand"))
 
     hov2MatNum = 101
     if hov2MatNum not in matNums:
@@ -970,7 +1193,7 @@ def loadTripMatrices(Visum, outputsFolder, timeperiod, type, setid=-1, pkHrFlag=
     hov2Handle = Visum.Net.Matrices.ItemByKey(hov2MatNum)
     hov2Handle.SetAttValue("DSEGCODE","HOV2")
     hov2Handle.SetAttValue("NAME","HOV2 Demand")
-    VisumPy.helpers.SetMatrix(Visum, hov2MatNum, hov2)
+    VisumPy.helpers.SetMatrix(Visum, hov2MatNum, toMatrixPrecision(hov2, "HOV2 Demand"))
 
     hov3MatNum = 102
     if hov3MatNum not in matNums:
@@ -978,7 +1201,7 @@ def loadTripMatrices(Visum, outputsFolder, timeperiod, type, setid=-1, pkHrFlag=
     hov3Handle = Visum.Net.Matrices.ItemByKey(hov3MatNum)
     hov3Handle.SetAttValue("DSEGCODE","HOV3")
     hov3Handle.SetAttValue("NAME","HOV3 Demand")
-    VisumPy.helpers.SetMatrix(Visum, hov3MatNum, hov3)
+    VisumPy.helpers.SetMatrix(Visum, hov3MatNum, toMatrixPrecision(hov3, "HOV3 Demand"))
 
     truckMatNum = 103
     if truckMatNum not in matNums:
@@ -986,7 +1209,7 @@ def loadTripMatrices(Visum, outputsFolder, timeperiod, type, setid=-1, pkHrFlag=
     truckHandle = Visum.Net.Matrices.ItemByKey(truckMatNum)
     truckHandle.SetAttValue("DSEGCODE","Truck")
     truckHandle.SetAttValue("NAME","Truck Demand")
-    VisumPy.helpers.SetMatrix(Visum, truckMatNum, truck)
+    VisumPy.helpers.SetMatrix(Visum, truckMatNum, toMatrixPrecision(truck, "Truck Demand"))
 
     sovtollMatNum = 104
     if sovtollMatNum not in matNums:
@@ -994,7 +1217,7 @@ def loadTripMatrices(Visum, outputsFolder, timeperiod, type, setid=-1, pkHrFlag=
     sovtollHandle = Visum.Net.Matrices.ItemByKey(sovtollMatNum)
     sovtollHandle.SetAttValue("DSEGCODE","SOVToll")
     sovtollHandle.SetAttValue("NAME","SOVToll Demand")
-    VisumPy.helpers.SetMatrix(Visum, sovtollMatNum, sovtoll)
+    VisumPy.helpers.SetMatrix(Visum, sovtollMatNum, toMatrixPrecision(sovtoll, "SOVToll Demand"))
 
     hov2tollMatNum = 105
     if hov2tollMatNum not in matNums:
@@ -1002,7 +1225,7 @@ def loadTripMatrices(Visum, outputsFolder, timeperiod, type, setid=-1, pkHrFlag=
     hov2tollHandle = Visum.Net.Matrices.ItemByKey(hov2tollMatNum)
     hov2tollHandle.SetAttValue("DSEGCODE","HOV2Toll")
     hov2tollHandle.SetAttValue("NAME","HOV2Toll Demand")
-    VisumPy.helpers.SetMatrix(Visum, hov2tollMatNum, hov2toll)
+    VisumPy.helpers.SetMatrix(Visum, hov2tollMatNum, toMatrixPrecision(hov2toll, "HOV2Toll Demand"))
 
     hov3tollMatNum = 106
     if hov3tollMatNum not in matNums:
@@ -1010,7 +1233,7 @@ def loadTripMatrices(Visum, outputsFolder, timeperiod, type, setid=-1, pkHrFlag=
     hov3tollHandle = Visum.Net.Matrices.ItemByKey(hov3tollMatNum)
     hov3tollHandle.SetAttValue("DSEGCODE","HOV3Toll")
     hov3tollHandle.SetAttValue("NAME","HOV3Toll Demand")
-    VisumPy.helpers.SetMatrix(Visum, hov3tollMatNum, hov3toll)
+    VisumPy.helpers.SetMatrix(Visum, hov3tollMatNum, toMatrixPrecision(hov3toll, "HOV3Toll Demand"))
 
     #close files
     cvmTrips.close()
@@ -1020,7 +1243,7 @@ def loadTripMatrices(Visum, outputsFolder, timeperiod, type, setid=-1, pkHrFlag=
   if type=="tap":
 
     #create matrices
-    tapIds = VisumPy.helpers.GetMulti(Visum.Net.Zones,"No")
+    tapIds = networkSnapshot.GetMulti(Visum, "Zones", "No")
     transit = numpy.zeros((len(tapIds),len(tapIds)))
 
     #open matrices
@@ -1031,8 +1254,7 @@ def loadTripMatrices(Visum, outputsFolder, timeperiod, type, setid=-1, pkHrFlag=
 
     #add matrices together
     for aMatTP in matTP:
-      ct_transit = numpy.array(ctrampTapTrips["set_" + setid + "_" + aMatTP])
-      transit = transit + ct_transit
+      transit += ctrampTapTrips["set_" + setid + "_" + aMatTP][:]
 
     #add 0.001 to ensure assignment runs
     transit[0][1] = transit[0][1] + 0.001
@@ -1045,7 +1267,7 @@ def loadTripMatrices(Visum, outputsFolder, timeperiod, type, setid=-1, pkHrFlag=
     transitHandle = Visum.Net.Matrices.ItemByKey(transitMatNum)
     transitHandle.SetAttValue("DSEGCODE","Transit")
     transitHandle.SetAttValue("NAME","Transit Demand")
-    VisumPy.helpers.SetMatrix(Visum, transitMatNum, transit)
+    VisumPy.helpers.SetMatrix(Visum, transitMatNum, toMatrixPrecision(transit, "Transit Demand"))
 
     #close files
     ctrampTapTrips.close()
@@ -1053,7 +1275,7 @@ def loadTripMatrices(Visum, outputsFolder, timeperiod, type, setid=-1, pkHrFlag=
   if type=="nm":
 
     #create matrices
-    mazIds = VisumPy.helpers.GetMulti(Visum.Net.Zones, "No")
+    mazIds = networkSnapshot.GetMulti(Visum, "Zones", "No")
     walk = numpy.zeros((len(mazIds),len(mazIds)))
     bike = numpy.zeros((len(mazIds),len(mazIds)))
 
@@ -1067,15 +1289,13 @@ def loadTripMatrices(Visum, outputsFolder, timeperiod, type, setid=-1, pkHrFlag=
 
     #add matrices together
     for aMatTP in matTP:
-      ct_walk = numpy.array(ctrampNmTrips["walk_" + aMatTP]) # len = 6 / len of [1] = 1357 --
-      walk = walk + ct_walk
+      walk += ctrampNmTrips["walk_" + aMatTP][:]
 
       #add 0.001 to ensure assignment runs
       walk[0][1] = walk[0][1] + 0.001
 
     for aMatTP in matTP:
-      ct_bike = numpy.array(ctrampNmTrips["bike_" + aMatTP])
-      bike = bike + ct_bike
+      bike += ctrampNmTrips["bike_" + aMatTP][:]
 
       #add 0.001 to ensure assignment runs
       bike[0][1] = bike[0][1] + 0.001
@@ -1091,7 +1311,7 @@ def loadTripMatrices(Visum, outputsFolder, timeperiod, type, setid=-1, pkHrFlag=
     walkHandle = Visum.Net.Matrices.ItemByKey(walkMatNum)
     walkHandle.SetAttValue("DSEGCODE","Walk")
     walkHandle.SetAttValue("NAME","Walk Demand")
-    VisumPy.helpers.SetMatrix(Visum, walkMatNum, walk)
+    VisumPy.helpers.SetMatrix(Visum, walkMatNum, toMatrixPrecision(walk, "Walk Demand"))
 
     bikeMatNum = 151
     if bikeMatNum not in matNums:
@@ -1099,52 +1319,100 @@ def loadTripMatrices(Visum, outputsFolder, timeperiod, type, setid=-1, pkHrFlag=
     bikeHandle = Visum.Net.Matrices.ItemByKey(bikeMatNum)
     bikeHandle.SetAttValue("DSEGCODE","Bike")
     bikeHandle.SetAttValue("NAME","Bike Demand")
-    VisumPy.helpers.SetMatrix(Visum, bikeMatNum, bike)
+    VisumPy.helpers.SetMatrix(Visum, bikeMatNum, toMatrixPrecision(bike, "Bike Demand"))
 
     #close files
     ctrampNmTrips.close()
 
-def whichTimePeriod(deptTime, timePeriodStarts):
-  return(len(timePeriodStarts[deptTime >= timePeriodStarts])-1)
+def cacheCtrampOutputs(iteration=None):
 
-def buildTripMatrices(Visum, tripFileName, jointTripFileName, expansionFactor, tapFileName, fileNameTaz, fileNameTap, fileNamePark, timePeriods=0, timePeriodStarts=0):
+  #write the columns of the CT-RAMP trip csvs read by the matrix builders once to the columnar cache
+  properties = Properties()
+  properties.loadPropertyFile("config\orramp.properties")
+  fileFormat = properties.get('Trip.Cache.Format', 'none').lower()
+  if fileFormat not in columnarCache.FORMATS:
+    return
+
+  suffix = "" if iteration is None else "_" + str(iteration)
+  for name, columns in [("indivTripData", tripMatrices.INDIV_TRIP_COLUMNS), ("jointTripData", tripMatrices.JOINT_TRIP_COLUMNS)]:
+    fileName = "outputs/other/" + name + suffix + ".csv"
+    if os.path.exists(fileName):
+      columnarCache.convert(fileName, fileFormat, list(columns.keys()))
+
+matrixPrecision = None #(dtype, report file) read once per run
+
+def getMatrixPrecision():
+  global matrixPrecision
+  if matrixPrecision is None:
+    properties = Properties()
+    properties.loadPropertyFile("config\orramp.properties")
+    matrixPrecision = (numpy.dtype(properties.get('Matrix.Precision', 'float64')),
+      properties.get('Matrix.Precision.Report', 'outputs/other/matrix_precision_report.csv'))
+  return(matrixPrecision)
+
+def toMatrixPrecision(mat, name):
+
+  #cast a float64 matrix to the Matrix.Precision setting (float64/float32)
+  #matrices are accumulated in float64, so the report gives the difference from a float64 run,
+  #one row per matrix with the run step (including its iteration) and start time
+  dtype, reportFileName = getMatrixPrecision()
+
+  if dtype == mat.dtype or not numpy.issubdtype(mat.dtype, numpy.floating):
+    return(mat)
+  stored = mat.astype(dtype)
+
+  #largest absolute and relative difference and totals, of the distinct cells for indexed matrices
+  if isinstance(mat, omxWriter.IndexedMatrix):
+    values, storedValues = mat.compact(), stored.compact()
+  else:
+    values = mat.data if scipy.sparse.issparse(mat) else numpy.asarray(mat)
+    storedValues = stored.data if scipy.sparse.issparse(stored) else stored
+  diff = numpy.abs(storedValues.astype(numpy.float64) - values)
+  nonZero = values != 0
+  maxDiff = diff.max() if diff.size > 0 else 0
+  maxRelDiff = (diff[nonZero] / numpy.abs(values[nonZero])).max() if nonZero.any() else 0
+
+  #a report without the STEP/TIME columns is started over
+  header = "STEP,TIME,MATRIX,PRECISION,MAXABSDIFF,MAXRELDIFF,TOTAL_FLOAT64,TOTAL_STORED\n"
+  newReport = True
+  if os.path.exists(reportFileName):
+    with open(reportFileName) as f:
+      newReport = f.readline() != header
+  f = open(reportFileName, 'w' if newReport else 'a')
+  if newReport:
+    f.write(header)
+  f.write("%s,%s,%s,%s,%.9g,%.9g,%.6f,%.6f\n" % (" ".join(sys.argv[1:]), RUN_TIME, name, dtype.name, maxDiff, maxRelDiff, values.sum(), storedValues.astype(numpy.float64).sum()))
+  f.close()
+  return(stored)
 
-  print("build CT-RAMP trip matrices")
+def openOmxFile(fileName, mode):
+  #open an OMX file for writing with the OMX.Compression settings
+  properties = Properties()
+  properties.loadPropertyFile("config\orramp.properties")
+  complib = properties.get('OMX.Compression.Library', omxWriter.DEFAULT_COMPLIB).strip()
+  complevel = int(properties.get('OMX.Compression.Level', omxWriter.DEFAULT_COMPLEVEL))
+  return(omxWriter.openFile(fileName, mode, complib, complevel))
 
-  #read properties file
+def writeOmxMatrix(omxFile, name, mat):
+  #write a dense or scipy.sparse matrix at the Matrix.Precision setting with OMX.Chunk.Rows origin rows per chunk
   properties = Properties()
   properties.loadPropertyFile("config\orramp.properties")
-  Transit_Everywhere_Switch = properties['Transit.Everywhere.Switch']
-  Transit_Everywhere_AutoFactor = float(properties['Transit.Everywhere.Auto.Factor'])
-  Transit_Everywhere_SOV = float(properties['Transit.Everywhere.SOV'])
-  Transit_Everywhere_HOV2 = float(properties['Transit.Everywhere.HOV2'])
-  Transit_Everywhere_HOV3 = float(properties['Transit.Everywhere.HOV3'])
+  chunkRows = int(properties.get('OMX.Chunk.Rows', 0))
+  mat = toMatrixPrecision(mat, os.path.basename(getattr(omxFile, 'filename', '')) + ":" + name)
+  omxWriter.writeMatrix(omxFile, name, mat, chunkRows)
 
-  expansionFactor = 1 / expansionFactor
-  hov2occ = 2.0
-  hov3occ = 3.33
+def whichTimePeriod(deptTime, timePeriodStarts):
+  return(len(timePeriodStarts[deptTime >= timePeriodStarts])-1)
 
-  uniqTazs = VisumPy.helpers.GetMulti(Visum.Net.Zones, "NO")       #used by CT-RAMP
-  tazs   = VisumPy.helpers.GetMulti(Visum.Net.MainZones, "TAZ")    #used by CT-RAMP
-  tapIds = VisumPy.helpers.GetMulti(Visum.Net.StopAreas,"NO")      #used by CT-RAMP
-  #mazs   = VisumPy.helpers.GetMulti(Visum.Net.Zones, "SEQMAZ")
+def buildTripMatricesLoop(tripFileName, jointTripFileName, expansionFactor, tapFileName, uniqTazs, tazs, tapIds, timePeriods, timePeriodStarts,
+  Transit_Everywhere_Switch, Transit_Everywhere_AutoFactor, Transit_Everywhere_SOV, Transit_Everywhere_HOV2, Transit_Everywhere_HOV3):
 
-  #tap ids are same as maz ids under transit everywhere
-  if Transit_Everywhere_Switch=='true':
-     tapIds = VisumPy.helpers.GetMulti(Visum.Net.MainZones,"SEQMAZ")      #used by CT-RAMP
+  hov2occ = 2.0
+  hov3occ = 3.33
 
   #keep track of pnr trips to TAPs
   tapParks = [0] * len(tapIds)
 
-  if timePeriods==0:
-    timePeriods =      ["EV1","EA","AM","MD","PM","EV2"]
-    timePeriodStarts = [0    ,1   ,6   ,9  ,25  ,29   ]
-    timePeriodStarts = numpy.array(timePeriodStarts)
-  else:
-    timePeriods = ["EV1",timePeriods,"EV2"]
-    timePeriodStarts = numpy.append(0,timePeriodStarts)
-    timePeriodStarts = numpy.array(timePeriodStarts)
-
   #build taz lookup for quick access later
   tazIds = [-1]*(len(tazs)+1)
   for i in range(len(tazs)):
@@ -1647,9 +1915,90 @@ def buildTripMatrices(Visum, tripFileName, jointTripFileName, expansionFactor, t
         else:
           hov3[tod][o,d] = hov3[tod][o,d] + expansionFactor
 
+  return(sov, hov2, hov3, sovtoll, hov2toll, hov3toll, set1, set2, set3, tapParks)
+
+
+def buildTripMatrices(Visum, tripFileName, jointTripFileName, expansionFactor, tapFileName, fileNameTaz, fileNameTap, fileNamePark, timePeriods=0, timePeriodStarts=0, fileNameNm=None):
+
+  #with fileNameNm the walk/bike maz matrices are built from the same read of the
+  #trip files, in the maz order of the zone crosswalk
+  print("build CT-RAMP trip matrices")
+
+  #read properties file
+  properties = Properties()
+  properties.loadPropertyFile("config\orramp.properties")
+  Transit_Everywhere_Switch = properties['Transit.Everywhere.Switch']
+  Transit_Everywhere_AutoFactor = float(properties['Transit.Everywhere.Auto.Factor'])
+  Transit_Everywhere_SOV = float(properties['Transit.Everywhere.SOV'])
+  Transit_Everywhere_HOV2 = float(properties['Transit.Everywhere.HOV2'])
+  Transit_Everywhere_HOV3 = float(properties['Transit.Everywhere.HOV3'])
+
+  Trip_Matrix_Engine = properties.get('Trip.Matrix.Engine', 'vectorized').lower()
+  Trip_Read_Chunk_Size = int(properties.get('Trip.Read.Chunk.Size', tripMatrices.DEFAULT_CHUNK_SIZE))
+  Trip_Read_Workers = int(properties.get('Trip.Read.Workers', 1))
+
+  expansionFactor = 1 / expansionFactor
+
+  uniqTazs = networkSnapshot.GetMulti(Visum, "Zones", "NO")       #used by CT-RAMP
+  tazs   = networkSnapshot.GetMulti(Visum, "MainZones", "TAZ")    #used by CT-RAMP
+  tapIds = networkSnapshot.GetMulti(Visum, "StopAreas", "NO")      #used by CT-RAMP
+  #mazs   = networkSnapshot.GetMulti(Visum, "Zones", "SEQMAZ")
+
+  #tap ids are same as maz ids under transit everywhere
+  if Transit_Everywhere_Switch=='true':
+     tapIds = networkSnapshot.GetMulti(Visum, "MainZones", "SEQMAZ")      #used by CT-RAMP
+
+  if timePeriods==0:
+    timePeriods =      ["EV1","EA","AM","MD","PM","EV2"]
+    timePeriodStarts = [0    ,1   ,6   ,9  ,25  ,29   ]
+    timePeriodStarts = numpy.array(timePeriodStarts)
+  else:
+    timePeriods = ["EV1",timePeriods,"EV2"]
+    timePeriodStarts = numpy.append(0,timePeriodStarts)
+    timePeriodStarts = numpy.array(timePeriodStarts)
+
+  if Trip_Matrix_Engine=='loop':
+    #reference row-by-row implementation
+    sov, hov2, hov3, sovtoll, hov2toll, hov3toll, set1, set2, set3, tapParks = buildTripMatricesLoop(
+      tripFileName, jointTripFileName, expansionFactor, tapFileName, uniqTazs, tazs, tapIds, timePeriods, timePeriodStarts,
+      Transit_Everywhere_Switch, Transit_Everywhere_AutoFactor, Transit_Everywhere_SOV, Transit_Everywhere_HOV2, Transit_Everywhere_HOV3)
+    if fileNameNm is not None:
+      nmCrosswalk = loadZoneCrosswalk(Visum)
+      walk, bike = buildNmTripMatricesLoop(tripFileName, jointTripFileName, expansionFactor,
+        nmCrosswalk.maz, nmCrosswalk.seqMaz, timePeriods, timePeriodStarts)
+  else:
+    print("read tap data file for tap to taz mapping for pnr trips")
+    taptaz = pd.read_csv(tapFileName, skipinitialspace=True)
+
+    crosswalk = loadZoneCrosswalk(Visum)
+    crosswalk.setTazs(uniqTazs)
+    crosswalk.setTaps(tapIds, taptaz.iloc[:,1])
+
+    specs = [(tripMatrices.TripMatrixBuilder, (crosswalk, timePeriodStarts, expansionFactor,
+      Transit_Everywhere_Switch=='true', Transit_Everywhere_AutoFactor, Transit_Everywhere_SOV, Transit_Everywhere_HOV2, Transit_Everywhere_HOV3))]
+    if fileNameNm is not None:
+      nmCrosswalk = loadZoneCrosswalk(Visum)
+      specs.append((tripMatrices.NmTripMatrixBuilder, (nmCrosswalk, timePeriodStarts, expansionFactor)))
+    builder = tripMatrices.BuilderGroup(*specs)
+
+    print("read and process individual and joint trips")
+    tripMatrices.ingest(builder, specs, [
+      ("addIndivTrips", tripFileName, tripMatrices.INDIV_TRIP_COLUMNS),
+      ("addJointTrips", jointTripFileName, tripMatrices.JOINT_TRIP_COLUMNS)], Trip_Read_Workers, Trip_Read_Chunk_Size)
+
+    sov, hov2, hov3 = builder.matrices["sov"], builder.matrices["hov2"], builder.matrices["hov3"]
+    sovtoll, hov2toll, hov3toll = builder.matrices["sovtoll"], builder.matrices["hov2toll"], builder.matrices["hov3toll"]
+    set1, set2, set3 = builder.matrices["set_1"], builder.matrices["set_2"], builder.matrices["set_3"]
+    tapParks = builder.tapParks
+    if fileNameNm is not None:
+      walk, bike = builder.matrices["walk"], builder.matrices["bike"]
+
+  if fileNameNm is not None:
+    writeNmTripMatrices(fileNameNm, nmCrosswalk.maz, timePeriods, walk, bike)
+
   #open output files
-  omxFileTaz = omx.open_file(fileNameTaz,'w')
-  omxFileTap = omx.open_file(fileNameTap,'w')
+  omxFileTaz = openOmxFile(fileNameTaz,'w')
+  omxFileTap = openOmxFile(fileNameTap,'w')
   #omxFileNm = omx.open_file(fileNameNm,'w') # non-motorized
 
   #write lookups
@@ -1662,15 +2011,15 @@ def buildTripMatrices(Visum, tripFileName, jointTripFileName, expansionFactor, t
 
     tpLabel = timePeriods[i]
 
-    omxFileTaz['sov_' + tpLabel] = sov[i]
-    omxFileTaz['hov2_' + tpLabel] = hov2[i]
-    omxFileTaz['hov3_' + tpLabel] = hov3[i]
-    omxFileTaz['sovtoll_' + tpLabel] = sovtoll[i]
-    omxFileTaz['hov2toll_' + tpLabel] = hov2toll[i]
-    omxFileTaz['hov3toll_' + tpLabel] = hov3toll[i]
-    omxFileTap['set_1_' + tpLabel] = set1[i]
-    omxFileTap['set_2_' + tpLabel] = set2[i]
-    omxFileTap['set_3_' + tpLabel] = set3[i]
+    writeOmxMatrix(omxFileTaz, 'sov_' + tpLabel, sov[i])
+    writeOmxMatrix(omxFileTaz, 'hov2_' + tpLabel, hov2[i])
+    writeOmxMatrix(omxFileTaz, 'hov3_' + tpLabel, hov3[i])
+    writeOmxMatrix(omxFileTaz, 'sovtoll_' + tpLabel, sovtoll[i])
+    writeOmxMatrix(omxFileTaz, 'hov2toll_' + tpLabel, hov2toll[i])
+    writeOmxMatrix(omxFileTaz, 'hov3toll_' + tpLabel, hov3toll[i])
+    writeOmxMatrix(omxFileTap, 'set_1_' + tpLabel, set1[i])
+    writeOmxMatrix(omxFileTap, 'set_2_' + tpLabel, set2[i])
+    writeOmxMatrix(omxFileTap, 'set_3_' + tpLabel, set3[i])
     #omxFileNm['walk_' + tpLabel] = walk[i]
     #omxFileNm['bike_' + tpLabel] = bike[i]
 
@@ -1699,23 +2048,10 @@ def buildTripMatrices(Visum, tripFileName, jointTripFileName, expansionFactor, t
     f.write("%i,%i\n" % (tap,parks))
   f.close()
 
-def buildNmTripMatrices(Visum, tripFileName, jointTripFileName, expansionFactor, fileNameNm, timePeriods=0, timePeriodStarts=0):
-  print("build CT-RAMP non-motorized trip matrices")
-
-  expansionFactor = 1 / expansionFactor
-
-  uniqMazs = VisumPy.helpers.GetMulti(Visum.Net.Zones, "NO") # 10001   # Visum Zone #
-  seqMazs = VisumPy.helpers.GetMulti(Visum.Net.Zones, "SEQMAZ")  # 1.00   #used by CT-RAMP
-
-  if timePeriods==0:
-    timePeriods =      ["EV1","EA","AM","MD","PM","EV2"]
-    timePeriodStarts = [0    ,1   ,6   ,9  ,25  ,29   ]
-    timePeriodStarts = numpy.array(timePeriodStarts)
-  else:
-    timePeriods = ["EV1",timePeriods,"EV2"]
-    timePeriodStarts = numpy.append(0,timePeriodStarts)
-    timePeriodStarts = numpy.array(timePeriodStarts)
+def buildNmTripMatricesLoop(tripFileName, jointTripFileName, expansionFactor, uniqMazs, seqMazs, timePeriods, timePeriodStarts):
 
+  #reference row-by-row walk/bike matrices for Trip.Matrix.Engine = loop, the vectorized engine
+  #builds them with the auto and transit matrices in buildTripMatrices
 
   #build taz lookup for quick access later
   ### Binny - Here is where I think the problem is
@@ -1817,17 +2153,20 @@ def buildNmTripMatrices(Visum, tripFileName, jointTripFileName, expansionFactor,
       d = mazIds[d]
       num_participants = int(jtrips[i][numPartNum])
       bike[tod][o,d] = bike[tod][o,d] + expansionFactor * num_participants
-      
+
+  return(walk, bike)
+
+def writeNmTripMatrices(fileNameNm, uniqMazs, timePeriods, walk, bike):
 
   # open matrices
-  omxFileNm = omx.open_file(fileNameNm,'w') # non-motorized
+  omxFileNm = openOmxFile(fileNameNm,'w') # non-motorized
   omxFileNm.createMapping("NO",uniqMazs)
 
   # write matrices
   for i in range(len(timePeriods)):
     tpLabel = timePeriods[i]
-    omxFileNm['walk_' + tpLabel] = walk[i]
-    omxFileNm['bike_' + tpLabel] = bike[i]
+    writeOmxMatrix(omxFileNm, 'walk_' + tpLabel, walk[i])
+    writeOmxMatrix(omxFileNm, 'bike_' + tpLabel, bike[i])
 
   omxFileNm.close()
 
@@ -1837,79 +2176,70 @@ def prepVDFData(Visum, vdfLookupTableFileName):
   vdfLookupTableFileName="inputs/vdf_lookup_table.csv"
   #PLANNO,VALUE,1,3,4,5,6,7,30
   #1,gc4leg,0.35,0.39,0.5,0.56,0.56,0.63,0.47
-  vdf_lookup_table = VisumPy.csvHelpers.readCSV(vdfLookupTableFileName)
-  vdf_lookup = dict()
-  for i in range(1,len(vdf_lookup_table)):
-    for j in range(2,len(vdf_lookup_table[0])):
-      key = vdf_lookup_table[i][0] + ";" + vdf_lookup_table[i][1] + ";" + vdf_lookup_table[0][j]
-      vdf_lookup[key] = float(vdf_lookup_table[i][j])
+  vdf_lookup = vdfData.VdfLookupTable(VisumPy.csvHelpers.readCSV(vdfLookupTableFileName))
 
   print("get link and node data for vdf calculation")
 
-  fn = VisumPy.helpers.GetMulti(Visum.Net.Links, "FROMNODENO")
-  tn = VisumPy.helpers.GetMulti(Visum.Net.Links, "TONODENO")
-  planNo = VisumPy.helpers.GetMulti(Visum.Net.Links, "PLANNO")
-  progression_factor = VisumPy.helpers.GetMulti(Visum.Net.Links, "PROGRESSION_FACTOR")
-
-  lanes = VisumPy.helpers.GetMulti(Visum.Net.Links, "NUMLANES")
-  al = numpy.nan_to_num(numpy.array(VisumPy.helpers.GetMulti(Visum.Net.Links, "AUX_LANES"), dtype=float))
-  m = VisumPy.helpers.GetMulti(Visum.Net.Links, "MEDIAN")
-
-  #toMainNo = list(map(lambda x: x != 0 , VisumPy.helpers.GetMulti(Visum.Net.Links, "ToMainNodeOrientation")))
+  #read all link attributes used below in one pass
+  networkSnapshot.snapshot(Visum).fetch("Links", [
+    "FROMNODENO", "TONODENO", "PLANNO", "PROGRESSION_FACTOR", "NUMLANES", "AUX_LANES",
+    "MEDIAN", "ToMainNodeLeg\\Orientation", "MID_LINK_CAP_ADJ",
+    r"ToNode\NumLegs", "ToNode\ControlType", "ToNodeOrientation", "ToNode\MajorFlowOri1",
+    "ToNode\MajorFlowOri2", "ToNode\Concatenate:InLinks\PlanNo",
+    "ToNode\Concatenate:InLinks\ToNodeOrientation",
+    "Concatenate:OutTurns\ToLink\FromNodeOrientation", "Concatenate:OutTurns\Orientation",
+    "Concatenate:OutTurns\Concatenate:LaneTurns\ToOrientation",
+    "Concatenate:OutTurns\Concatenate:LaneTurns\FromLaneNo", r"ToMainNode\NumLegs",
+    "ToMainNode\ControlType", "ToMainNode\MajorFlowOri1", "ToMainNode\MajorFlowOri2",
+    "ToMainNode\Concatenate:InLinks\PlanNo",
+    "ToMainNode\Concatenate:InLinks\ToNodeOrientation",
+    "Concatenate:OutMainTurns\ToLink\FromMainNodeOrientation",
+    "Concatenate:OutMainTurns\Orientation",
+    "Concatenate:OutMainTurns\Concatenate:LaneTurns\ToOrientation",
+    "Concatenate:OutMainTurns\Concatenate:LaneTurns\FromLaneNo"])
+
+  fn = networkSnapshot.GetMulti(Visum, "Links", "FROMNODENO")
+  tn = networkSnapshot.GetMulti(Visum, "Links", "TONODENO")
+  planNo = networkSnapshot.GetMulti(Visum, "Links", "PLANNO")
+  progression_factor = networkSnapshot.GetMulti(Visum, "Links", "PROGRESSION_FACTOR")
+
+  lanes = networkSnapshot.GetMulti(Visum, "Links", "NUMLANES")
+  al = numpy.nan_to_num(numpy.array(networkSnapshot.GetMulti(Visum, "Links", "AUX_LANES"), dtype=float))
+  m = networkSnapshot.GetMulti(Visum, "Links", "MEDIAN")
+
+  #toMainNo = list(map(lambda x: x != 0 , networkSnapshot.GetMulti(Visum, "Links", "ToMainNodeOrientation")))
   #Updated pointer to an internally calculated field to protect aganist hold overs from old network edits
-  toMainNo = list(map(lambda x: x != None , VisumPy.helpers.GetMulti(Visum.Net.Links, "ToMainNodeLeg\\Orientation")))
+  toMainNo = list(map(lambda x: x != None , networkSnapshot.GetMulti(Visum, "Links", "ToMainNodeLeg\\Orientation")))
 
-  mid_link_cap_adj = VisumPy.helpers.GetMulti(Visum.Net.Links, "MID_LINK_CAP_ADJ") #default to zero
+  mid_link_cap_adj = networkSnapshot.GetMulti(Visum, "Links", "MID_LINK_CAP_ADJ") #default to zero
 
   #regular node
-  rn_numlegs = VisumPy.helpers.GetMulti(Visum.Net.Links, r"ToNode\NumLegs")
-  rn_cType = VisumPy.helpers.GetMulti(Visum.Net.Links, "ToNode\ControlType")
-  rn_tnOrient = VisumPy.helpers.GetMulti(Visum.Net.Links, "ToNodeOrientation")
-  rn_tnMajFlw1 = VisumPy.helpers.GetMulti(Visum.Net.Links, "ToNode\MajorFlowOri1")
-  rn_tnMajFlw2 = VisumPy.helpers.GetMulti(Visum.Net.Links, "ToNode\MajorFlowOri2")
-
-  rn_tnode_fcs = VisumPy.helpers.GetMulti(Visum.Net.Links, "ToNode\Concatenate:InLinks\PlanNo")
-  rn_tnode_orient = VisumPy.helpers.GetMulti(Visum.Net.Links, "ToNode\Concatenate:InLinks\ToNodeOrientation")
-  rn_tnode_fnorient = VisumPy.helpers.GetMulti(Visum.Net.Links, "Concatenate:OutTurns\ToLink\FromNodeOrientation")
-  rn_tnode_turnorient = VisumPy.helpers.GetMulti(Visum.Net.Links, "Concatenate:OutTurns\Orientation")
-  rn_tnode_laneturn_orients = VisumPy.helpers.GetMulti(Visum.Net.Links, "Concatenate:OutTurns\Concatenate:LaneTurns\ToOrientation")
-  rn_tnode_laneturn_laneno = VisumPy.helpers.GetMulti(Visum.Net.Links, "Concatenate:OutTurns\Concatenate:LaneTurns\FromLaneNo")
+  rn_numlegs = networkSnapshot.GetMulti(Visum, "Links", r"ToNode\NumLegs")
+  rn_cType = networkSnapshot.GetMulti(Visum, "Links", "ToNode\ControlType")
+  rn_tnOrient = networkSnapshot.GetMulti(Visum, "Links", "ToNodeOrientation")
+  rn_tnMajFlw1 = networkSnapshot.GetMulti(Visum, "Links", "ToNode\MajorFlowOri1")
+  rn_tnMajFlw2 = networkSnapshot.GetMulti(Visum, "Links", "ToNode\MajorFlowOri2")
+
+  rn_tnode_fcs = networkSnapshot.GetMulti(Visum, "Links", "ToNode\Concatenate:InLinks\PlanNo")
+  rn_tnode_orient = networkSnapshot.GetMulti(Visum, "Links", "ToNode\Concatenate:InLinks\ToNodeOrientation")
+  rn_tnode_fnorient = networkSnapshot.GetMulti(Visum, "Links", "Concatenate:OutTurns\ToLink\FromNodeOrientation")
+  rn_tnode_turnorient = networkSnapshot.GetMulti(Visum, "Links", "Concatenate:OutTurns\Orientation")
+  rn_tnode_laneturn_orients = networkSnapshot.GetMulti(Visum, "Links", "Concatenate:OutTurns\Concatenate:LaneTurns\ToOrientation")
+  rn_tnode_laneturn_laneno = networkSnapshot.GetMulti(Visum, "Links", "Concatenate:OutTurns\Concatenate:LaneTurns\FromLaneNo")
 
   #main node
-  mn_numlegs = VisumPy.helpers.GetMulti(Visum.Net.Links, r"ToMainNode\NumLegs")
-  mn_cType = VisumPy.helpers.GetMulti(Visum.Net.Links, "ToMainNode\ControlType")
-  mn_tnOrient = VisumPy.helpers.GetMulti(Visum.Net.Links, "ToNodeOrientation") #Not main node since these don't always make sense
-  mn_tnMajFlw1 = VisumPy.helpers.GetMulti(Visum.Net.Links, "ToMainNode\MajorFlowOri1")
-  mn_tnMajFlw2 = VisumPy.helpers.GetMulti(Visum.Net.Links, "ToMainNode\MajorFlowOri2")
-
-  mn_tnode_fcs = VisumPy.helpers.GetMulti(Visum.Net.Links, "ToMainNode\Concatenate:InLinks\PlanNo")
-  mn_tnode_orient = VisumPy.helpers.GetMulti(Visum.Net.Links, "ToMainNode\Concatenate:InLinks\ToNodeOrientation") #Not main node since these don't always make sense
-  mn_tnode_fnorient = VisumPy.helpers.GetMulti(Visum.Net.Links, "Concatenate:OutMainTurns\ToLink\FromMainNodeOrientation")
-  mn_tnode_turnorient = VisumPy.helpers.GetMulti(Visum.Net.Links, "Concatenate:OutMainTurns\Orientation")
-  mn_tnode_laneturn_orients = VisumPy.helpers.GetMulti(Visum.Net.Links, "Concatenate:OutMainTurns\Concatenate:LaneTurns\ToOrientation")
-  mn_tnode_laneturn_laneno = VisumPy.helpers.GetMulti(Visum.Net.Links, "Concatenate:OutMainTurns\Concatenate:LaneTurns\FromLaneNo")
-
-  #regular or main node temp fields
-  numlegs = [0]*len(planNo)
-  cType = [0]*len(planNo)
-  tnOrient = [0]*len(planNo)
-  tnMajFlw1  = [0]*len(planNo)
-  tnMajFlw2 = [0]*len(planNo)
-  tnode_fcs = [0]*len(planNo)
-  tnode_orient = [0]*len(planNo)
-  tnode_fnorient = [0]*len(planNo)
-  tnode_turnorient = [0]*len(planNo)
-  tnode_laneturn_orients = [0]*len(planNo)
-  tnode_laneturn_laneno = [0]*len(planNo)
-
-  #calculated fields
-  int_fc = [0]*len(planNo) #intersecting facility type
-  rl = [0]*len(planNo) #out exclusive right lanes
-  tl = [0]*len(planNo) #out shared or exclusive thru lanes
-  ll = [0]*len(planNo) #out exclusive left lanes
-  mid_link_cap = [0]*len(planNo) #mid link capacity
-  unc_sig_delay = [0]*len(planNo) #uncongested signal delay
-  int_cap = [0]*len(planNo) #intersection capacity
+  mn_numlegs = networkSnapshot.GetMulti(Visum, "Links", r"ToMainNode\NumLegs")
+  mn_cType = networkSnapshot.GetMulti(Visum, "Links", "ToMainNode\ControlType")
+  mn_tnOrient = networkSnapshot.GetMulti(Visum, "Links", "ToNodeOrientation") #Not main node since these don't always make sense
+  mn_tnMajFlw1 = networkSnapshot.GetMulti(Visum, "Links", "ToMainNode\MajorFlowOri1")
+  mn_tnMajFlw2 = networkSnapshot.GetMulti(Visum, "Links", "ToMainNode\MajorFlowOri2")
+
+  mn_tnode_fcs = networkSnapshot.GetMulti(Visum, "Links", "ToMainNode\Concatenate:InLinks\PlanNo")
+  mn_tnode_orient = networkSnapshot.GetMulti(Visum, "Links", "ToMainNode\Concatenate:InLinks\ToNodeOrientation") #Not main node since these don't always make sense
+  mn_tnode_fnorient = networkSnapshot.GetMulti(Visum, "Links", "Concatenate:OutMainTurns\ToLink\FromMainNodeOrientation")
+  mn_tnode_turnorient = networkSnapshot.GetMulti(Visum, "Links", "Concatenate:OutMainTurns\Orientation")
+  mn_tnode_laneturn_orients = networkSnapshot.GetMulti(Visum, "Links", "Concatenate:OutMainTurns\Concatenate:LaneTurns\ToOrientation")
+  mn_tnode_laneturn_laneno = networkSnapshot.GetMulti(Visum, "Links", "Concatenate:OutMainTurns\Concatenate:LaneTurns\FromLaneNo")
 
   #additional output fields
   if "vdf_int_fc" not in list(map(lambda x: x.Code,Visum.Net.Links.Attributes.GetAll)):
@@ -1927,193 +2257,42 @@ def prepVDFData(Visum, vdfLookupTableFileName):
   if "vdf_int_cap" not in list(map(lambda x: x.Code,Visum.Net.Links.Attributes.GetAll)):
     Visum.Net.Links.AddUserDefinedAttribute("vdf_int_cap","vdf_int_cap","vdf_int_cap",2)
 
-  print("loop through links")
+  print("calculate vdf data")
 
   try:
-
-    for i in range(len(planNo)):
-
-      if toMainNo[i]:  #main node
-
-        numlegs[i] = mn_numlegs[i]
-        cType[i] = mn_cType[i]
-        tnOrient[i] = mn_tnOrient[i]
-        tnMajFlw1[i] = mn_tnMajFlw1[i]
-        tnMajFlw2[i] = mn_tnMajFlw2[i]
-
-        tnode_fcs[i] = mn_tnode_fcs[i]
-        tnode_orient[i] = mn_tnode_orient[i]
-        tnode_fnorient[i] = mn_tnode_fnorient[i]
-        tnode_turnorient[i] = mn_tnode_turnorient[i]
-        tnode_laneturn_orients[i] = mn_tnode_laneturn_orients[i]
-        tnode_laneturn_laneno[i] = mn_tnode_laneturn_laneno[i]
-
-      else: #regular node
-
-        numlegs[i] = rn_numlegs[i]
-        cType[i] = rn_cType[i]
-        tnOrient[i] = rn_tnOrient[i]
-        tnMajFlw1[i] = rn_tnMajFlw1[i]
-        tnMajFlw2[i] = rn_tnMajFlw2[i]
-
-        tnode_fcs[i] = rn_tnode_fcs[i]
-        tnode_orient[i] = rn_tnode_orient[i]
-        tnode_fnorient[i] = rn_tnode_fnorient[i]
-        tnode_turnorient[i] = rn_tnode_turnorient[i]
-        tnode_laneturn_orients[i] = rn_tnode_laneturn_orients[i]
-        tnode_laneturn_laneno[i] = rn_tnode_laneturn_laneno[i]
-
-      #skip if link closed
-      if tnOrient[i] == 0 or planNo[i] == 998:
-        continue
-
-      mlc = vdf_lookup[str(int(planNo[i])) + ";thru_cap_per_lane;" + str(int(planNo[i]))]
-      if planNo[i] == 1: #interstate
-        freeway_cap_per_auxlane = vdf_lookup[str(int(planNo[i])) + ";freeway_cap_per_auxlane;" + str(int(planNo[i]))]
-        mid_link_cap[i] = lanes[i] * mlc + al[i] * freeway_cap_per_auxlane
-      else:
-        mid_link_cap[i] = lanes[i] * mlc - 300 - 200 * (m[i]==0)
-
-      #adjust calculated mid_link_cap by subtracting user-input adjustment
-      mid_link_cap[i] = mid_link_cap[i] - mid_link_cap_adj[i]
-
-      if numlegs[i] >= 3:
-
-        #get to node incoming link orientations and facility types
-        int_fcs = tnode_fcs[i].split(",")
-        int_orients = tnode_orient[i].split(",")
-
-        #skip if not a real intersection
-        while '998' in int_fcs:
-          index = int_fcs.index('998')
-          int_fcs.pop(index)
-          int_orients.pop(index)
-          if len(int_fcs) < 3:
-            continue
-
-        #if all same or just one different
-        if len(set(int_fcs)) == 1:
-          int_fc[i] = list(int_fcs)[0]
-
-        elif len(set(int_fcs)) == 2:
-          #updated by BMP 11/19/18
-          int_fcs_set = set(int_fcs)
-          int_fcs_set.remove(str(int(planNo[i])))
-          int_fc[i] = list(int_fcs_set)[0]
-
-        else:
-          #buid lookup and calculate based on compass orientation
-          tonode_lookup = dict( zip(int_orients, int_fcs) )
-
-          #code intersecting fc
-          if tnOrient[i] in [15,1,3,11,9,7]: #NW,N,NE,SW,S,SE
-            west, east = 999,999
-            if 'ORIENTATIONWEST' in tonode_lookup:
-              west = int(tonode_lookup['ORIENTATIONWEST'])
-            if 'ORIENTATIONEAST' in tonode_lookup:
-              east = int(tonode_lookup['ORIENTATIONEAST'])
-            int_fc[i] = min(west, east) #take higher order fc
-
-          if tnOrient[i] in [5,13]: #E,W
-            north, south = 999,999
-            if 'ORIENTATIONNORTH' in tonode_lookup:
-              north = int(tonode_lookup['ORIENTATIONNORTH'])
-            if 'ORIENTATIONNORTHEAST' in tonode_lookup:
-              north = int(tonode_lookup['ORIENTATIONNORTHEAST'])
-            if 'ORIENTATIONNORTHWEST' in tonode_lookup:
-              north = int(tonode_lookup['ORIENTATIONNORTHWEST'])
-            if 'ORIENTATIONSOUTH' in tonode_lookup:
-              south = int(tonode_lookup['ORIENTATIONSOUTH'])
-            if 'ORIENTATIONSOUTHEAST' in tonode_lookup:
-              south = int(tonode_lookup['ORIENTATIONSOUTHEAST'])
-            if 'ORIENTATIONSOUTHWEST' in tonode_lookup:
-              south = int(tonode_lookup['ORIENTATIONSOUTHWEST'])
-            int_fc[i] = min(north, south) #take higher order fc
-
-        #determine cycle length and gcratio
-        if cType[i] == 0: #0=unknown
-            continue
-        if cType[i] == 1: #0=unknown,1=uncontrolled,2=twowaystop,3=signal,4=allwaystop,5=roundabout,6=twowayyield
-            continue
-        elif cType[i] == 2:
-          if tnOrient[i] not in [tnMajFlw1[i], tnMajFlw2[i]]: #not major flow link, i.e. stop controlled
-            gc_type = "stop"
-          else:
-            continue
-        elif cType[i] == 3:
-          gc_type = "gc3leg" if numlegs[i] == 3 else "gc4leg"
-        elif cType[i] == 4:
-          gc_type = "stop"
-        elif cType[i] == 5:
-          gc_type = "roundabout"
-        cyclelength = vdf_lookup[str(int(planNo[i])) + ";cyclelength;" + str(int_fc[i])]
-        gc = vdf_lookup[str(int(planNo[i])) + ";" + gc_type + ";" + str(int_fc[i])]
-
-        unc_sig_delay[i] = progression_factor[i] * (cyclelength / 2) * (1 - gc)**2
-        unc_sig_delay[i] = unc_sig_delay[i] * 100 #scale up since AddVal2 only supports ints
-
-        #right lanes, thru lanes, left lanes at intersection
-        int_fnorient = tnode_fnorient[i].split(",")
-        int_turno = tnode_turnorient[i].split(",")
-        int_lturns_orient = tnode_laneturn_orients[i].split(",")
-        int_lturns_laneno = tnode_laneturn_laneno[i].split(",")
-
-        #assign L,T,R to lane turns
-        int_lturns_ltr = [0]*len(int_lturns_laneno) #lane turns by L,T,R
-        for j in range(len(int_turno)):
-          nchar = len(int_turno[j])
-          if int_turno[j][(nchar-1):nchar] == "R": #right
-            for k in range(len(int_lturns_orient)):
-              if int_lturns_orient[k] == int_fnorient[j]:
-                int_lturns_ltr[k] = "R"
-          if int_turno[j][(nchar-1):nchar] == "T": #thru
-            for k in range(len(int_lturns_orient)):
-              if int_lturns_orient[k] == int_fnorient[j]:
-                int_lturns_ltr[k] = "T"
-          if int_turno[j][(nchar-1):nchar] == "L": #left
-            for k in range(len(int_lturns_orient)):
-              if int_lturns_orient[k] == int_fnorient[j]:
-                int_lturns_ltr[k] = "L"
-
-        #count up lanes by movement
-        laneno_ltr = dict()
-        for j in range(len(int_lturns_laneno)):
-          if int_lturns_laneno[j] in laneno_ltr:
-            laneno_ltr[int_lturns_laneno[j]] = laneno_ltr[int_lturns_laneno[j]] + "," + str(int_lturns_ltr[j])
-          else:
-            laneno_ltr[int_lturns_laneno[j]] = str(int_lturns_ltr[j])
-        for j in laneno_ltr.keys():
-          if "R" in laneno_ltr[j] and "T" not in laneno_ltr[j] and "L" not in laneno_ltr[j]: #exclusive
-            rl[i] = rl[i] + 1
-          if "T" in laneno_ltr[j]: #shared ok
-            tl[i] = tl[i] + 1
-          if "R" not in laneno_ltr[j] and "T" not in laneno_ltr[j] and "L" in laneno_ltr[j]: #exclusive
-            ll[i] = ll[i] + 1
-
-        tlf = vdf_lookup[str(int(planNo[i])) + ";turn_cap_per_lane;" + str(int(planNo[i]))]
-        int_app_cap_per_lane = vdf_lookup[str(int(planNo[i])) + ";int_app_cap_per_lane;" + str(int(planNo[i]))]
-        int_cap[i] = gc * (tl[i] * int_app_cap_per_lane + (rl[i] + ll[i]) * tlf)
-
-  except Exception as e:
+    vdf = vdfData.linkVdfData(vdf_lookup, planNo, progression_factor, lanes, al, m, mid_link_cap_adj,
+      vdfData.byNode(toMainNo, mn_numlegs, rn_numlegs),
+      vdfData.byNode(toMainNo, mn_cType, rn_cType),
+      vdfData.byNode(toMainNo, mn_tnOrient, rn_tnOrient),
+      vdfData.byNode(toMainNo, mn_tnMajFlw1, rn_tnMajFlw1),
+      vdfData.byNode(toMainNo, mn_tnMajFlw2, rn_tnMajFlw2),
+      vdfData.byNode(toMainNo, mn_tnode_fcs, rn_tnode_fcs),
+      vdfData.byNode(toMainNo, mn_tnode_orient, rn_tnode_orient),
+      vdfData.byNode(toMainNo, mn_tnode_fnorient, rn_tnode_fnorient),
+      vdfData.byNode(toMainNo, mn_tnode_turnorient, rn_tnode_turnorient),
+      vdfData.byNode(toMainNo, mn_tnode_laneturn_orients, rn_tnode_laneturn_orients),
+      vdfData.byNode(toMainNo, mn_tnode_laneturn_laneno, rn_tnode_laneturn_laneno))
+
+  except vdfData.LinkError as e:
       traceback.print_exc()
-      print("link fn=" + str(int(fn[i])) + " tn=" + str(int(tn[i])))
+      print("link fn=" + str(int(fn[e.link])) + " tn=" + str(int(tn[e.link])))
       sys.exit(1)
 
   #set results
-  VisumPy.helpers.SetMulti(Visum.Net.Links, "vdf_int_fc", int_fc) #intersecting functional class
-  VisumPy.helpers.SetMulti(Visum.Net.Links, "vdf_rl", rl) #exclusive right lanes
-  VisumPy.helpers.SetMulti(Visum.Net.Links, "vdf_tl", tl) #thru lanes
-  VisumPy.helpers.SetMulti(Visum.Net.Links, "vdf_ll", ll) #exclusive left lanes
-  VisumPy.helpers.SetMulti(Visum.Net.Links, "vdf_mid_link_cap", mid_link_cap) #mid-link capacity
-  VisumPy.helpers.SetMulti(Visum.Net.Links, "vdf_unc_sig_delay", unc_sig_delay) #uncongested signal delay
-  VisumPy.helpers.SetMulti(Visum.Net.Links, "vdf_int_cap", int_cap) #intersection capacity
+  networkSnapshot.SetMulti(Visum, "Links", "vdf_int_fc", vdf["int_fc"]) #intersecting functional class
+  networkSnapshot.SetMulti(Visum, "Links", "vdf_rl", vdf["rl"]) #exclusive right lanes
+  networkSnapshot.SetMulti(Visum, "Links", "vdf_tl", vdf["tl"]) #thru lanes
+  networkSnapshot.SetMulti(Visum, "Links", "vdf_ll", vdf["ll"]) #exclusive left lanes
+  networkSnapshot.SetMulti(Visum, "Links", "vdf_mid_link_cap", vdf["mid_link_cap"]) #mid-link capacity
+  networkSnapshot.SetMulti(Visum, "Links", "vdf_unc_sig_delay", vdf["unc_sig_delay"]) #uncongested signal delay
+  networkSnapshot.SetMulti(Visum, "Links", "vdf_int_cap", vdf["int_cap"]) #intersection capacity
 
   print("set results in version file")
 
   #set TYPENO = PLANNO for VDF parameter lookup in procedures
   #para_a is midlink a, para_b is midlink b, para_a2 is intersection a, para_b2 is intersection b
-  planNo = VisumPy.helpers.GetMulti(Visum.Net.Links, "PLANNO")
-  VisumPy.helpers.SetMulti(Visum.Net.Links, "TYPENO", planNo)
+  planNo = networkSnapshot.GetMulti(Visum, "Links", "PLANNO")
+  networkSnapshot.SetMulti(Visum, "Links", "TYPENO", planNo)
 
 def create_transit_everywhere_skims():
   warnings.simplefilter('ignore', tables.NaturalNameWarning)
@@ -2150,39 +2329,27 @@ def create_transit_everywhere_skims():
   # Origin Wait time array
   #this must exist in the MAZ data
   #tap_owt = (numpy.ones((num_taps,num_taps)) * mazData.TE_MAZ_OWT).transpose()
-  tap_owt = numpy.array([mazData.TE_MAZ_OWT,]*len(mazData.TE_MAZ_OWT)).transpose()
+  #tap_owt = numpy.array([mazData.TE_MAZ_OWT,]*len(mazData.TE_MAZ_OWT)).transpose()
+  tap_owt = omxWriter.IndexedMatrix(mazData.TE_MAZ_OWT.values.reshape(-1,1), numpy.arange(num_taps), numpy.zeros(num_taps))
   #tap_owt = numpy.ones((num_taps,num_taps))
 
-  #tap to taz lookup
-  tap_to_taz = dict(zip(mazData.MAZ, mazData.TAZ))
+  #taz skim row/col of each tap (tap x is maz x+1)
+  crosswalk = zoneCrosswalk.fromMazTable(mazData)
+  crosswalk.setTazs(sorted(omxFile_taz_mapping, key=omxFile_taz_mapping.get))
+  tap_taz_index = crosswalk.seqMazToTazIndex(numpy.arange(1, num_taps+1))
 
-  #create empty tap-tap matrix
-  tap_zero = numpy.zeros((num_taps,num_taps))
+  #create empty tap-tap matrix, written without allocating any chunks
+  tap_zero = scipy.sparse.csr_matrix((num_taps,num_taps))
 
-  # Create tap-tap auto distance and time matrices for each period
+  # Tap-tap auto distance and time matrices for each period, as the taz skims
+  # and the taz of each tap, expanded to taps a block of rows at a time when written
   tap_dist_skims = {}
   tap_time_skims = {}
 
   for tp in ['ea','am','md','pm','ev']:
       tp_omx = omxFile_taz_sov[tp]
-      taz_time = numpy.array(tp_omx['2'])
-      taz_dist = numpy.array(tp_omx['3'])
-
-      #create time skim
-      tap_time_skim = numpy.copy(tap_zero)
-      for (x,y), value in numpy.ndenumerate(tap_time_skim):
-          x_taz_index = omxFile_taz_mapping[tap_to_taz[x+1]]
-          y_taz_index = omxFile_taz_mapping[tap_to_taz[y+1]]
-          tap_time_skim[x,y] = taz_time[x_taz_index,y_taz_index]
-      tap_time_skims[tp] = tap_time_skim
-
-      #create dist skim
-      tap_dist_skim = numpy.copy(tap_zero)
-      for (x,y), value in numpy.ndenumerate(tap_time_skim):
-          x_taz_index = omxFile_taz_mapping[tap_to_taz[x+1]]
-          y_taz_index = omxFile_taz_mapping[tap_to_taz[y+1]]
-          tap_dist_skim[x,y] = taz_dist[x_taz_index,y_taz_index]
-      tap_dist_skims[tp] = tap_dist_skim
+      tap_time_skims[tp] = numpy.array(tp_omx['2'])
+      tap_dist_skims[tp] = numpy.array(tp_omx['3'])
 
   # Close all taz omx skim files
   for tp in ['ea','am','md','pm','ev']:
@@ -2199,40 +2366,40 @@ def create_transit_everywhere_skims():
           for tp in ['ea','am','md','pm','ev']:
               #set_id='set1'
               #tp='am'
-              omxFile = omx.open_file("outputs/skims/tap_skim_" + tp + "_" + set_id + ".omx" ,'w')
+              omxFile = openOmxFile("outputs/skims/tap_skim_" + tp + "_" + set_id + ".omx" ,'w')
               omxFile.close()
-              omxFile = omx.open_file("outputs/skims/tap_skim_" + tp + "_" + set_id + ".omx" ,'a')
+              omxFile = openOmxFile("outputs/skims/tap_skim_" + tp + "_" + set_id + ".omx" ,'a')
               omxFile.createMapping("NO",tap_ids, overwrite=True)
               #all skims except IVTT(Bus), IVT, OWT and FAR must be set to zero
               for skim_id in [3,4,5,8,9,10]:
-                  omxFile[str(skim_id)] = numpy.copy(tap_zero)
+                  writeOmxMatrix(omxFile, str(skim_id), tap_zero)
 
               #set IVTT(Bus) skim
-              omxFile['7'] = tap_time_skims[tp] * ivt_multiplier
+              writeOmxMatrix(omxFile, '7', omxWriter.IndexedMatrix(tap_time_skims[tp], tap_taz_index, scale=ivt_multiplier))
 
               #set IVT skim
-              omxFile['1'] = tap_time_skims[tp] * ivt_multiplier
+              writeOmxMatrix(omxFile, '1', omxWriter.IndexedMatrix(tap_time_skims[tp], tap_taz_index, scale=ivt_multiplier))
 
               #set OWT skim
-              omxFile['2'] = numpy.copy(tap_owt)
+              writeOmxMatrix(omxFile, '2', tap_owt)
 
               #set FAR skim
               #distance based vs fixed
               if flat_fare==0:
-                  omxFile['6'] = tap_dist_skims[tp] * fare_multiplier
+                  writeOmxMatrix(omxFile, '6', omxWriter.IndexedMatrix(tap_dist_skims[tp], tap_taz_index, scale=fare_multiplier))
               else:
-                  omxFile['6'] = numpy.ones((num_taps,num_taps)) * flat_fare
+                  writeOmxMatrix(omxFile, '6', omxWriter.IndexedMatrix([[flat_fare]], numpy.zeros(num_taps)))
               omxFile.close()
 
       else:
           #create empty skims for all tods
           for tp in ['ea','am','md','pm','ev']:
-              omxFile = omx.open_file("outputs/skims/tap_skim_" + tp + "_" + set_id + ".omx" ,'w')
+              omxFile = openOmxFile("outputs/skims/tap_skim_" + tp + "_" + set_id + ".omx" ,'w')
               omxFile.close()
-              omxFile = omx.open_file("outputs/skims/tap_skim_" + tp + "_" + set_id + ".omx" ,'a')
+              omxFile = openOmxFile("outputs/skims/tap_skim_" + tp + "_" + set_id + ".omx" ,'a')
               omxFile.createMapping("NO",tap_ids, overwrite=True)
               for skim_id in range(1, 11):
-                  omxFile[str(skim_id)] = numpy.copy(tap_zero)
+                  writeOmxMatrix(omxFile, str(skim_id), tap_zero)
               omxFile.close()
 
 
@@ -2277,9 +2444,20 @@ def create_transit_everywhere_skims():
   #f.close()
 
 
+def getSkimChangeDetector():
+  properties = Properties()
+  properties.loadPropertyFile("config\orramp.properties")
+  return(skimChange.SkimChangeDetector(properties.get('Skim.Change.Folder', 'outputs/other/skimChange'),
+    float(properties.get('Skim.Skip.Tolerance', 0)), properties.get('Skim.Skip.Log', 'outputs/other/skim_skip_log.csv')))
+
+def getTazDemand(Visum):
+  #demand matrices loaded by loadTripMatrices
+  matNums = {"sov":100, "hov2":101, "hov3":102, "truck":103, "sovtoll":104, "hov2toll":105, "hov3toll":106}
+  return(dict((name, numpy.asarray(VisumPy.helpers.GetMatrix(Visum, matNums[name]))) for name in matNums))
+
 def msaPrep(Visum, iteration):
 
-    dst_list = VisumPy.helpers.GetMulti(Visum.Net.Links, "Length")
+    dst_list = networkSnapshot.GetMulti(Visum, "Links", "Length")
     iter_array = [iteration]*len(dst_list)
 
     tcur_sov = [0]*len(dst_list)
@@ -2309,39 +2487,39 @@ def msaPrep(Visum, iteration):
 
 
     #set iteration count
-    VisumPy.helpers.SetMulti(Visum.Net.Links, "iter_count", iter_array)
+    networkSnapshot.SetMulti(Visum, "Links", "iter_count", iter_array)
 
     #set to zero if 1st iteration otherwise previous iteration tCur
     if iteration==1:
         #set previous iteration times to zero for 1st iteration
-        VisumPy.helpers.SetMulti(Visum.Net.Links, "tCur_SOV", tcur_sov)
-        VisumPy.helpers.SetMulti(Visum.Net.Links, "tCur_SOVToll", tcur_sovt)
-        VisumPy.helpers.SetMulti(Visum.Net.Links, "tCur_HOV2", tcur_hov2)
-        VisumPy.helpers.SetMulti(Visum.Net.Links, "tCur_HOV2Toll", tcur_hov2t)
-        VisumPy.helpers.SetMulti(Visum.Net.Links, "tCur_HOV3", tcur_hov3)
-        VisumPy.helpers.SetMulti(Visum.Net.Links, "tCur_HOV3Toll", tcur_hov3t)
-        VisumPy.helpers.SetMulti(Visum.Net.Links, "tCur_TRUCK", tcur_trk)
-       # VisumPy.helpers.SetMulti(Visum.Net.Links, "tCur_TRUCKToll", tcur_trkt)
+        networkSnapshot.SetMulti(Visum, "Links", "tCur_SOV", tcur_sov)
+        networkSnapshot.SetMulti(Visum, "Links", "tCur_SOVToll", tcur_sovt)
+        networkSnapshot.SetMulti(Visum, "Links", "tCur_HOV2", tcur_hov2)
+        networkSnapshot.SetMulti(Visum, "Links", "tCur_HOV2Toll", tcur_hov2t)
+        networkSnapshot.SetMulti(Visum, "Links", "tCur_HOV3", tcur_hov3)
+        networkSnapshot.SetMulti(Visum, "Links", "tCur_HOV3Toll", tcur_hov3t)
+        networkSnapshot.SetMulti(Visum, "Links", "tCur_TRUCK", tcur_trk)
+       # networkSnapshot.SetMulti(Visum, "Links", "tCur_TRUCKToll", tcur_trkt)
     else:
         #copy previous iteration times
-        tcur_sov = VisumPy.helpers.GetMulti(Visum.Net.Links, "TCUR_PRTSYS(SOV)")
-        tcur_sovt = VisumPy.helpers.GetMulti(Visum.Net.Links, "TCUR_PRTSYS(SOVTOLL)")
-        tcur_hov2 = VisumPy.helpers.GetMulti(Visum.Net.Links, "TCUR_PRTSYS(HOV2)")
-        tcur_hov2t = VisumPy.helpers.GetMulti(Visum.Net.Links, "TCUR_PRTSYS(HOV2TOLL)")
-        tcur_hov3 = VisumPy.helpers.GetMulti(Visum.Net.Links, "TCUR_PRTSYS(HOV3)")
-        tcur_hov3t = VisumPy.helpers.GetMulti(Visum.Net.Links, "TCUR_PRTSYS(HOV3TOLL)")
-        tcur_trk = VisumPy.helpers.GetMulti(Visum.Net.Links, "TCUR_PRTSYS(TRUCK)")
-       # tcur_trkt = VisumPy.helpers.GetMulti(Visum.Net.Links, "TCUR_PRTSYS(TRUCKTOLL)")
+        tcur_sov = networkSnapshot.GetMulti(Visum, "Links", "TCUR_PRTSYS(SOV)")
+        tcur_sovt = networkSnapshot.GetMulti(Visum, "Links", "TCUR_PRTSYS(SOVTOLL)")
+        tcur_hov2 = networkSnapshot.GetMulti(Visum, "Links", "TCUR_PRTSYS(HOV2)")
+        tcur_hov2t = networkSnapshot.GetMulti(Visum, "Links", "TCUR_PRTSYS(HOV2TOLL)")
+        tcur_hov3 = networkSnapshot.GetMulti(Visum, "Links", "TCUR_PRTSYS(HOV3)")
+        tcur_hov3t = networkSnapshot.GetMulti(Visum, "Links", "TCUR_PRTSYS(HOV3TOLL)")
+        tcur_trk = networkSnapshot.GetMulti(Visum, "Links", "TCUR_PRTSYS(TRUCK)")
+       # tcur_trkt = networkSnapshot.GetMulti(Visum, "Links", "TCUR_PRTSYS(TRUCKTOLL)")
 
         #set tCur UDAs to previou iteration times
-        VisumPy.helpers.SetMulti(Visum.Net.Links, "tCur_SOV", tcur_sov)
-        VisumPy.helpers.SetMulti(Visum.Net.Links, "tCur_SOVToll", tcur_sovt)
-        VisumPy.helpers.SetMulti(Visum.Net.Links, "tCur_HOV2", tcur_hov2)
-        VisumPy.helpers.SetMulti(Visum.Net.Links, "tCur_HOV2Toll", tcur_hov2t)
-        VisumPy.helpers.SetMulti(Visum.Net.Links, "tCur_HOV3", tcur_hov3)
-        VisumPy.helpers.SetMulti(Visum.Net.Links, "tCur_HOV3Toll", tcur_hov3t)
-        VisumPy.helpers.SetMulti(Visum.Net.Links, "tCur_TRUCK", tcur_trk)
-       # VisumPy.helpers.SetMulti(Visum.Net.Links, "tCur_TRUCKToll", tcur_trkt)
+        networkSnapshot.SetMulti(Visum, "Links", "tCur_SOV", tcur_sov)
+        networkSnapshot.SetMulti(Visum, "Links", "tCur_SOVToll", tcur_sovt)
+        networkSnapshot.SetMulti(Visum, "Links", "tCur_HOV2", tcur_hov2)
+        networkSnapshot.SetMulti(Visum, "Links", "tCur_HOV2Toll", tcur_hov2t)
+        networkSnapshot.SetMulti(Visum, "Links", "tCur_HOV3", tcur_hov3)
+        networkSnapshot.SetMulti(Visum, "Links", "tCur_HOV3Toll", tcur_hov3t)
+        networkSnapshot.SetMulti(Visum, "Links", "tCur_TRUCK", tcur_trk)
+       # networkSnapshot.SetMulti(Visum, "Links", "tCur_TRUCKToll", tcur_trkt)
 
 
 ############################################################
@@ -2399,6 +2577,7 @@ if __name__== "__main__":
       updateMazTotals(Visum)
       calculateDensityMeasures(Visum)
       setSeqMaz(Visum)
+      createZoneCrosswalk(Visum)
       saveVersion(Visum, "outputs/networks/MAZ_Level_Processing_Setup.ver")
       createAltFiles(Visum, "outputs/other")
       writeMazDataFile(Visum, "inputs/maz_data_export.csv")
@@ -2422,7 +2601,8 @@ if __name__== "__main__":
         loadVersion(Visum, "outputs/networks/MAZ_Level_Processing_Setup.ver") # TODO set inputVersionFile
         if Transit_Everywhere_Switch=='false':
             createMazToTap(Visum, mode, "outputs/skims")
-        loadProcedure(Visum, "config/visum/maz_skim_" + mode + ".xml")
+        if getMazSkimEngine() != 'python':
+          loadProcedure(Visum, "config/visum/maz_skim_" + mode + ".xml")
         createNearbyMazsFile(Visum, mode, "outputs/skims")
         saveVersion(Visum, "outputs/networks/" + mode + "_MAZ_Skim_Setup.ver")
       closeVisum(Visum)
@@ -2507,12 +2687,22 @@ if __name__== "__main__":
       #iteration number
       iteration = int(sys.argv[2].lower())
 
+      #skip assigning and skimming periods whose demand changed less than Skim.Skip.Tolerance
+      detector = getSkimChangeDetector()
+      if iteration == 1:
+        detector.clear()
+
       Visum = startVisum()
       for tp in ['ea','am','md','pm','ev']:
         loadVersion(Visum, "outputs/networks/Highway_Assignment_Results_" + tp + ".ver")
+        demand = getTazDemand(Visum)
+        skimFiles = ["outputs/skims/taz_skim_" + mode + "_" + tp + ".omx" for mode in ['sov','sovtoll','hov2','hov2toll','hov3','hov3toll','truck']]
+        if detector.canSkip("taz_skim", tp, "demand_" + tp, demand, skimFiles, iteration):
+          continue
         msaPrep(Visum, iteration)
         loadProcedure(Visum, "config/visum/taz_skim_" + tp + ".xml")
         saveVersion(Visum, "outputs/networks/Highway_Assignment_Results_" + tp + ".ver")
+        detector.save("demand_" + tp, demand)
       loadVersion(Visum, "outputs/networks/Highway_Assignment_Results_" + tp + ".ver")
       if Transit_Everywhere_Switch=='false':
           tazsToTapsForDriveAccess(Visum, "outputs/skims/drive_taz_tap.csv", "outputs/skims/tap_data.csv")
@@ -2536,16 +2726,16 @@ if __name__== "__main__":
       loadVersion(Visum, "outputs/networks/Highway_Assignment_Results_" + tp + ".ver")
       prepVDFData(Visum, "inputs/vdf_lookup_table.csv")
       loadProcedure(Visum, "config/visum/taz_skim_pkhr.xml")
-      linkID = VisumPy.helpers.GetMulti(Visum.Net.Links, "No")
-      mlc = VisumPy.helpers.GetMulti(Visum.Net.Links, "vdf_mid_link_cap")
-      inc = VisumPy.helpers.GetMulti(Visum.Net.Links, "vdf_int_cap")
+      linkID = networkSnapshot.GetMulti(Visum, "Links", "No")
+      mlc = networkSnapshot.GetMulti(Visum, "Links", "vdf_mid_link_cap")
+      inc = networkSnapshot.GetMulti(Visum, "Links", "vdf_int_cap")
       min_cap = mlc
       for i in range(len(linkID)):
         if inc[i]==0:
             min_cap[i] = mlc[i]
         else:
             min_cap[i] = min(mlc[i], inc[i])
-      VisumPy.helpers.SetMulti(Visum.Net.Links, "CapPrt", min_cap)
+      networkSnapshot.SetMulti(Visum, "Links", "CapPrt", min_cap)
       saveVersion(Visum, "outputs/networks/Highway_Assignment_Results_" + tp + ".ver")
       closeVisum(Visum)
     except Exception as e:
@@ -2571,8 +2761,8 @@ if __name__== "__main__":
           if Transit_Everywhere_Switch=='false':
               #find number of line routes and stop points
               loadVersion(Visum, "outputs/networks/Transit_Assignment_Results_am_set1.ver")
-              lineRoutes = VisumPy.helpers.GetMulti(Visum.Net.LineRoutes, "LineName")
-              stopPoints = VisumPy.helpers.GetMulti(Visum.Net.StopPoints, "StopAreaNo")
+              lineRoutes = networkSnapshot.GetMulti(Visum, "LineRoutes", "LineName")
+              stopPoints = networkSnapshot.GetMulti(Visum, "StopPoints", "StopAreaNo")
               numRoutes = len(lineRoutes) + 1
               numStops = len(stopPoints) + 1
 
@@ -2620,10 +2810,10 @@ if __name__== "__main__":
           for out_field in ["DUDEN", "EMPDEN", "TOTINT", "POPDEN", "RETDEN"]:
               #get attributes
               loadVersion(Visum, "outputs/networks/MAZ_Level_Processing_Setup.ver")
-              maz_var = VisumPy.helpers.GetMulti(Visum.Net.Zones, out_field)
+              maz_var = networkSnapshot.GetMulti(Visum, "Zones", out_field)
               #set attributes
               loadVersion(Visum, "outputs/networks/_Final_Assignment_Results.ver")
-              VisumPy.helpers.SetMulti(Visum.Net.MainZones, out_field, maz_var)
+              networkSnapshot.SetMulti(Visum, "MainZones", out_field, maz_var)
               saveVersion(Visum, "outputs/networks/_Final_Assignment_Results.ver")
 
           # Copy Transit Assignment Results
@@ -2635,14 +2825,14 @@ if __name__== "__main__":
                       out_field = tp + '_PTripsUnlinked_' + str(setid)
                       #get attributes
                       loadVersion(Visum, "outputs/networks/Transit_Assignment_Results_" + tp + "_set" + str(setid) + ".ver")
-                      line_utrips = VisumPy.helpers.GetMulti(Visum.Net.LineRoutes, "PTripsUnlinked(AP)")
+                      line_utrips = networkSnapshot.GetMulti(Visum, "LineRoutes", "PTripsUnlinked(AP)")
                       set_total = [sum(x) for x in zip(set_total, line_utrips)]
                       #set attributes
                       loadVersion(Visum, "outputs/networks/_Final_Assignment_Results.ver")
-                      VisumPy.helpers.SetMulti(Visum.Net.LineRoutes, out_field, line_utrips)
+                      networkSnapshot.SetMulti(Visum, "LineRoutes", out_field, line_utrips)
                       saveVersion(Visum, "outputs/networks/_Final_Assignment_Results.ver")
                   out_field = 'Daily_PTripsUnlinked_' + str(setid)
-                  VisumPy.helpers.SetMulti(Visum.Net.LineRoutes, out_field, set_total)
+                  networkSnapshot.SetMulti(Visum, "LineRoutes", out_field, set_total)
                   saveVersion(Visum, "outputs/networks/_Final_Assignment_Results.ver")
               # StopPoint
               keys = ['_PassBoard_', '_PassAlight_','_PassOrigin_','_PassDestination_','_PassTransTotal_','_PassThroughStop_','_PassThroughNoStop_']
@@ -2654,15 +2844,15 @@ if __name__== "__main__":
                       for tp in ['EA','AM','MD','PM','EV']:
                           #get attributes
                           loadVersion(Visum, "outputs/networks/Transit_Assignment_Results_" + tp + "_set" + str(setid) + ".ver")
-                          stop_var = VisumPy.helpers.GetMulti(Visum.Net.StopPoints, field_dict[field])
+                          stop_var = networkSnapshot.GetMulti(Visum, "StopPoints", field_dict[field])
                           set_total = [sum(x) for x in zip(set_total, stop_var)]
                           #set attributes
                           out_field = tp + field + str(setid)
                           loadVersion(Visum, "outputs/networks/_Final_Assignment_Results.ver")
-                          VisumPy.helpers.SetMulti(Visum.Net.StopPoints, out_field, stop_var)
+                          networkSnapshot.SetMulti(Visum, "StopPoints", out_field, stop_var)
                           saveVersion(Visum, "outputs/networks/_Final_Assignment_Results.ver")
                       out_field = 'Daily' + field + str(setid)
-                      VisumPy.helpers.SetMulti(Visum.Net.StopPoints, out_field, set_total)
+                      networkSnapshot.SetMulti(Visum, "StopPoints", out_field, set_total)
                       saveVersion(Visum, "outputs/networks/_Final_Assignment_Results.ver")
           print("export attributes..")
           #attributesZone = ["No","Name","XCOORD","YCOORD"]
@@ -2745,28 +2935,28 @@ if __name__== "__main__":
 
       Visum = startVisum()
       loadVersion(Visum, inputVersionFile)
-      dst_list = VisumPy.helpers.GetMulti(Visum.Net.Links, "Length")
-      link_planno = VisumPy.helpers.GetMulti(Visum.Net.Links, "PLANNO")
-      linkID = VisumPy.helpers.GetMulti(Visum.Net.Links, "No")
-      fromNode = VisumPy.helpers.GetMulti(Visum.Net.Links, "FromNodeNo")
-      toNode = VisumPy.helpers.GetMulti(Visum.Net.Links, "ToNodeNo")
-      ConnectorZone = VisumPy.helpers.GetMulti(Visum.Net.Connectors, "ZoneNo")
-      ConnectorDir = VisumPy.helpers.GetMulti(Visum.Net.Connectors, "Direction")
-      countLocs = VisumPy.helpers.GetMulti(Visum.Net.CountLocations, "No")
-      planno = VisumPy.helpers.GetMulti(Visum.Net.CountLocations, "Link\PLANNO")
-      am_count = VisumPy.helpers.GetMulti(Visum.Net.CountLocations, "AM_COUNT")
-      md_count = VisumPy.helpers.GetMulti(Visum.Net.CountLocations, "MD_COUNT")
-      pm_count = VisumPy.helpers.GetMulti(Visum.Net.CountLocations, "PM_COUNT")
-      day_count = VisumPy.helpers.GetMulti(Visum.Net.CountLocations, "DAY_COUNT_FINAL")
+      dst_list = networkSnapshot.GetMulti(Visum, "Links", "Length")
+      link_planno = networkSnapshot.GetMulti(Visum, "Links", "PLANNO")
+      linkID = networkSnapshot.GetMulti(Visum, "Links", "No")
+      fromNode = networkSnapshot.GetMulti(Visum, "Links", "FromNodeNo")
+      toNode = networkSnapshot.GetMulti(Visum, "Links", "ToNodeNo")
+      ConnectorZone = networkSnapshot.GetMulti(Visum, "Connectors", "ZoneNo")
+      ConnectorDir = networkSnapshot.GetMulti(Visum, "Connectors", "Direction")
+      countLocs = networkSnapshot.GetMulti(Visum, "CountLocations", "No")
+      planno = networkSnapshot.GetMulti(Visum, "CountLocations", "Link\PLANNO")
+      am_count = networkSnapshot.GetMulti(Visum, "CountLocations", "AM_COUNT")
+      md_count = networkSnapshot.GetMulti(Visum, "CountLocations", "MD_COUNT")
+      pm_count = networkSnapshot.GetMulti(Visum, "CountLocations", "PM_COUNT")
+      day_count = networkSnapshot.GetMulti(Visum, "CountLocations", "DAY_COUNT_FINAL")
       
       # get centroi connector list for NM assignment
       loadVersion(Visum, "outputs/networks/Bike_Assignment_Results_ea.ver")
-      NMConnectorZone = VisumPy.helpers.GetMulti(Visum.Net.Connectors, "ZoneNo")
+      NMConnectorZone = networkSnapshot.GetMulti(Visum, "Connectors", "ZoneNo")
 
       #do not generate transit summary for transit everywhere
       if Transit_Everywhere_Switch=='false':
           loadVersion(Visum, "outputs/networks/Transit_Assignment_Results_am_set1.ver")
-          lineRoutes = VisumPy.helpers.GetMulti(Visum.Net.LineRoutes, "LineName")
+          lineRoutes = networkSnapshot.GetMulti(Visum, "LineRoutes", "LineName")
           numRoutes = len(lineRoutes) + 1
           #print("Number of Routes: " + str(numRoutes)
           lineUTrips = [[0]*numRoutes for i in range(6)]
@@ -2808,47 +2998,47 @@ if __name__== "__main__":
       tod_cnt = 0
       for tp in ['ea','am','md','pm','ev']:
         loadVersion(Visum, "outputs/networks/Highway_Assignment_Results_" + tp + ".ver")
-        vol_list[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.CountLocations, "Link\VolVehPrT(AP)")
-        all_vol_list[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.Links, "VolVehPrT(AP)")
-        sov_list = VisumPy.helpers.GetMulti(Visum.Net.Links, "VolVeh_TSys(SOV,AP)")
-        sovt_list = VisumPy.helpers.GetMulti(Visum.Net.Links, "VolVeh_TSys(SOVTOLL,AP)")
-        hv2_list = VisumPy.helpers.GetMulti(Visum.Net.Links, "VolVeh_TSys(HOV2,AP)")
-        hv3_list = VisumPy.helpers.GetMulti(Visum.Net.Links, "VolVeh_TSys(HOV3,AP)")
-        trk_list = VisumPy.helpers.GetMulti(Visum.Net.Links, "VolVeh_TSys(Truck,AP)")
-        all_vol_list_cc[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.Connectors, "VolVehPrT(AP)")
-        sov_list_cc = VisumPy.helpers.GetMulti(Visum.Net.Connectors, "VolVeh_TSys(SOV,AP)")
-        sovt_list_cc = VisumPy.helpers.GetMulti(Visum.Net.Connectors, "VolVeh_TSys(SOVTOLL,AP)")
-        hv2_list_cc = VisumPy.helpers.GetMulti(Visum.Net.Connectors, "VolVeh_TSys(HOV2,AP)")
-        hv3_list_cc = VisumPy.helpers.GetMulti(Visum.Net.Connectors, "VolVeh_TSys(HOV3,AP)")
-        trk_list_cc = VisumPy.helpers.GetMulti(Visum.Net.Connectors, "VolVeh_TSys(Truck,AP)")
-        auto_speed[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.Links, "VCUR_PRTSYS(SOV)")
-        truck_speed[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.Links, "VCUR_PRTSYS(TRUCK)")
-        tcur_bike[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.Links, "TCUR_PRTSYS(BIKE)")
-        tcur_hov2[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.Links, "TCUR_PRTSYS(HOV2)")
-        tcur_hov2t[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.Links, "TCUR_PRTSYS(HOV2TOLL)")
-        tcur_hov3[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.Links, "TCUR_PRTSYS(HOV3)")
-        tcur_hov3t[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.Links, "TCUR_PRTSYS(HOV3TOLL)")
-        tcur_sov[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.Links, "TCUR_PRTSYS(SOV)")
-        tcur_sovt[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.Links, "TCUR_PRTSYS(SOVTOLL)")
-        tcur_trk[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.Links, "TCUR_PRTSYS(TRUCK)")
-        #tcur_trkt[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.Links, "TCUR_PRTSYS(TRUCKTOLL)")
-        tcur_walk[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.Links, "TCUR_PRTSYS(WALK)")
-        mlc[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.Links, "vdf_mid_link_cap")
-        inc[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.Links, "vdf_int_cap")
+        vol_list[tod_cnt] = networkSnapshot.GetMulti(Visum, "CountLocations", "Link\VolVehPrT(AP)")
+        all_vol_list[tod_cnt] = networkSnapshot.GetMulti(Visum, "Links", "VolVehPrT(AP)")
+        sov_list = networkSnapshot.GetMulti(Visum, "Links", "VolVeh_TSys(SOV,AP)")
+        sovt_list = networkSnapshot.GetMulti(Visum, "Links", "VolVeh_TSys(SOVTOLL,AP)")
+        hv2_list = networkSnapshot.GetMulti(Visum, "Links", "VolVeh_TSys(HOV2,AP)")
+        hv3_list = networkSnapshot.GetMulti(Visum, "Links", "VolVeh_TSys(HOV3,AP)")
+        trk_list = networkSnapshot.GetMulti(Visum, "Links", "VolVeh_TSys(Truck,AP)")
+        all_vol_list_cc[tod_cnt] = networkSnapshot.GetMulti(Visum, "Connectors", "VolVehPrT(AP)")
+        sov_list_cc = networkSnapshot.GetMulti(Visum, "Connectors", "VolVeh_TSys(SOV,AP)")
+        sovt_list_cc = networkSnapshot.GetMulti(Visum, "Connectors", "VolVeh_TSys(SOVTOLL,AP)")
+        hv2_list_cc = networkSnapshot.GetMulti(Visum, "Connectors", "VolVeh_TSys(HOV2,AP)")
+        hv3_list_cc = networkSnapshot.GetMulti(Visum, "Connectors", "VolVeh_TSys(HOV3,AP)")
+        trk_list_cc = networkSnapshot.GetMulti(Visum, "Connectors", "VolVeh_TSys(Truck,AP)")
+        auto_speed[tod_cnt] = networkSnapshot.GetMulti(Visum, "Links", "VCUR_PRTSYS(SOV)")
+        truck_speed[tod_cnt] = networkSnapshot.GetMulti(Visum, "Links", "VCUR_PRTSYS(TRUCK)")
+        tcur_bike[tod_cnt] = networkSnapshot.GetMulti(Visum, "Links", "TCUR_PRTSYS(BIKE)")
+        tcur_hov2[tod_cnt] = networkSnapshot.GetMulti(Visum, "Links", "TCUR_PRTSYS(HOV2)")
+        tcur_hov2t[tod_cnt] = networkSnapshot.GetMulti(Visum, "Links", "TCUR_PRTSYS(HOV2TOLL)")
+        tcur_hov3[tod_cnt] = networkSnapshot.GetMulti(Visum, "Links", "TCUR_PRTSYS(HOV3)")
+        tcur_hov3t[tod_cnt] = networkSnapshot.GetMulti(Visum, "Links", "TCUR_PRTSYS(HOV3TOLL)")
+        tcur_sov[tod_cnt] = networkSnapshot.GetMulti(Visum, "Links", "TCUR_PRTSYS(SOV)")
+        tcur_sovt[tod_cnt] = networkSnapshot.GetMulti(Visum, "Links", "TCUR_PRTSYS(SOVTOLL)")
+        tcur_trk[tod_cnt] = networkSnapshot.GetMulti(Visum, "Links", "TCUR_PRTSYS(TRUCK)")
+        #tcur_trkt[tod_cnt] = networkSnapshot.GetMulti(Visum, "Links", "TCUR_PRTSYS(TRUCKTOLL)")
+        tcur_walk[tod_cnt] = networkSnapshot.GetMulti(Visum, "Links", "TCUR_PRTSYS(WALK)")
+        mlc[tod_cnt] = networkSnapshot.GetMulti(Visum, "Links", "vdf_mid_link_cap")
+        inc[tod_cnt] = networkSnapshot.GetMulti(Visum, "Links", "vdf_int_cap")
         
         # get walk and bike volumes
         loadVersion(Visum, "outputs/networks/Bike_Assignment_Results_" + tp + ".ver")
-        bike_vol_list[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.Links, "VolVehPrT(AP)")
-        bike_vol_list_cc[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.Connectors, "VolVehPrT(AP)")
+        bike_vol_list[tod_cnt] = networkSnapshot.GetMulti(Visum, "Links", "VolVehPrT(AP)")
+        bike_vol_list_cc[tod_cnt] = networkSnapshot.GetMulti(Visum, "Connectors", "VolVehPrT(AP)")
         
         loadVersion(Visum, "outputs/networks/Walk_Assignment_Results_" + tp + ".ver")
-        walk_vol_list[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.Links, "VolVehPrT(AP)")
-        walk_vol_list_cc[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.Connectors, "VolVehPrT(AP)")
+        walk_vol_list[tod_cnt] = networkSnapshot.GetMulti(Visum, "Links", "VolVehPrT(AP)")
+        walk_vol_list_cc[tod_cnt] = networkSnapshot.GetMulti(Visum, "Connectors", "VolVehPrT(AP)")
         
         #do not generate transit summary for transit everywhere
         if Transit_Everywhere_Switch=='false':
             loadVersion(Visum, "outputs/networks/Transit_Assignment_Results_" + tp + "_set1.ver")
-            line_utrips = VisumPy.helpers.GetMulti(Visum.Net.LineRoutes, "PTripsUnlinked(AP)")
+            line_utrips = networkSnapshot.GetMulti(Visum, "LineRoutes", "PTripsUnlinked(AP)")
             for rt in range(numRoutes-1):
               lineUTrips[tod_cnt][rt] = line_utrips[rt]
             lineUTrips[tod_cnt][numRoutes-1] = sum(line_utrips)
@@ -2879,10 +3069,10 @@ if __name__== "__main__":
           walk_vol_list_cc[5][i] = walk_vol_list_cc[5][i] + walk_vol_list_cc[tod_cnt][i]
           
         loadVersion(Visum, "outputs/networks/Highway_Assignment_Results_" + tp + ".ver")
-        VisumPy.helpers.SetMulti(Visum.Net.Links, "CapPrt", min_cap[tod_cnt])
+        networkSnapshot.SetMulti(Visum, "Links", "CapPrt", min_cap[tod_cnt])
         saveVersion(Visum, "outputs/networks/Highway_Assignment_Results_" + tp + ".ver")
         #get vc ratio after setting the CapPrt with mlc for the current period
-        vc_ratio[tod_cnt] = VisumPy.helpers.GetMulti(Visum.Net.Links, "VOLCAPRATIOPRT(AP)")
+        vc_ratio[tod_cnt] = networkSnapshot.GetMulti(Visum, "Links", "VOLCAPRATIOPRT(AP)")
 
         #compute VMT
         vmt_list[tod_cnt][0] = numpy.dot(dst_list, sov_list) + numpy.dot(dst_list, sovt_list)
@@ -2975,7 +3165,7 @@ if __name__== "__main__":
                   field_name = tod_var + "_Speed_" + mode_var
                   if field_name not in udaNames:
                       Visum.Net.Links.AddUserDefinedAttribute(field_name,field_name,field_name,2,3)
-                  VisumPy.helpers.SetMulti(Visum.Net.Links, field_name, set_list[tod_cnt])
+                  networkSnapshot.SetMulti(Visum, "Links", field_name, set_list[tod_cnt])
                   tod_cnt = tod_cnt + 1
               mode_count = mode_count + 1
 
@@ -2989,7 +3179,7 @@ if __name__== "__main__":
                   field_name = tod_var + "_tCur_" + mode_var
                   if field_name not in udaNames:
                       Visum.Net.Links.AddUserDefinedAttribute(field_name,field_name,field_name,2,3)
-                  VisumPy.helpers.SetMulti(Visum.Net.Links, field_name, set_list[tod_cnt])
+                  networkSnapshot.SetMulti(Visum, "Links", field_name, set_list[tod_cnt])
                   tod_cnt = tod_cnt + 1
 
           
@@ -2999,7 +3189,7 @@ if __name__== "__main__":
               field_name = tod_var + "_VOLCAPRATIOPRT"
               if field_name not in udaNames:
                   Visum.Net.Links.AddUserDefinedAttribute(field_name,field_name,field_name,2,3)
-              VisumPy.helpers.SetMulti(Visum.Net.Links, field_name, vc_ratio[tod_cnt])
+              networkSnapshot.SetMulti(Visum, "Links", field_name, vc_ratio[tod_cnt])
               tod_cnt = tod_cnt + 1
 
               
@@ -3009,7 +3199,7 @@ if __name__== "__main__":
               field_name = tod_var + "_VDF_MID_LINK_CAP"
               if field_name not in udaNames:
                   Visum.Net.Links.AddUserDefinedAttribute(field_name,field_name,field_name,2,3)
-              VisumPy.helpers.SetMulti(Visum.Net.Links, field_name, mlc[tod_cnt])
+              networkSnapshot.SetMulti(Visum, "Links", field_name, mlc[tod_cnt])
               tod_cnt = tod_cnt + 1
 
               
@@ -3019,7 +3209,7 @@ if __name__== "__main__":
               field_name = tod_var + "_VDF_INT_CAP"
               if field_name not in udaNames:
                   Visum.Net.Links.AddUserDefinedAttribute(field_name,field_name,field_name,2,3)
-              VisumPy.helpers.SetMulti(Visum.Net.Links, field_name, inc[tod_cnt])
+              networkSnapshot.SetMulti(Visum, "Links", field_name, inc[tod_cnt])
               tod_cnt = tod_cnt + 1
 
           # write out capPrt to each period version files
@@ -3028,7 +3218,7 @@ if __name__== "__main__":
               field_name = tod_var + "_CAPPRT"
               if field_name not in udaNames:
                   Visum.Net.Links.AddUserDefinedAttribute(field_name,field_name,field_name,2,3)
-              VisumPy.helpers.SetMulti(Visum.Net.Links, field_name, min_cap[tod_cnt])
+              networkSnapshot.SetMulti(Visum, "Links", field_name, min_cap[tod_cnt])
               tod_cnt = tod_cnt + 1
 
               
@@ -3051,7 +3241,7 @@ if __name__== "__main__":
                   field_name = tod_var + "_Vol_" + mode_var
                   if field_name not in udaNames:
                       Visum.Net.Links.AddUserDefinedAttribute(field_name,field_name,field_name,2,3)
-                      VisumPy.helpers.SetMulti(Visum.Net.Links, field_name, set_list[tod_cnt])
+                      networkSnapshot.SetMulti(Visum, "Links", field_name, set_list[tod_cnt])
                       tod_cnt = tod_cnt + 1
               mode_count = mode_count + 1
           
@@ -3075,7 +3265,7 @@ if __name__== "__main__":
                 field_name = tod_var + "_Vol_" + mode_var
                 if field_name not in udaNames_cc:
                     Visum.Net.Connectors.AddUserDefinedAttribute(field_name,field_name,field_name,2,3)
-                VisumPy.helpers.SetMulti(Visum.Net.Connectors, field_name, set_list[tod_cnt])
+                networkSnapshot.SetMulti(Visum, "Connectors", field_name, set_list[tod_cnt])
                 tod_cnt = tod_cnt + 1
               mode_count = mode_count + 1
           saveVersion(Visum, "outputs/networks/Highway_Assignment_Results_" + tp + ".ver")
@@ -3093,7 +3283,7 @@ if __name__== "__main__":
               field_name = tod_var + "_Vol_BIKE"
               if field_name not in udaNames_nm:
                   Visum.Net.Links.AddUserDefinedAttribute(field_name,field_name,field_name,2,3)
-              VisumPy.helpers.SetMulti(Visum.Net.Links, field_name, bike_vol_list[tod_cnt])
+              networkSnapshot.SetMulti(Visum, "Links", field_name, bike_vol_list[tod_cnt])
               tod_cnt = tod_cnt + 1
           
           # write out final centroid connector Bike volumes to each period version files
@@ -3107,7 +3297,7 @@ if __name__== "__main__":
               field_name = tod_var + "_Vol_" + mode_var
               if field_name not in udaNames_cc:
                   Visum.Net.Connectors.AddUserDefinedAttribute(field_name,field_name,field_name,2,3)
-              VisumPy.helpers.SetMulti(Visum.Net.Connectors, field_name, bike_vol_list_cc[tod_cnt])
+              networkSnapshot.SetMulti(Visum, "Connectors", field_name, bike_vol_list_cc[tod_cnt])
               tod_cnt = tod_cnt + 1
           saveVersion(Visum, "outputs/networks/Bike_Assignment_Results_" + tp + ".ver")
           closeVisum(Visum)
@@ -3124,7 +3314,7 @@ if __name__== "__main__":
               field_name = tod_var + "_Vol_WALK"
               if field_name not in udaNames_nm:
                   Visum.Net.Links.AddUserDefinedAttribute(field_name,field_name,field_name,2,3)
-              VisumPy.helpers.SetMulti(Visum.Net.Links, field_name, walk_vol_list[tod_cnt])
+              networkSnapshot.SetMulti(Visum, "Links", field_name, walk_vol_list[tod_cnt])
               tod_cnt = tod_cnt + 1
         
           # write out final centroid connector Bike volumes to each period version files
@@ -3138,7 +3328,7 @@ if __name__== "__main__":
               field_name = tod_var + "_Vol_" + mode_var
               if field_name not in udaNames_cc:
                   Visum.Net.Connectors.AddUserDefinedAttribute(field_name,field_name,field_name,2,3)
-              VisumPy.helpers.SetMulti(Visum.Net.Connectors, field_name, walk_vol_list_cc[tod_cnt])
+              networkSnapshot.SetMulti(Visum, "Connectors", field_name, walk_vol_list_cc[tod_cnt])
               tod_cnt = tod_cnt + 1
           saveVersion(Visum, "outputs/networks/Walk_Assignment_Results_" + tp + ".ver")
           closeVisum(Visum)
@@ -3195,11 +3385,10 @@ if __name__== "__main__":
               loadProcedure(Visum, "config/visum/tap_skim_speed_" + tp + ".xml")
               loadProcedure(Visum, "config/visum/tap_skim_" + tp + "_set" + setid + ".xml")
               saveVersion(Visum, "outputs/networks/Transit_Assignment_Results_" + tp + "_set" + setid + ".ver")
-              updateFareSkim(Visum, "outputs/skims/fare.omx", "fare",
-                "outputs/skims/tap_skim_" + tp + "_set" + setid + ".omx", "6")
-            reviseDuplicateSkims(Visum, "outputs/skims/tap_skim_" + tp + "_set1.omx",
-              "outputs/skims/tap_skim_" + tp + "_set2.omx", "outputs/skims/tap_skim_" + tp + "_set3.omx")
           closeVisum(Visum)
+          updateFareSkims("outputs/skims/fare.omx", "fare", ["outputs/skims/tap_skim_" + tp + "_set" + setid + ".omx"
+            for tp in ['ea','am','md','pm','ev'] for setid in ['1','2','3']], "6")
+          reviseDuplicateSkimPeriods(['ea','am','md','pm','ev'])
       else:
           create_transit_everywhere_skims()
 
@@ -3218,21 +3407,30 @@ if __name__== "__main__":
 
       #create dummy skims for Transit Everywhere scenario
       if Transit_Everywhere_Switch=='false':
+          #skip transit skimming periods whose link speeds changed less than Skim.Skip.Tolerance
+          detector = getSkimChangeDetector()
+          skimmedPeriods = []
+
           Visum = startVisum()
           for tp in ['ea','am','md','pm','ev']:
             loadVersion(Visum, "outputs/networks/Highway_Assignment_Results_" + tp + ".ver")
             saveLinkSpeeds(Visum, "outputs/networks/Highway_Assignment_Link_Speeds_" + tp + ".csv")
+            speeds = {"speed":networkSnapshot.GetMulti(Visum, "Links", "VCur_PrTSys(HOV3Toll)")}
+            skimFiles = ["outputs/skims/tap_skim_" + tp + "_set" + setid + ".omx" for setid in ['1','2','3']]
+            if detector.canSkip("tap_skim", tp, "speeds_" + tp, speeds, skimFiles):
+              continue
             for setid in ['1','2','3']:
               loadVersion(Visum, "outputs/networks/Transit_Assignment_Results_" + tp + "_set" + setid + ".ver")
               loadLinkSpeeds(Visum, "outputs/networks/Highway_Assignment_Link_Speeds_" + tp + ".csv")
               loadProcedure(Visum, "config/visum/tap_skim_" + tp + ".xml")
               loadProcedure(Visum, "config/visum/tap_skim_" + tp + "_set" + setid + ".xml")
               saveVersion(Visum, "outputs/networks/Transit_Assignment_Results_" + tp + "_set" + setid + ".ver")
-              updateFareSkim(Visum, "outputs/skims/fare.omx", "fare",
-                "outputs/skims/tap_skim_" + tp + "_set" + setid + ".omx", "6")
-            reviseDuplicateSkims(Visum, "outputs/skims/tap_skim_" + tp + "_set1.omx",
-              "outputs/skims/tap_skim_" + tp + "_set2.omx", "outputs/skims/tap_skim_" + tp + "_set3.omx")
+            detector.save("speeds_" + tp, speeds)
+            skimmedPeriods.append(tp)
           closeVisum(Visum)
+          updateFareSkims("outputs/skims/fare.omx", "fare", ["outputs/skims/tap_skim_" + tp + "_set" + setid + ".omx"
+            for tp in skimmedPeriods for setid in ['1','2','3']], "6")
+          reviseDuplicateSkimPeriods(skimmedPeriods)
     except Exception as e:
       print(runmode + " Failed")
       print(e)
@@ -3256,11 +3454,13 @@ if __name__== "__main__":
         #build ct-ramp trip matrices
         tripFileName = "outputs/other/indivTripData.csv"
         jtripFileName = "outputs/other/jointTripData.csv"
+        cacheCtrampOutputs()
         
         Visum = startVisum()
         loadVersion(Visum, "outputs/networks/_Final_Assignment_Results.ver")
         buildTripMatrices(Visum, tripFileName, jtripFileName, hhsamplerate, "outputs/skims/tap_data.csv", 
-          "outputs/trips/ctrampTazTrips_" + tp + ".omx", "outputs/trips/ctrampTapTrips_" + tp + ".omx", "outputs/trips/tapParks.csv", tp, tps)
+          "outputs/trips/ctrampTazTrips_" + tp + ".omx", "outputs/trips/ctrampTapTrips_" + tp + ".omx", "outputs/trips/tapParks.csv", tp, tps,
+          "outputs/trips/ctrampNmTrips_" + tp + ".omx")
       
         #load trip matrices
         #taz
@@ -3268,13 +3468,6 @@ if __name__== "__main__":
         saveVersion(Visum, "outputs/networks/Highway_Assignment_Results_" + tp + ".ver")        
         closeVisum(Visum)
         
-        print("Build non-motorized trip matrices") # DEBUG
-        Visum = startVisum()
-        # Debug loading matrices into highway version file
-        loadVersion(Visum, "outputs/networks/Walk_Assignment_Results_pm.ver") # 2570 zones
-        buildNmTripMatrices(Visum, tripFileName, jtripFileName, hhsamplerate, "outputs/trips/ctrampNmTrips_" + tp + ".omx", tp, tps)
-        closeVisum(Visum)
-        
         for mode in ['walk','bike']:
           # Debug loading matrices into highway version file
           # loadVersion(Visum, "outputs/networks/Highway_Skimming_Assignment_Setup.ver") # TODO switch to MAZ
@@ -3287,20 +3480,14 @@ if __name__== "__main__":
         #build ct-ramp trip matrices
         tripFileName = "outputs/other/indivTripData_" + str(iteration) + ".csv"
         jtripFileName = "outputs/other/jointTripData_" + str(iteration) + ".csv"
+        cacheCtrampOutputs(iteration)
 
-        print("Build auto trip matrices") # DEBUG
+        print("Build auto, transit and non-motorized trip matrices") # DEBUG
         Visum = startVisum()
         loadVersion(Visum, "outputs/networks/Highway_Assignment_Results_am.ver")
         buildTripMatrices(Visum, tripFileName, jtripFileName, hhsamplerate, "outputs/skims/tap_data.csv",
-          "outputs/trips/ctrampTazTrips.omx", "outputs/trips/ctrampTapTrips.omx", "outputs/trips/tapParks.csv")
-        closeVisum(Visum)
-
-        print("Build non-motorized trip matrices") # DEBUG
-        Visum = startVisum()
-        # Debug loading matrices into highway version file
-        # loadVersion(Visum, "outputs/networks/Highway_Skimming_Assignment_Setup.ver") # TODO switch to MAZ
-        loadVersion(Visum, "outputs/networks/Walk_MAZ_Skim_Setup.ver") # 2570 zones
-        buildNmTripMatrices(Visum, tripFileName, jtripFileName, hhsamplerate, "outputs/trips/ctrampNmTrips.omx")
+          "outputs/trips/ctrampTazTrips.omx", "outputs/trips/ctrampTapTrips.omx", "outputs/trips/tapParks.csv",
+          fileNameNm="outputs/trips/ctrampNmTrips.omx")
         closeVisum(Visum)
 
         #load trip matrices
@@ -0,0 +1,172 @@
+#Southern Oregon ABM access path engine
+#Bounded shortest path times (or distances) from network nodes (e.g. TAP stop
+#area nodes) or zones to zones over the links, turns and connectors of one
+#transport system, an alternative to Visum isochrone runs and full MAZ skims
+#with batched multi-source Dijkstra runs
+
+############################################################
+
+import multiprocessing
+import numpy
+import scipy.sparse
+from scipy.sparse import csgraph
+import zoneCrosswalk
+
+############################################################
+
+MIN_TIME = 1e-6 #zero time edges are stored as this so they remain graph edges
+DEFAULT_BATCH_SIZE = 64
+
+def edgeMinimum(fromPos, toPos, times, numVertices):
+  #csr graph of the fastest of parallel edges
+  times = numpy.maximum(times, MIN_TIME)
+  order = numpy.lexsort((times, toPos, fromPos))
+  fromPos, toPos, times = fromPos[order], toPos[order], times[order]
+  first = numpy.ones(len(order), dtype=bool)
+  first[1:] = (fromPos[1:] != fromPos[:-1]) | (toPos[1:] != toPos[:-1])
+  return(scipy.sparse.csr_matrix((times[first], (fromPos[first], toPos[first])), shape=(numVertices, numVertices)))
+
+def runStarts(keys):
+  #position of the first of each run of equal sorted keys
+  return(numpy.flatnonzero(numpy.r_[True, keys[1:] != keys[:-1]]) if len(keys) > 0 else numpy.zeros(0, dtype=numpy.int64))
+
+class AccessGraph:
+  """
+    Turn expanded graph of the links of one transport system and its origin and
+    destination connectors.  Links are one direction each, as in Visum.  There
+    is a vertex per node, where paths from that node (or from an origin connector
+    to it) start, a vertex per link, reached at its to node, and with zoneOrigins
+    a vertex per zone that leads to its origin connector nodes.  A link leads to
+    the next link over the turn between them, unless turns gives that turn as
+    closed, adding its turn time.  zoneTimes() returns, for a batch of sources,
+    the time to every zone within a maximum time, where the time to a zone is
+    the fastest arrival at one of its destination connector nodes plus the
+    connector time.  Sources are node positions (nodeIndex) or, with
+    zoneOrigins, zone vertices (zoneIndex), so paths never pass through a zone.
+    Times can be any additive cost, e.g. lengths for a distance skim.  turns is
+    None (all turns open, no turn times) or the (from node, via node, to node,
+    time, open) arrays of the network turns; link pairs without a turn are open.
+  """
+  def __init__(self, nodeIds, fromNodes, toNodes, linkTimes, zoneIds, origZones, origNodes, origTimes,
+    destZones, destNodes, destTimes, turns=None, zoneOrigins=False):
+    self.nodeIds = numpy.asarray(nodeIds, dtype=numpy.int64)
+    self.zoneIds = numpy.asarray(zoneIds, dtype=numpy.int64)
+    self.nodeLookup = zoneCrosswalk.createLookup(self.nodeIds)
+    nodeLookup = self.nodeLookup
+    zoneLookup = zoneCrosswalk.createLookup(self.zoneIds)
+    numNodes = len(self.nodeIds)
+
+    #links, as vertices after the nodes
+    fromPos = zoneCrosswalk.applyLookup(nodeLookup, fromNodes, "link node")
+    toPos = zoneCrosswalk.applyLookup(nodeLookup, toNodes, "link node")
+    linkTimes = numpy.asarray(linkTimes, dtype=numpy.float64)
+    numLinks = len(fromPos)
+    self.numVertices = numNodes + numLinks
+
+    #paths start at a node vertex with any of its out links
+    edgeFrom = [fromPos]
+    edgeTo = [numNodes + numpy.arange(numLinks)]
+    edgeTimes = [linkTimes]
+
+    #link to out link at its to node, over the turn
+    outOrder = numpy.argsort(fromPos, kind="stable")
+    outStarts = numpy.searchsorted(fromPos[outOrder], numpy.arange(numNodes + 1))
+    outCounts = numpy.diff(outStarts)[toPos]
+    inLink = numpy.repeat(numpy.arange(numLinks), outCounts)
+    offsets = numpy.arange(len(inLink)) - numpy.repeat(numpy.cumsum(outCounts) - outCounts, outCounts)
+    outLink = outOrder[numpy.repeat(outStarts[:-1][toPos], outCounts) + offsets]
+    turnTimes = numpy.zeros(len(inLink))
+    if turns is not None and len(turns[0]) > 0:
+      turnFrom, turnVia, turnTo, times, isOpen = turns
+      turnKeys = self.turnKeys(zoneCrosswalk.applyLookup(nodeLookup, turnFrom, "turn node"),
+        zoneCrosswalk.applyLookup(nodeLookup, turnVia, "turn node"), zoneCrosswalk.applyLookup(nodeLookup, turnTo, "turn node"))
+      order = numpy.argsort(turnKeys, kind="stable")
+      turnKeys = turnKeys[order]
+      times = numpy.asarray(times, dtype=numpy.float64)[order]
+      isOpen = numpy.asarray(isOpen, dtype=bool)[order]
+      pairKeys = self.turnKeys(fromPos[inLink], toPos[inLink], toPos[outLink])
+      found = numpy.minimum(numpy.searchsorted(turnKeys, pairKeys), len(turnKeys) - 1)
+      hasTurn = turnKeys[found] == pairKeys
+      keep = ~hasTurn | isOpen[found]
+      turnTimes = numpy.where(hasTurn, times[found], 0.0)[keep]
+      inLink, outLink = inLink[keep], outLink[keep]
+    edgeFrom.append(numNodes + inLink)
+    edgeTo.append(numNodes + outLink)
+    edgeTimes.append(turnTimes + linkTimes[outLink])
+
+    #zone vertices after the links, with an edge to the node vertex of each origin connector
+    if zoneOrigins:
+      edgeFrom.append(self.numVertices + zoneCrosswalk.applyLookup(zoneLookup, origZones, "connector zone"))
+      edgeTo.append(zoneCrosswalk.applyLookup(nodeLookup, origNodes, "connector node"))
+      edgeTimes.append(numpy.asarray(origTimes, dtype=numpy.float64))
+    numVertices = self.numVertices + (len(self.zoneIds) if zoneOrigins else 0)
+    self.graph = edgeMinimum(numpy.concatenate(edgeFrom), numpy.concatenate(edgeTo), numpy.concatenate(edgeTimes), numVertices)
+
+    #node and link vertices by the node they arrive at, every node has its own vertex
+    self.arrivalOrder = numpy.argsort(numpy.concatenate((numpy.arange(numNodes), toPos)), kind="stable")
+    self.arrivalStarts = numpy.searchsorted(numpy.concatenate((numpy.arange(numNodes), toPos))[self.arrivalOrder], numpy.arange(numNodes))
+
+    #destination connectors sorted by zone for a min per zone
+    connZonePos = zoneCrosswalk.applyLookup(zoneLookup, destZones, "connector zone")
+    order = numpy.argsort(connZonePos, kind="stable")
+    self.connZonePos = connZonePos[order]
+    self.connNodePos = zoneCrosswalk.applyLookup(nodeLookup, destNodes, "connector node")[order]
+    self.connTimes = numpy.asarray(destTimes, dtype=numpy.float64)[order]
+    self.connZoneStarts = runStarts(self.connZonePos)
+
+  def turnKeys(self, fromPos, viaPos, toPos):
+    numNodes = len(self.nodeIds)
+    return((numpy.asarray(fromPos, dtype=numpy.int64) * numNodes + viaPos) * numNodes + toPos)
+
+  def nodeIndex(self, nodes):
+    return(zoneCrosswalk.applyLookup(self.nodeLookup, nodes, "node"))
+
+  def zoneIndex(self, zonePos):
+    #source vertices of zones (positions in zoneIds), needs zoneOrigins
+    if self.graph.shape[0] == self.numVertices:
+      raise ValueError("graph built without zone origins")
+    return(self.numVertices + numpy.asarray(zonePos, dtype=numpy.int64))
+
+  def zoneTimes(self, sourcePos, maxTime):
+    #(row in sourcePos, zone position, time) of all zones within maxTime, by source then zone
+    sourcePos = numpy.asarray(sourcePos, dtype=numpy.int64)
+    if len(sourcePos) == 0 or len(self.connZoneStarts) == 0:
+      return(numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0))
+    vertexTimes = csgraph.dijkstra(self.graph, directed=True, indices=sourcePos, limit=maxTime)
+    vertexTimes = vertexTimes.reshape(len(sourcePos), self.graph.shape[0])
+    nodeTimes = numpy.minimum.reduceat(vertexTimes[:, self.arrivalOrder], self.arrivalStarts, axis=1)
+    viaConnector = nodeTimes[:, self.connNodePos] + self.connTimes
+    times = numpy.minimum.reduceat(viaConnector, self.connZoneStarts, axis=1)
+    sources, zones = numpy.nonzero(times <= maxTime)
+    return(sources, self.connZonePos[self.connZoneStarts][zones], times[sources, zones])
+
+_graph = None
+
+def initWorker(graph):
+  global _graph
+  _graph = graph
+
+def zoneTimesWorker(task):
+  sourcePos, maxTime = task
+  return(_graph.zoneTimes(sourcePos, maxTime))
+
+def zoneTimesBySource(graph, sourcePos, maxTime, numWorkers=1, batchSize=DEFAULT_BATCH_SIZE):
+  """
+    Generator of graph.zoneTimes() results for batches of batchSize sources, in
+    source order, with rows as positions in sourcePos.  With more than one worker the batches are run in a process
+    pool that gets the graph once per process.
+  """
+  sourcePos = numpy.asarray(sourcePos, dtype=numpy.int64)
+  tasks = [(sourcePos[start:start+batchSize], maxTime) for start in range(0, len(sourcePos), batchSize)]
+  if numWorkers <= 1:
+    results = (graph.zoneTimes(*task) for task in tasks)
+  else:
+    pool = multiprocessing.Pool(numWorkers, initializer=initWorker, initargs=(graph,))
+    results = pool.imap(zoneTimesWorker, tasks, chunksize=1)
+  try:
+    for i, (rows, zones, times) in enumerate(results):
+      yield(rows + i * batchSize, zones, times)
+  finally:
+    if numWorkers > 1:
+      pool.close()
+      pool.join()
@@ -0,0 +1,115 @@
+#Southern Oregon ABM columnar cache of CT-RAMP trip files
+#Streams the columns of the trip CSVs read by the matrix builders once to compressed
+#Feather or Parquet files next to the CSVs and reads them back a record batch at a time
+#Requires pyarrow; without it, or if a CSV cannot be converted, the CSVs are read as before
+
+############################################################
+
+import os
+import numpy
+
+try:
+  import pyarrow
+  import pyarrow.csv
+  import pyarrow.feather
+  import pyarrow.ipc
+  import pyarrow.parquet
+except ImportError:
+  pyarrow = None
+
+############################################################
+
+FORMATS = {"feather": ".feather", "parquet": ".parquet"}
+BLOCK_BYTES = 1 << 24 #csv bytes per record batch or row group
+
+def available():
+  return(pyarrow is not None)
+
+def cachedFileName(fileName, fileFormat):
+  return(os.path.splitext(fileName)[0] + FORMATS[fileFormat])
+
+def cachedColumns(cached):
+  #column names of a cached file, from the file metadata
+  if cached.endswith(FORMATS["parquet"]):
+    return(pyarrow.parquet.read_schema(cached).names)
+  return(pyarrow.ipc.open_file(pyarrow.memory_map(cached)).schema.names)
+
+def findCached(fileName, columns=None):
+  #cached copy of a csv that is at least as new as the csv and has the columns, or None
+  if not available():
+    return(None)
+  for fileFormat in FORMATS:
+    cached = cachedFileName(fileName, fileFormat)
+    if os.path.exists(cached) and os.path.getmtime(cached) >= os.path.getmtime(fileName):
+      if columns is None or set(columns) <= set(cachedColumns(cached)):
+        return(cached)
+  return(None)
+
+def convert(fileName, fileFormat="feather", columns=None):
+  #stream the integer columns of a csv to the columnar cache, unless an up to date copy already exists
+  #one record batch (feather) or row group (parquet) per csv block, so neither is held in memory in full
+  #the column types are given rather than guessed from the first block, and a csv that
+  #does not convert is left uncached (and read as csv)
+  if not available():
+    print("pyarrow not installed, " + fileName + " not cached")
+    return(None)
+  cached = findCached(fileName, columns)
+  if cached is not None:
+    return(cached)
+  cached = cachedFileName(fileName, fileFormat)
+  print("cache " + fileName + " as " + cached)
+  convertOptions = pyarrow.csv.ConvertOptions()
+  if columns is not None:
+    convertOptions = pyarrow.csv.ConvertOptions(include_columns=list(columns),
+      column_types=dict((col, pyarrow.int64()) for col in columns))
+  tempFileName = cached + ".tmp"
+  writer = None
+  try:
+    reader = pyarrow.csv.open_csv(fileName, read_options=pyarrow.csv.ReadOptions(block_size=BLOCK_BYTES),
+      convert_options=convertOptions)
+    if fileFormat == "parquet":
+      writer = pyarrow.parquet.ParquetWriter(tempFileName, reader.schema, compression="zstd")
+    else:
+      writer = pyarrow.ipc.new_file(tempFileName, reader.schema, options=pyarrow.ipc.IpcWriteOptions(compression="lz4"))
+    for batch in reader:
+      if fileFormat == "parquet":
+        writer.write_table(pyarrow.Table.from_batches([batch]))
+      else:
+        writer.write_batch(batch)
+    writer.close()
+    writer = None
+    os.replace(tempFileName, cached)
+  except pyarrow.ArrowException as e:
+    print(fileName + " not cached, read as csv: " + str(e))
+    return(None)
+  finally:
+    if writer is not None:
+      writer.close()
+    if os.path.exists(tempFileName):
+      os.remove(tempFileName)
+  return(cached)
+
+def numBatches(cached):
+  #record batches (feather) or row groups (parquet), from the file metadata
+  if cached.endswith(FORMATS["parquet"]):
+    return(pyarrow.parquet.ParquetFile(cached).num_row_groups)
+  return(pyarrow.ipc.open_file(pyarrow.memory_map(cached)).num_record_batches)
+
+def readBatches(cached, columns=None, start=0, end=None):
+  #tables of record batches (row groups) start to end of a cached file, one at a time
+  if cached.endswith(FORMATS["parquet"]):
+    parquetFile = pyarrow.parquet.ParquetFile(cached, memory_map=True)
+    for i in range(start, parquetFile.num_row_groups if end is None else end):
+      yield(parquetFile.read_row_group(i, columns=columns))
+    return
+  reader = pyarrow.ipc.open_file(pyarrow.memory_map(cached))
+  for i in range(start, reader.num_record_batches if end is None else end):
+    table = pyarrow.Table.from_batches([reader.get_batch(i)])
+    yield(table if columns is None else pyarrow.Table.from_arrays([table.column(col) for col in columns], names=columns))
+
+def intColumn(table, column, fileName):
+  #int64 array of a column, which must not have empty cells
+  values = table.column(column)
+  if values.null_count > 0:
+    raise ValueError(str(values.null_count) + " empty values in column " + column + " of " + fileName)
+  return(values.to_numpy().astype(numpy.int64))
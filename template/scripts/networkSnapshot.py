@@ -0,0 +1,104 @@
+#Southern Oregon ABM Visum network snapshot
+#Caches network object attributes (nodes, links, zones, connectors, stop areas, ...)
+#as columns so each attribute is read from Visum over COM once per version load
+
+############################################################
+
+import numpy
+import pandas as pd
+import VisumPy.helpers
+
+############################################################
+
+#attributes read together the first time a table is used
+DEFAULT_ATTRIBUTES = {
+  "Nodes": ["No","XCoord","YCoord","NumLinks"],
+  "Links": ["No","FromNodeNo","ToNodeNo","Length","PlanNo"],
+  "Zones": ["No","XCoord","YCoord"],
+  "MainZones": ["No","XCoord","YCoord"],
+  "Connectors": ["ZoneNo","NodeNo","Length"],
+  "StopAreas": ["No","XCoord","YCoord","NodeNo"]
+}
+
+_snapshots = dict()
+
+class NetworkSnapshot:
+  """
+    Column cache of Visum network object attributes.  Attributes are read for all
+    objects of a table with one GetMultipleAttributes call and kept until the
+    version is reloaded, a procedure is run or an attribute is written (see clear).  Attribute names are
+    case insensitive, as in Visum.
+  """
+  def __init__(self, Visum):
+    self.Visum = Visum
+    self.tables = dict()
+
+  def container(self, table):
+    return(getattr(self.Visum.Net, table))
+
+  def fetch(self, table, attributes):
+    #read all not yet cached attributes of a table in one pass
+    if table not in self.tables:
+      self.tables[table] = dict()
+      attributes = DEFAULT_ATTRIBUTES.get(table, []) + list(attributes)
+    columns = self.tables[table]
+    missing = []
+    for att in attributes:
+      if att.upper() not in columns and att.upper() not in [m.upper() for m in missing]:
+        missing.append(att)
+    if len(missing) > 0:
+      rows = self.container(table).GetMultipleAttributes(missing, False)
+      values = list(zip(*rows)) if len(rows) > 0 else [()] * len(missing)
+      for i in range(len(missing)):
+        columns[missing[i].upper()] = list(values[i])
+
+  def GetMulti(self, table, attribute):
+    #same values as VisumPy.helpers.GetMulti for all objects
+    self.fetch(table, [attribute])
+    return(list(self.tables[table][attribute.upper()]))
+
+  def column(self, table, attribute, dtype=None):
+    return(numpy.array(self.GetMulti(table, attribute), dtype=dtype))
+
+  def frame(self, table, attributes):
+    #pandas table of attributes, one row per object
+    self.fetch(table, attributes)
+    return(pd.DataFrame(dict((att, self.tables[table][att.upper()]) for att in attributes)))
+
+  def ragged(self, table, attribute, dtype=str):
+    #split a Concatenate: attribute into row pointers and a flat value array
+    texts = self.GetMulti(table, attribute)
+    parts = [str(t).split(",") if t not in (None, "") else [] for t in texts]
+    rowPtr = numpy.zeros(len(parts)+1, dtype=numpy.int64)
+    rowPtr[1:] = numpy.cumsum([len(p) for p in parts])
+    values = numpy.array([v for p in parts for v in p], dtype=dtype)
+    return(rowPtr, values)
+
+  def SetMulti(self, table, attribute, values):
+    #write through to Visum, formula and indirect attributes may depend on the
+    #written attribute so only the written column is kept
+    VisumPy.helpers.SetMulti(self.container(table), attribute, values)
+    self.tables = {table: {attribute.upper(): list(values)}}
+
+  def clear(self, table=None):
+    if table is None:
+      self.tables = dict()
+    elif table in self.tables:
+      del self.tables[table]
+
+def snapshot(Visum):
+  #the snapshot of the version currently loaded in this Visum instance
+  if id(Visum) not in _snapshots:
+    _snapshots[id(Visum)] = NetworkSnapshot(Visum)
+  return(_snapshots[id(Visum)])
+
+def clear(Visum, table=None):
+  #call after loading a version, running a procedure or editing network objects
+  if id(Visum) in _snapshots:
+    _snapshots[id(Visum)].clear(table)
+
+def GetMulti(Visum, table, attribute):
+  return(snapshot(Visum).GetMulti(table, attribute))
+
+def SetMulti(Visum, table, attribute, values):
+  snapshot(Visum).SetMulti(table, attribute, values)
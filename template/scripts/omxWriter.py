@@ -0,0 +1,144 @@
+#Southern Oregon ABM OMX writer
+#Opens OMX files with the configured HDF5 compression and writes matrices with
+#row-oriented chunks, since matrices are read as whole tables or origin rows
+
+############################################################
+
+import os, sys, time
+import numpy
+import scipy.sparse
+import tables
+import openmatrix as omx
+
+############################################################
+
+DEFAULT_COMPLIB = "zlib"
+DEFAULT_COMPLEVEL = 1
+
+def filters(complib=DEFAULT_COMPLIB, complevel=DEFAULT_COMPLEVEL):
+  #HDF5 filters, complib zlib, blosc or blosc:<codec> (blosc:lz4, blosc:zstd, ...)
+  if complib not in tables.filters.all_complibs:
+    raise ValueError("OMX compression library not supported: " + complib)
+  return(tables.Filters(complevel=int(complevel), complib=complib, shuffle=True))
+
+def openFile(fileName, mode="r", complib=DEFAULT_COMPLIB, complevel=DEFAULT_COMPLEVEL):
+  #matrices created in the file use its filters
+  if mode == "r":
+    return(omx.open_file(fileName, mode))
+  return(omx.open_file(fileName, mode, filters=filters(complib, complevel)))
+
+def chunkShape(shape, chunkRows):
+  #whole origin rows per chunk, pytables default if chunkRows is 0
+  if chunkRows <= 0 or len(shape) != 2 or shape[0] == 0 or shape[1] == 0:
+    return(None)
+  return((min(int(chunkRows), shape[0]), shape[1]))
+
+class IndexedMatrix:
+  """
+    Matrix defined by a smaller source matrix, the source row and column of each
+    of its rows and columns and a scale factor, e.g. a MAZ skim that is a TAZ
+    skim reindexed by the MAZ TAZs.  Cells are only produced on demand, a block
+    of rows at a time, so the full matrix is never held in memory.
+  """
+  def __init__(self, source, rowIndex, colIndex=None, scale=1.0, dtype=None):
+    self.source = numpy.asarray(source)
+    self.rowIndex = numpy.asarray(rowIndex, dtype=numpy.int64)
+    self.colIndex = self.rowIndex if colIndex is None else numpy.asarray(colIndex, dtype=numpy.int64)
+    self.scale = scale
+    self.dtype = numpy.dtype(numpy.float64 if dtype is None else dtype)
+    self.shape = (len(self.rowIndex), len(self.colIndex))
+
+  def astype(self, dtype):
+    return(IndexedMatrix(self.source, self.rowIndex, self.colIndex, self.scale, dtype))
+
+  def block(self, start, stop):
+    #rows start to stop as a dense array
+    return((self.source[numpy.ix_(self.rowIndex[start:stop], self.colIndex)] * self.scale).astype(self.dtype))
+
+  def toarray(self):
+    return(self.block(0, self.shape[0]))
+
+  def compact(self):
+    #the distinct cells, i.e. the used part of the scaled source
+    rows = numpy.unique(self.rowIndex)
+    cols = numpy.unique(self.colIndex)
+    return((self.source[numpy.ix_(rows, cols)] * self.scale).astype(self.dtype))
+
+def writeMatrix(omxFile, name, mat, chunkRows=0, blockRows=1000):
+  #write a dense, scipy.sparse or IndexedMatrix matrix, sparse and indexed ones a block
+  #of rows at a time, sparse ones only writing non-empty (compressed) chunks
+  if isinstance(mat, IndexedMatrix):
+    omxMat = omxFile.create_matrix(name, atom=tables.Atom.from_dtype(mat.dtype), shape=mat.shape,
+      chunkshape=chunkShape(mat.shape, chunkRows))
+    for start in range(0, mat.shape[0], blockRows):
+      block = mat.block(start, start+blockRows)
+      omxMat[start:start+block.shape[0],:] = block
+    return
+  if not scipy.sparse.issparse(mat):
+    mat = numpy.asarray(mat)
+    omxFile.create_matrix(name, obj=mat, chunkshape=chunkShape(mat.shape, chunkRows))
+    return
+  mat = mat.tocsr()
+  omxMat = omxFile.create_matrix(name, atom=tables.Atom.from_dtype(mat.dtype), shape=mat.shape,
+    chunkshape=chunkShape(mat.shape, chunkRows))
+  for start in range(0, mat.shape[0], blockRows):
+    block = mat[start:start+blockRows]
+    if block.nnz > 0:
+      omxMat[start:start+block.shape[0],:] = block.toarray()
+
+############################################################
+
+def benchmark(fileName, settings, outputFolder, rowReads=100):
+  """
+    Rewrite every matrix of an OMX file with each (complib, complevel, chunkRows)
+    setting and time the write, a read of all tables and a read of rowReads
+    random origin rows per table.  Returns one result row per setting.
+  """
+  source = omx.open_file(fileName, "r")
+  mats = dict((name, numpy.array(source[name])) for name in source.list_matrices())
+  source.close()
+  rows = numpy.random.RandomState(0).randint(0, max(m.shape[0] for m in mats.values()), rowReads)
+
+  if not os.path.exists(outputFolder):
+    os.makedirs(outputFolder)
+
+  results = []
+  for complib, complevel, chunkRows in settings:
+    testFileName = os.path.join(outputFolder, "bench_%s_%s_%s.omx" % (complib.replace(":","-"), complevel, chunkRows))
+
+    start = time.time()
+    omxFile = openFile(testFileName, "w", complib, complevel)
+    for name in mats:
+      writeMatrix(omxFile, name, mats[name], chunkRows)
+    omxFile.close()
+    writeTime = time.time() - start
+
+    start = time.time()
+    omxFile = omx.open_file(testFileName, "r")
+    for name in mats:
+      omxFile[name].read()
+    readTime = time.time() - start
+    start = time.time()
+    for name in mats:
+      for row in rows[rows < mats[name].shape[0]]:
+        omxFile[name][row,:]
+    rowReadTime = time.time() - start
+    omxFile.close()
+
+    results.append([complib, complevel, chunkRows, round(writeTime,3), round(readTime,3), round(rowReadTime,3),
+      round(os.path.getsize(testFileName) / 1048576.0, 2)])
+    os.remove(testFileName)
+  return(results)
+
+if __name__== "__main__":
+
+  #benchmark OMX settings: python omxWriter.py omxFile [outputFolder]
+  fileName = sys.argv[1]
+  outputFolder = sys.argv[2] if len(sys.argv) > 2 else os.path.join(os.path.dirname(os.path.abspath(fileName)), "omxBenchmark")
+  settings = [(complib, complevel, chunkRows)
+    for complib, complevel in [("zlib",1), ("zlib",4), ("blosc:lz4",1), ("blosc:lz4",5), ("blosc:zstd",3)]
+    for chunkRows in [0, 1, 16, 64]]
+
+  print("COMPLIB,COMPLEVEL,CHUNKROWS,WRITE_SEC,READ_SEC,ROWREAD_SEC,SIZE_MB")
+  for result in benchmark(fileName, settings, outputFolder):
+    print(",".join(map(str, result)))
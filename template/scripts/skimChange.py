@@ -0,0 +1,89 @@
+#Southern Oregon ABM skim change detection
+#Keeps the demand matrices and link speeds each time period was last skimmed
+#with, so feedback iterations can skip skimming periods that have barely changed
+
+############################################################
+
+import os, time
+import numpy
+
+############################################################
+
+class SkimChangeDetector:
+  """
+    Change of named sets of arrays (e.g. a period's demand matrices or link
+    speeds) since they were last saved with save().  change() is the sum of
+    absolute differences over the sum of absolute previous values, inf if
+    nothing was saved or the shapes differ.  Saved arrays are kept as float32
+    .npz files in folder and every skip decision is appended to a log csv.
+  """
+  def __init__(self, folder, tolerance, logFileName):
+    self.folder = folder
+    self.tolerance = tolerance
+    self.logFileName = logFileName
+
+  def fileName(self, name):
+    return(os.path.join(self.folder, name + ".npz"))
+
+  def change(self, name, arrays):
+    if not os.path.exists(self.fileName(name)):
+      return(numpy.inf)
+    diff = 0.0
+    total = 0.0
+    with numpy.load(self.fileName(name)) as previous:
+      if sorted(previous.files) != sorted(arrays):
+        return(numpy.inf)
+      for key in arrays:
+        new = numpy.asarray(arrays[key], dtype=numpy.float64)
+        old = previous[key].astype(numpy.float64)
+        if new.shape != old.shape:
+          return(numpy.inf)
+        diff = diff + numpy.abs(new - old).sum()
+        total = total + numpy.abs(old).sum()
+    if diff == 0:
+      return(0.0)
+    return(diff / total if total > 0 else numpy.inf)
+
+  def save(self, name, arrays):
+    if not os.path.exists(self.folder):
+      os.makedirs(self.folder)
+    tempFileName = self.fileName(name) + ".tmp"
+    with open(tempFileName, "wb") as f:
+      numpy.savez(f, **dict((key, numpy.asarray(arrays[key], dtype=numpy.float32)) for key in arrays))
+    os.replace(tempFileName, self.fileName(name))
+
+  def clear(self):
+    #forget all saved arrays, e.g. at the start of a model run
+    if os.path.exists(self.folder):
+      for fileName in os.listdir(self.folder):
+        if fileName.endswith(".npz"):
+          os.remove(os.path.join(self.folder, fileName))
+
+  def canSkip(self, step, period, name, arrays, outputFiles, iteration=""):
+    #True if the arrays changed less than the tolerance and all outputs of the last run exist
+    change = self.change(name, arrays)
+    missing = [f for f in outputFiles if not os.path.exists(f)]
+    skip = change < self.tolerance and len(missing) == 0
+    if skip:
+      reason = "change below tolerance"
+    elif len(missing) > 0:
+      reason = "missing " + os.path.basename(missing[0])
+    elif numpy.isinf(change):
+      reason = "no previous " + name
+    else:
+      reason = "change above tolerance"
+    self.log(step, iteration, period, name, change, "skip" if skip else "run", reason)
+    return(skip)
+
+  def log(self, step, iteration, period, name, change, action, reason):
+    print(step + " " + period + ": " + action + " (" + name + " change " + str(round(change, 6)) + ", " + reason + ")")
+    folder = os.path.dirname(self.logFileName)
+    if folder != "" and not os.path.exists(folder):
+      os.makedirs(folder)
+    newLog = not os.path.exists(self.logFileName)
+    f = open(self.logFileName, 'a')
+    if newLog:
+      f.write("TIME,STEP,ITERATION,PERIOD,MEASURE,CHANGE,TOLERANCE,ACTION,REASON\n")
+    f.write("%s,%s,%s,%s,%s,%.9g,%.9g,%s,%s\n" % (time.strftime("%Y-%m-%d %H:%M:%S"), step, iteration, period, name,
+      change, self.tolerance, action, reason))
+    f.close()
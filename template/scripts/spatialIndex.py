@@ -0,0 +1,158 @@
+#Southern Oregon ABM spatial index
+#KD-tree over a set of points (nodes, zones, stop areas) built once and queried
+#for whole batches of points at a time
+
+############################################################
+
+import os, time, hashlib
+import numpy
+from scipy.spatial import cKDTree
+import scipy.sparse
+
+############################################################
+
+class SpatialIndex:
+  """
+    Spatial index of points with ids.  nearest() returns the ids of the k closest
+    points to each query point (nearest first, -1 when fewer than k points exist)
+    and withinRadius() returns all points strictly closer than a radius as CSR
+    style arrays (row pointers, point positions, distances).  sumWithinRadius()
+    sums point values over those radius neighbourhoods.  With a NeighbourCache,
+    nearest and radius results are reused from disk when the points, query
+    points and parameters are unchanged.
+  """
+  def __init__(self, ids, xs, ys, cache=None):
+    self.ids = numpy.asarray(ids)
+    self.xy = numpy.column_stack((numpy.asarray(xs, dtype=numpy.float64), numpy.asarray(ys, dtype=numpy.float64)))
+    self.cache = cache if cache is not None else NeighbourCache(None)
+    self._tree = None
+
+  @property
+  def tree(self):
+    #built on first query so cache hits skip it
+    if self._tree is None and len(self.ids) > 0:
+      self._tree = cKDTree(self.xy)
+    return(self._tree)
+
+  def __len__(self):
+    return(len(self.ids))
+
+  def queryPoints(self, xs, ys):
+    return(numpy.column_stack((numpy.asarray(xs, dtype=numpy.float64), numpy.asarray(ys, dtype=numpy.float64))))
+
+  def nearestPositions(self, xs, ys, k):
+    #positions and distances of the k nearest points, position -1 if none
+    pts = self.queryPoints(xs, ys)
+    def compute():
+      if self.tree is None:
+        return({"pos":numpy.full((len(pts),k), -1), "dist":numpy.full((len(pts),k), numpy.inf)})
+      dist, pos = self.tree.query(pts, k=k)
+      dist = dist.reshape(len(pts), k)
+      pos = pos.reshape(len(pts), k)
+      pos[numpy.isinf(dist)] = -1
+      return({"pos":pos, "dist":dist})
+    result = self.cache.get("nearest", [self.ids, self.xy, pts, k], compute)
+    return(result["pos"], result["dist"])
+
+  def nearest(self, xs, ys, k):
+    #ids of the k nearest points, -1 if none
+    pos, dist = self.nearestPositions(xs, ys, k)
+    ids = numpy.where(pos >= 0, self.ids[pos], -1)
+    return(ids)
+
+  def withinRadius(self, xs, ys, radius):
+    #all points closer than radius to each query point
+    pts = self.queryPoints(xs, ys)
+    result = self.cache.get("radius", [self.ids, self.xy, pts, radius],
+      lambda: dict(zip(["rowPtr","cols","dist"], self.queryRadius(pts, radius))))
+    return(result["rowPtr"], result["cols"], result["dist"])
+
+  def queryRadius(self, pts, radius):
+    if self.tree is None:
+      return(numpy.zeros(len(pts)+1, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0))
+    near = self.tree.query_ball_point(pts, radius)
+    counts = numpy.array([len(n) for n in near], dtype=numpy.int64)
+    rows = numpy.repeat(numpy.arange(len(pts)), counts)
+    cols = numpy.concatenate([numpy.asarray(n, dtype=numpy.int64) for n in near]) if counts.sum() > 0 else numpy.zeros(0, dtype=numpy.int64)
+    dist = numpy.sqrt(((pts[rows] - self.xy[cols])**2).sum(axis=1))
+
+    #strictly within radius, like calcDist(...) < radius
+    keep = dist < radius
+    rows, cols, dist = rows[keep], cols[keep], dist[keep]
+    rowPtr = numpy.zeros(len(pts)+1, dtype=numpy.int64)
+    rowPtr[1:] = numpy.cumsum(numpy.bincount(rows, minlength=len(pts)))
+    return(rowPtr, cols, dist)
+
+  def neighbourMatrix(self, xs, ys, radius):
+    #sparse query point x point 0/1 neighbour weights
+    rowPtr, cols, dist = self.withinRadius(xs, ys, radius)
+    weights = numpy.ones(len(cols))
+    return(scipy.sparse.csr_matrix((weights, cols, rowPtr), shape=(len(rowPtr)-1, len(self.ids))))
+
+  def sumWithinRadius(self, xs, ys, radius, values):
+    #sum of point values (one column per measure) within radius of each query point
+    values = numpy.asarray(values, dtype=numpy.float64)
+    if values.ndim == 1:
+      values = values.reshape(-1, 1)
+    return(numpy.asarray(self.neighbourMatrix(xs, ys, radius).dot(values)))
+
+class NeighbourCache:
+  """
+    Disk cache of derived spatial structures (candidate node sets, nearest and
+    radius neighbour results).  Each entry is a .npz file named by the structure
+    and a hash of everything it was derived from, so an entry is only reused
+    when the coordinates, ids, filter attributes and parameters all match.
+    Entries are touched when reused and, each time a structure gets a new entry,
+    its entries unused for keepDays or beyond the maxEntries most recently used
+    are deleted.  A cache without a folder computes every time.
+  """
+  def __init__(self, folder, maxEntries=16, keepDays=30):
+    self.folder = folder
+    self.maxEntries = maxEntries
+    self.keepDays = keepDays
+
+  def key(self, name, parts):
+    #sha1 of the structure name and the contents of each part
+    h = hashlib.sha1(name.encode())
+    for part in parts:
+      arr = numpy.asarray(part)
+      if arr.dtype == object:
+        arr = arr.astype(str)
+      h.update(str((arr.dtype.str, arr.shape)).encode())
+      h.update(numpy.ascontiguousarray(arr).tobytes())
+    return(h.hexdigest())
+
+  def get(self, name, parts, compute):
+    #dict of arrays from disk if the key matches, else compute() and save it
+    if not self.folder:
+      return(compute())
+    fileName = os.path.join(self.folder, name + "_" + self.key(name, parts) + ".npz")
+    if os.path.exists(fileName):
+      os.utime(fileName, None)
+      with numpy.load(fileName) as data:
+        return(dict((k, data[k]) for k in data.files))
+    result = compute()
+    if not os.path.exists(self.folder):
+      os.makedirs(self.folder)
+    tempFileName = fileName + ".tmp"
+    with open(tempFileName, "wb") as f:
+      numpy.savez(f, **result)
+    os.replace(tempFileName, fileName)
+    self.prune(name)
+    return(result)
+
+  def prune(self, name):
+    #delete the entries of a structure not used for keepDays or beyond the maxEntries most recently used
+    entries = []
+    for fileName in os.listdir(self.folder):
+      if fileName.startswith(name + "_") and fileName.endswith(".npz") and len(fileName) == len(name) + 45:
+        fileName = os.path.join(self.folder, fileName)
+        entries.append((os.path.getmtime(fileName), fileName))
+    entries.sort(reverse=True)
+    oldest = time.time() - self.keepDays * 86400
+    for i, (used, fileName) in enumerate(entries):
+      if i >= self.maxEntries or used < oldest:
+        try:
+          os.remove(fileName)
+        except OSError:
+          pass #in use by another run
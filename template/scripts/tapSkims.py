@@ -0,0 +1,68 @@
+#Southern Oregon ABM TAP skim post-processing
+#Removes duplicate transit paths across the three TAP skim sets, streaming
+#aligned row blocks of the set files so memory stays bounded
+
+############################################################
+
+import multiprocessing
+import numpy
+import openmatrix as omx
+
+############################################################
+
+NA = 0
+SKIMS = ["1","2","3","4","5","6","7","8","9","10"]
+TIME_SKIMS = ["1","2","3","4"] #IVT, OWT, TWT, WKT
+DEFAULT_BLOCK_ROWS = 500
+
+def totalTime(blocks):
+  #total time rounded to hundreds, since Visum 2020 produced non identical transit matrices
+  return(numpy.around(blocks["1"] + blocks["2"] + blocks["3"] + blocks["4"], decimals=-2))
+
+def reviseDuplicateSkims(fileNames, blockRows=DEFAULT_BLOCK_ROWS):
+  """
+    NA set 2 and set 3 skims of OD pairs whose total time (IVT+OWT+TWT+WKT) equals
+    that of a lower set.  fileNames are the set 1, 2 and 3 OMX files of a period.
+    Each dataset is read once, a block of rows at a time, and a block is only
+    written back if any of its cells changed.
+  """
+  omxFiles = [omx.open_file(fileName, 'a') for fileName in fileNames]
+  try:
+    numRows = omxFiles[0][SKIMS[0]].shape[0]
+    for start in range(0, numRows, blockRows):
+      stop = min(start + blockRows, numRows)
+
+      #time skims of all sets and the other skims of sets 2 and 3
+      blocks = []
+      for i in range(len(omxFiles)):
+        names = SKIMS if i > 0 else TIME_SKIMS
+        blocks.append(dict((skim, omxFiles[i][skim][start:stop]) for skim in names))
+      time1, time2, time3 = [totalTime(b) for b in blocks]
+
+      #compare sets
+      masks = [None, time1 == time2, (time1 == time3) | (time2 == time3)]
+      for i in [1, 2]:
+        if not masks[i].any():
+          continue
+        for skim in SKIMS:
+          block = blocks[i][skim]
+          if (block[masks[i]] != NA).any():
+            block[masks[i]] = NA
+            omxFiles[i][skim][start:stop] = block
+  finally:
+    for omxFile in omxFiles:
+      omxFile.close()
+  return(fileNames)
+
+def reviseDuplicateSkimPeriods(periodFileNames, numWorkers=1, blockRows=DEFAULT_BLOCK_ROWS):
+  #reviseDuplicateSkims for a list of (set 1, set 2, set 3) file names, one process per period
+  if numWorkers <= 1:
+    for fileNames in periodFileNames:
+      reviseDuplicateSkims(fileNames, blockRows)
+    return
+  pool = multiprocessing.Pool(min(numWorkers, len(periodFileNames)))
+  try:
+    pool.starmap(reviseDuplicateSkims, [(fileNames, blockRows) for fileNames in periodFileNames], chunksize=1)
+  finally:
+    pool.close()
+    pool.join()
@@ -0,0 +1,412 @@
+#Southern Oregon ABM CT-RAMP trip matrix engine
+#Builds the TAZ auto, TAP transit and PNR parking matrices from the CT-RAMP
+#individual and joint trip files with array operations instead of a row loop
+
+############################################################
+
+import io, os
+import multiprocessing
+import numpy
+import pandas as pd
+import scipy.sparse
+import columnarCache
+
+############################################################
+
+#CT-RAMP trip modes
+SOV, SOVTOLL, HOV2, HOV2TOLL, HOV3, HOV3TOLL = 1, 2, 3, 5, 6, 8
+WALK, BIKE, WLK_TRN, PNR_TRN, KNR_TRN = 9, 10, 11, 12, 13
+
+HOV2OCC = 2.0
+HOV3OCC = 3.33
+
+AUTO_TABLES = ["sov","hov2","hov3","sovtoll","hov2toll","hov3toll"]
+TAP_TABLES = ["set_1","set_2","set_3"]
+
+#trip file columns used by the engine, renamed to a common set of names
+INDIV_TRIP_COLUMNS = {"orig_maz":"omaz", "dest_maz":"dmaz", "parking_maz":"pmaz",
+  "trip_board_tap":"otap", "trip_alight_tap":"dtap", "trip_mode":"mode",
+  "stop_period":"dept", "inbound":"inbound", "set":"set", "driver_pnum":"dpnum",
+  "person_num":"pnum", "orig_escort_stoptype":"oesc", "dest_escort_stoptype":"desc"}
+
+JOINT_TRIP_COLUMNS = {"orig_mgra":"omaz", "dest_mgra":"dmaz", "parking_mgra":"pmaz",
+  "trip_board_tap":"otap", "trip_alight_tap":"dtap", "trip_mode":"mode",
+  "stop_period":"dept", "inbound":"inbound", "set":"set",
+  "num_participants":"num_participants"}
+
+DEFAULT_CHUNK_SIZE = 500000
+
+def splitFile(fileName, numParts, columns=None):
+  #byte ranges of the data lines (after the header) split into about equal parts at line ends,
+  #or record batch ranges if the file has an up to date columnar cache of the columns
+  cached = columnarCache.findCached(fileName, columns)
+  if cached is not None:
+    batches = columnarCache.numBatches(cached)
+    bounds = [batches * i // numParts for i in range(numParts + 1)]
+    return([(bounds[i], bounds[i+1]) for i in range(numParts) if bounds[i+1] > bounds[i]])
+
+  size = os.path.getsize(fileName)
+  with open(fileName, "rb") as f:
+    f.readline()
+    starts = [f.tell()]
+    for i in range(1, numParts):
+      f.seek(max(starts[0] + (size - starts[0]) * i // numParts, starts[-1]))
+      if f.tell() > starts[0]:
+        f.seek(f.tell() - 1)
+      f.readline()
+      starts.append(f.tell())
+  ends = starts[1:] + [size]
+  return([(starts[i], ends[i]) for i in range(numParts) if ends[i] > starts[i]])
+
+def readTripChunks(fileName, columns, chunkSize=DEFAULT_CHUNK_SIZE, byteRange=None):
+  #the given trip file columns as integer arrays renamed by columns, one block of at most
+  #chunkSize trips at a time, from the columnar cache if it has an up to date copy of them
+  #byteRange (start,end) from splitFile limits reading to part of the file,
+  #only reading its own record batches from a columnar cache
+  cached = columnarCache.findCached(fileName, list(columns.keys()))
+  if cached is not None:
+    start, end = byteRange if byteRange is not None else (0, None)
+    for table in columnarCache.readBatches(cached, list(columns.keys()), start, end):
+      for chunkStart in range(0, table.num_rows, chunkSize):
+        trips = table.slice(chunkStart, chunkSize)
+        yield(dict((columns[col], columnarCache.intColumn(trips, col, fileName)) for col in columns))
+    return
+
+  source = fileName
+  if byteRange is not None:
+    with open(fileName, "rb") as f:
+      header = f.readline()
+      f.seek(byteRange[0])
+      source = io.BytesIO(header + f.read(byteRange[1] - byteRange[0]))
+  reader = pd.read_csv(source, usecols=list(columns.keys()), skipinitialspace=True, chunksize=chunkSize)
+  for trips in reader:
+    trips = trips.rename(columns=columns)
+    yield(dict((col, trips[col].to_numpy(dtype=numpy.int64)) for col in columns.values()))
+
+def accumulate(mat, tod, o, d, weight):
+  #add weight to mat[tod,o,d], summing duplicate cells first
+  if len(o) == 0:
+    return
+  numRows, numCols = mat.shape[1], mat.shape[2]
+  cells = (numpy.asarray(tod, dtype=numpy.int64) * numRows + o) * numCols + d
+  weight = numpy.broadcast_to(numpy.asarray(weight, dtype=numpy.float64), cells.shape)
+  if isinstance(mat, SparseMatrixStack):
+    mat.add(cells, weight)
+    return
+  uniqCells, inverse = numpy.unique(cells, return_inverse=True)
+  flat = mat.reshape(-1)
+  flat[uniqCells] += numpy.bincount(inverse.reshape(-1), weights=weight, minlength=len(uniqCells))
+
+class SparseMatrixStack:
+  """
+    Sparse stand-in for a dense (periods, rows, cols) demand array.  Cells are
+    kept as sorted flat cell numbers and values; stack[i] is period i as a
+    scipy.sparse csr_matrix.  Used for MAZ and TAP level demand, which is
+    almost all zeros.
+  """
+  def __init__(self, shape, bufferSize=1000000):
+    self.shape = tuple(shape)
+    self.cells = numpy.zeros(0, dtype=numpy.int64)
+    self.values = numpy.zeros(0)
+    self.bufferSize = bufferSize
+    self.pending = []
+    self.numPending = 0
+
+  def __len__(self):
+    return(self.shape[0])
+
+  def add(self, cells, weight):
+    #buffer flat cell numbers and weights, merged when the buffer is full
+    self.pending.append((numpy.asarray(cells, dtype=numpy.int64), numpy.array(weight, dtype=numpy.float64)))
+    self.numPending = self.numPending + len(cells)
+    if self.numPending >= self.bufferSize:
+      self.merge()
+
+  def merge(self):
+    if self.numPending == 0:
+      return
+    cells = numpy.concatenate([self.cells] + [p[0] for p in self.pending])
+    values = numpy.concatenate([self.values] + [p[1] for p in self.pending])
+    self.cells, inverse = numpy.unique(cells, return_inverse=True)
+    self.values = numpy.bincount(inverse.reshape(-1), weights=values, minlength=len(self.cells))
+    self.pending = []
+    self.numPending = 0
+
+  def __getitem__(self, period):
+    self.merge()
+    numRows, numCols = self.shape[1], self.shape[2]
+    start, end = numpy.searchsorted(self.cells, [period * numRows * numCols, (period + 1) * numRows * numCols])
+    cells = self.cells[start:end] - period * numRows * numCols
+    return(scipy.sparse.csr_matrix((self.values[start:end], (cells // numCols, cells % numCols)), shape=(numRows, numCols)))
+
+  def sum(self):
+    self.merge()
+    return(self.values.sum())
+
+class TripMatrixBuilder:
+  """
+    Accumulates CT-RAMP trips into TAZ auto, TAP transit and TAP parking matrices.
+    crosswalk is a zoneCrosswalk.ZoneCrosswalk whose TAZ order is the auto matrix
+    order, whose TAP order is the transit matrix order and whose TAP TAZs are used
+    for the drive leg of PNR/KNR trips.
+  """
+  def __init__(self, crosswalk, timePeriodStarts, expansionFactor,
+    transitEverywhere=False, teAutoFactor=0.0, teSov=0.0, teHov2=0.0, teHov3=0.0):
+
+    self.timePeriodStarts = numpy.asarray(timePeriodStarts)
+    self.expansionFactor = expansionFactor #already inverted, i.e. 1 / sample rate
+    self.transitEverywhere = transitEverywhere
+    self.teSov = teSov * teAutoFactor
+    self.teHov2 = teHov2 * teAutoFactor
+    self.teHov3 = teHov3 * teAutoFactor
+
+    self.crosswalk = crosswalk
+    numTazs, numTaps = len(crosswalk.taz), len(crosswalk.tap)
+
+    numPeriods = len(self.timePeriodStarts)
+    self.matrices = dict()
+    for table in AUTO_TABLES:
+      self.matrices[table] = numpy.zeros((numPeriods, numTazs, numTazs))
+    for table in TAP_TABLES:
+      self.matrices[table] = SparseMatrixStack((numPeriods, numTaps, numTaps))
+    self.tapParks = numpy.zeros(numTaps)
+
+  def timePeriods(self, dept):
+    #same result as whichTimePeriod for each departure period
+    return(numpy.searchsorted(self.timePeriodStarts, dept, side="right") - 1)
+
+  def mazToTaz(self, maz):
+    return(self.crosswalk.seqMazToTazIndex(maz))
+
+  def tapIndex(self, tap):
+    return(self.crosswalk.tapIndex(tap))
+
+  def addAutoTrips(self, trips, modes, table, weight):
+    sel = numpy.isin(trips["mode"], modes)
+    if not sel.any():
+      return
+    dmaz = numpy.where(trips["pmaz"][sel] > 0, trips["pmaz"][sel], trips["dmaz"][sel]) #switch destination zone to parking zone
+    w = weight[sel] if numpy.ndim(weight) > 0 else weight
+    accumulate(self.matrices[table], self.timePeriods(trips["dept"][sel]),
+      self.mazToTaz(trips["omaz"][sel]), self.mazToTaz(dmaz), w)
+
+  def addTransitTrips(self, trips, sel, weight):
+    #tap-tap demand by skim set
+    tod = self.timePeriods(trips["dept"][sel])
+    o = self.tapIndex(trips["otap"][sel])
+    d = self.tapIndex(trips["dtap"][sel])
+    setid = trips["set"][sel]
+    w = weight[sel] if numpy.ndim(weight) > 0 else numpy.full(len(tod), weight)
+    for i in range(len(TAP_TABLES)):
+      s = setid == i
+      accumulate(self.matrices[TAP_TABLES[i]], tod[s], o[s], d[s], w[s])
+
+  def driveLegs(self, trips, sel):
+    #taz indexes of the drive leg between home end and station tap
+    inbound = trips["inbound"][sel] != 0
+    stationTap = self.tapIndex(numpy.where(inbound, trips["dtap"][sel], trips["otap"][sel]))
+    stationTaz = self.crosswalk.tapIndexToTazIndex(stationTap)
+    homeTaz = self.mazToTaz(numpy.where(inbound, trips["dmaz"][sel], trips["omaz"][sel]))
+    o = numpy.where(inbound, stationTaz, homeTaz)
+    d = numpy.where(inbound, homeTaz, stationTaz)
+    return(self.timePeriods(trips["dept"][sel]), o, d, inbound)
+
+  def addParks(self, trips, sel, inbound):
+    #outbound pnr trip parks at lot
+    otap = self.tapIndex(trips["otap"][sel][~inbound])
+    self.tapParks += numpy.bincount(otap, minlength=len(self.tapParks)) * self.expansionFactor
+
+  def addIndivTrips(self, trips):
+    ef = self.expansionFactor
+    mode = trips["mode"]
+
+    self.addAutoTrips(trips, [SOV], "sov", ef)
+    self.addAutoTrips(trips, [SOVTOLL], "sovtoll", ef)
+
+    #escort trips: ignore escortee trip, do not discount chauffeur trip by occupancy
+    escort = (trips["oesc"] > 0) | (trips["desc"] > 0)
+    chauffeur = trips["dpnum"] == trips["pnum"]
+    hov2Weight = ef * numpy.where(escort, chauffeur * 1.0, 1.0 / HOV2OCC)
+    hov3Weight = ef * numpy.where(escort, chauffeur * 1.0, 1.0 / HOV3OCC)
+    self.addAutoTrips(trips, [HOV2], "hov2", hov2Weight)
+    self.addAutoTrips(trips, [HOV2TOLL], "hov2toll", hov2Weight)
+    self.addAutoTrips(trips, [HOV3], "hov3", hov3Weight)
+    self.addAutoTrips(trips, [HOV3TOLL], "hov3toll", hov3Weight)
+
+    #transit
+    self.addTransitTrips(trips, numpy.isin(mode, [WLK_TRN, PNR_TRN, KNR_TRN]), ef)
+
+    #add transit everywhere demand to auto matrices
+    if self.transitEverywhere:
+      sel = (mode == WLK_TRN) & (trips["set"] == 0)
+      tod = self.timePeriods(trips["dept"][sel])
+      o = self.mazToTaz(trips["omaz"][sel])
+      d = self.mazToTaz(trips["dmaz"][sel])
+      accumulate(self.matrices["sov"], tod, o, d, ef * self.teSov)
+      accumulate(self.matrices["hov2"], tod, o, d, ef * self.teHov2 / HOV2OCC)
+      accumulate(self.matrices["hov3"], tod, o, d, ef * self.teHov3 / HOV3OCC)
+
+    #add drive trip to station
+    sel = mode == PNR_TRN
+    tod, o, d, inbound = self.driveLegs(trips, sel)
+    accumulate(self.matrices["sov"], tod, o, d, ef)
+    self.addParks(trips, sel, inbound)
+
+    sel = mode == KNR_TRN
+    tod, o, d, inbound = self.driveLegs(trips, sel)
+    accumulate(self.matrices["hov2"], tod, o, d, ef / HOV2OCC)
+
+  def addJointTrips(self, trips):
+    ef = self.expansionFactor
+    mode = trips["mode"]
+    numPart = trips["num_participants"]
+
+    #joint auto trips are vehicle trips, no occupancy discount
+    self.addAutoTrips(trips, [SOV], "sov", ef)
+    self.addAutoTrips(trips, [SOVTOLL], "sovtoll", ef)
+    self.addAutoTrips(trips, [HOV2], "hov2", ef)
+    self.addAutoTrips(trips, [HOV2TOLL], "hov2toll", ef)
+    self.addAutoTrips(trips, [HOV3], "hov3", ef)
+    self.addAutoTrips(trips, [HOV3TOLL], "hov3toll", ef)
+
+    #transit person trips
+    self.addTransitTrips(trips, numpy.isin(mode, [WLK_TRN, PNR_TRN, KNR_TRN]), ef * numPart)
+
+    #add transit everywhere demand to auto matrices, discounting by occupancy not required
+    if self.transitEverywhere:
+      sel = (mode == WLK_TRN) & (trips["set"] == 0)
+      tod = self.timePeriods(trips["dept"][sel])
+      o = self.mazToTaz(trips["omaz"][sel])
+      d = self.mazToTaz(trips["dmaz"][sel])
+      accumulate(self.matrices["sov"], tod, o, d, ef * self.teSov)
+      accumulate(self.matrices["hov2"], tod, o, d, ef * self.teHov2)
+      accumulate(self.matrices["hov3"], tod, o, d, ef * self.teHov3)
+
+    #add drive trip to station by party size
+    for drvMode in [PNR_TRN, KNR_TRN]:
+      sel = mode == drvMode
+      tod, o, d, inbound = self.driveLegs(trips, sel)
+      two = numPart[sel] == 2
+      accumulate(self.matrices["hov2"], tod[two], o[two], d[two], ef)
+      accumulate(self.matrices["hov3"], tod[~two], o[~two], d[~two], ef)
+      if drvMode == PNR_TRN:
+        self.addParks(trips, sel, inbound)
+
+class NmTripMatrixBuilder:
+  """
+    Accumulates CT-RAMP walk and bike trips into MAZ matrices.  crosswalk is a
+    zoneCrosswalk.ZoneCrosswalk whose MAZ order is the matrix order.
+  """
+  def __init__(self, crosswalk, timePeriodStarts, expansionFactor):
+    self.timePeriodStarts = numpy.asarray(timePeriodStarts)
+    self.expansionFactor = expansionFactor #already inverted, i.e. 1 / sample rate
+    self.crosswalk = crosswalk
+    numMazs = len(crosswalk.maz)
+
+    numPeriods = len(self.timePeriodStarts)
+    self.matrices = dict()
+    for table in ["walk","bike"]:
+      self.matrices[table] = SparseMatrixStack((numPeriods, numMazs, numMazs))
+
+  def addTrips(self, trips, weight):
+    for table, tripMode in [("walk",WALK), ("bike",BIKE)]:
+      sel = trips["mode"] == tripMode
+      w = weight[sel] if numpy.ndim(weight) > 0 else weight
+      tod = numpy.searchsorted(self.timePeriodStarts, trips["dept"][sel], side="right") - 1
+      o = self.crosswalk.seqMazIndex(trips["omaz"][sel])
+      d = self.crosswalk.seqMazIndex(trips["dmaz"][sel])
+      accumulate(self.matrices[table], tod, o, d, w)
+
+  def addIndivTrips(self, trips):
+    self.addTrips(trips, self.expansionFactor)
+
+  def addJointTrips(self, trips):
+    #person trips
+    self.addTrips(trips, self.expansionFactor * trips["num_participants"])
+
+class BuilderGroup:
+  """
+    Several builders fed from one read of the trip files.  Each spec is a
+    (builder class, builder arguments) pair; the trip columns read must cover
+    the columns of every builder.  matrices holds the matrices of all builders,
+    whose table names do not overlap.
+  """
+  def __init__(self, *specs):
+    self.builders = [builderClass(*builderArgs) for builderClass, builderArgs in specs]
+    self.matrices = dict()
+    for builder in self.builders:
+      self.matrices.update(builder.matrices)
+      if hasattr(builder, "tapParks"):
+        self.tapParks = builder.tapParks
+
+  def addIndivTrips(self, trips):
+    for builder in self.builders:
+      builder.addIndivTrips(trips)
+
+  def addJointTrips(self, trips):
+    for builder in self.builders:
+      builder.addJointTrips(trips)
+
+def partialMatrices(builder):
+  #non-zero cells and values of each builder matrix, compact to return from a worker
+  partial = dict()
+  for table in builder.matrices:
+    mat = builder.matrices[table]
+    if isinstance(mat, SparseMatrixStack):
+      mat.merge()
+      partial[table] = (mat.cells, mat.values)
+    else:
+      cells = numpy.flatnonzero(mat)
+      partial[table] = (cells, mat.reshape(-1)[cells])
+  return(partial)
+
+def addPartialMatrices(builder, partial):
+  for table in partial:
+    cells, values = partial[table]
+    mat = builder.matrices[table]
+    if isinstance(mat, SparseMatrixStack):
+      mat.add(cells, values)
+    else:
+      mat.reshape(-1)[cells] += values
+
+def ingestPart(task):
+  #worker: build partial matrices for one byte range of one trip file
+  builderClass, builderArgs, method, fileName, columns, byteRange, chunkSize = task
+  builder = builderClass(*builderArgs)
+  for trips in readTripChunks(fileName, columns, chunkSize, byteRange):
+    getattr(builder, method)(trips)
+  return(partialMatrices(builder), getattr(builder, "tapParks", None))
+
+def ingest(builder, builderArgs, files, numWorkers=1, chunkSize=DEFAULT_CHUNK_SIZE):
+  """
+    Read trip files into builder.  files is a list of (builder method, file name,
+    columns).  With more than one worker each file is split into numWorkers byte
+    ranges whose partial matrices are built in a process pool and added to builder
+    in file and range order, so results do not depend on worker scheduling.
+    builderArgs are the arguments builder was created with, so each worker can
+    create an empty copy of it.
+  """
+  if numWorkers <= 1:
+    for method, fileName, columns in files:
+      numTrips = 0
+      for trips in readTripChunks(fileName, columns, chunkSize):
+        getattr(builder, method)(trips)
+        numTrips = numTrips + len(trips["mode"])
+        print("process " + fileName + " record " + str(numTrips))
+    return
+
+  tasks = []
+  for method, fileName, columns in files:
+    for byteRange in splitFile(fileName, numWorkers, list(columns.keys())):
+      tasks.append((type(builder), builderArgs, method, fileName, columns, byteRange, chunkSize))
+  print("process " + str(len(tasks)) + " trip file parts with " + str(numWorkers) + " workers")
+  pool = multiprocessing.Pool(numWorkers)
+  try:
+    results = pool.map(ingestPart, tasks, chunksize=1)
+  finally:
+    pool.close()
+    pool.join()
+  for partial, tapParks in results:
+    addPartialMatrices(builder, partial)
+    if tapParks is not None:
+      builder.tapParks += tapParks
@@ -0,0 +1,274 @@
+#Southern Oregon ABM VDF link data
+#Intersecting facility class, approach lanes by movement, mid-link and
+#intersection capacity and uncongested signal delay of every link, computed
+#with grouped table operations over node approaches and lane turns
+
+############################################################
+
+import numpy
+
+############################################################
+
+#link ToNodeOrientation codes
+NORTH_SOUTH_ORIENTATIONS = [15,1,3,11,9,7] #NW,N,NE,SW,S,SE, intersecting class from the west/east legs
+EAST_WEST_ORIENTATIONS = [5,13] #E,W, intersecting class from the north/south legs
+
+#in link orientations of each leg, later ones take precedence
+WEST_LEG = ["ORIENTATIONWEST"]
+EAST_LEG = ["ORIENTATIONEAST"]
+NORTH_LEG = ["ORIENTATIONNORTH","ORIENTATIONNORTHEAST","ORIENTATIONNORTHWEST"]
+SOUTH_LEG = ["ORIENTATIONSOUTH","ORIENTATIONSOUTHEAST","ORIENTATIONSOUTHWEST"]
+
+#green time type by node control type, 0=unknown,1=uncontrolled,2=twowaystop,3=signal,4=allwaystop,5=roundabout,6=twowayyield
+GC_TYPES = {2:"stop", 4:"stop", 5:"roundabout"}
+
+#turn orientation last character
+MOVEMENTS = {"R":1, "T":2, "L":3}
+
+class LinkError(Exception):
+  """
+    Error in the data of one link, link is its position in the link arrays.
+  """
+  def __init__(self, link, message):
+    Exception.__init__(self, message)
+    self.link = link
+
+class VdfLookupTable:
+  """
+    vdf_lookup_table.csv rows (PLANNO,VALUE,<intersecting plan number columns>)
+    as a dense array of values by plan number, value name and column, NaN where
+    a value is missing.  Names are matched as the csv strings.  Index -1 (an
+    unknown name) points at an all NaN last plan, value and column.
+  """
+  def __init__(self, rows):
+    self.plans = dict((plan, i) for i, plan in enumerate(dict.fromkeys(row[0] for row in rows[1:])))
+    self.values = dict((value, i) for i, value in enumerate(dict.fromkeys(row[1] for row in rows[1:])))
+    self.columns = dict((column, j) for j, column in enumerate(rows[0][2:]))
+    self.table = numpy.full((len(self.plans) + 1, len(self.values) + 1, len(rows[0]) - 1), numpy.nan)
+    for row in rows[1:]:
+      for j in range(2, min(len(row), len(rows[0]))):
+        if row[j].strip() != "":
+          self.table[self.plans[row[0]], self.values[row[1]], j - 2] = float(row[j])
+
+  def index(self, names, kind):
+    #positions of plan, value or column names, -1 if not in the table
+    lookup = {"plan":self.plans, "value":self.values, "column":self.columns}[kind]
+    return(numpy.array([lookup.get(name, -1) for name in names], dtype=numpy.int64))
+
+def codeTokens(tokens):
+  #distinct tokens, in order of appearance, and the code of each token
+  tokens = numpy.asarray(tokens, dtype=object).tolist()
+  names = list(dict.fromkeys(tokens))
+  codes = dict(zip(names, range(len(names))))
+  tokenCodes = numpy.fromiter(map(codes.__getitem__, tokens), dtype=numpy.int64, count=len(tokens))
+  return(numpy.array(names, dtype=object), tokenCodes)
+
+def byNode(toMainNo, mainNodeValues, nodeValues):
+  #main node value of links to a main node, else the (regular) node value
+  return(numpy.where(numpy.asarray(toMainNo, dtype=bool), numpy.array(mainNodeValues, dtype=object), numpy.array(nodeValues, dtype=object)))
+
+def named(name, count):
+  #one name for count links, as (names, codes)
+  return(numpy.array([name], dtype=object), numpy.zeros(count, dtype=numpy.int64))
+
+def lookupValues(vdf_lookup, requests):
+  """
+    Values of a list of (links, plans, values, columns) lookup requests, each of
+    plans, values and columns a (names, code of each link) pair, gathered from the
+    VdfLookupTable at once.  Raises LinkError listing all missing combinations.
+  """
+  indices = []
+  for links, plans, values, columns in requests:
+    indices.append([vdf_lookup.index(names, kind)[codes] for (names, codes), kind in [(plans,"plan"), (values,"value"), (columns,"column")]])
+  planIdx, valueIdx, colIdx = [numpy.concatenate([ix[k] for ix in indices] + [numpy.zeros(0, dtype=numpy.int64)]) for k in range(3)]
+  found = vdf_lookup.table[planIdx, valueIdx, colIdx]
+  starts = numpy.cumsum([0] + [len(request[0]) for request in requests])
+
+  #report all missing
+  if numpy.isnan(found).any():
+    missing = dict()
+    firstLink = None
+    for r, (links, plans, values, columns) in enumerate(requests):
+      rows = numpy.flatnonzero(numpy.isnan(found[starts[r]:starts[r+1]]))
+      for row in rows:
+        key = plans[0][plans[1][row]] + ";" + values[0][values[1][row]] + ";" + columns[0][columns[1][row]]
+        missing[key] = missing.get(key, 0) + 1
+      if firstLink is None and len(rows) > 0:
+        firstLink = links[rows[0]]
+    raise LinkError(firstLink, "vdf lookup values not found: " + ", ".join(key + " (" + str(missing[key]) + " links)" for key in missing))
+  return([found[starts[r]:starts[r+1]] for r in range(len(requests))])
+
+def splitLists(texts, links):
+  #comma separated lists of the given links as (link of each token, tokens), with str.split semantics
+  texts = numpy.asarray(texts, dtype=object)[links].tolist()
+  counts = numpy.array([t.count(",") + 1 for t in texts], dtype=numpy.int64)
+  tokens = numpy.array(",".join(texts).split(","), dtype=object) if len(texts) > 0 else numpy.zeros(0, dtype=object)
+  return(numpy.repeat(numpy.asarray(links, dtype=numpy.int64), counts), tokens)
+
+def splitPairs(first, second, links, name):
+  #two aligned comma separated lists of the given links
+  owner, firstTokens = splitLists(first, links)
+  owner2, secondTokens = splitLists(second, links)
+  if len(owner) != len(owner2) or (owner != owner2).any():
+    counts = numpy.bincount(owner, minlength=len(first))[links] - numpy.bincount(owner2, minlength=len(first))[links]
+    raise LinkError(links[numpy.flatnonzero(counts)[0]], name + " lists differ in length")
+  return(owner, firstTokens, secondTokens)
+
+def lastOfRuns(keys):
+  #position of the last of each run of equal keys
+  return(numpy.flatnonzero(numpy.r_[keys[1:] != keys[:-1], True]) if len(keys) > 0 else numpy.zeros(0, dtype=numpy.int64))
+
+def intersectingClass(links, planStr, tnOrient, tnode_fcs, tnode_orient):
+  #intersecting facility class of each link, the plan number string if all in links have one or two
+  #plan numbers and else an int from the compass orientation of the in links
+  numLinks = len(planStr)
+  owner, fcs, orients = splitPairs(tnode_fcs, tnode_orient, links, "in link plan number and orientation")
+  real = fcs != "998" #skip if not a real intersection
+  owner, fcs, orients = owner[real], fcs[real], orients[real]
+  int_fc = numpy.zeros(numLinks, dtype=object)
+
+  #distinct plan numbers of each link
+  fcNames, fcCodes = codeTokens(fcs)
+  pairs = numpy.unique(owner * len(fcNames) + fcCodes)
+  pairLink, pairFc = pairs // max(len(fcNames), 1), pairs % max(len(fcNames), 1)
+  numClasses = numpy.bincount(pairLink, minlength=numLinks)
+
+  #if all same, the first
+  first = numpy.flatnonzero(numpy.r_[True, owner[1:] != owner[:-1]]) if len(owner) > 0 else numpy.zeros(0, dtype=numpy.int64)
+  same = numClasses[owner[first]] == 1
+  int_fc[owner[first][same]] = fcs[first][same]
+
+  #if just one different, the one that is not the link's own
+  other = (numClasses[pairLink] == 2) & (fcNames[pairFc] != planStr[pairLink])
+  otherCount = numpy.bincount(pairLink[other], minlength=numLinks)
+  if (otherCount > 1).any():
+    raise LinkError(numpy.flatnonzero(otherCount > 1)[0], "link plan number not among intersecting plan numbers")
+  int_fc[pairLink[other]] = fcNames[pairFc[other]]
+
+  #else by compass orientation, the last in link of each orientation
+  compassLinks = links[(numClasses[links] != 1) & (numClasses[links] != 2)]
+  legs = dict()
+  for leg, orientations in [("west",WEST_LEG), ("east",EAST_LEG), ("north",NORTH_LEG), ("south",SOUTH_LEG)]:
+    legs[leg] = numpy.full(numLinks, 999, dtype=numpy.int64)
+    for orientation in orientations:
+      rows = numpy.flatnonzero((orients == orientation) & (numClasses[owner] != 1) & (numClasses[owner] != 2))
+      rows = rows[lastOfRuns(owner[rows])]
+      legs[leg][owner[rows]] = [int(f) for f in fcs[rows]]
+  ns = compassLinks[numpy.isin(tnOrient[compassLinks], NORTH_SOUTH_ORIENTATIONS)]
+  ew = compassLinks[numpy.isin(tnOrient[compassLinks], EAST_WEST_ORIENTATIONS)]
+  int_fc[ns] = numpy.minimum(legs["west"][ns], legs["east"][ns]).tolist() #take higher order fc
+  int_fc[ew] = numpy.minimum(legs["north"][ew], legs["south"][ew]).tolist()
+  return(int_fc[links])
+
+def approachLanes(links, tnode_fnorient, tnode_turnorient, tnode_laneturn_orients, tnode_laneturn_laneno):
+  #exclusive right, shared or exclusive thru and exclusive left lanes of each link
+  numLinks = len(tnode_fnorient)
+  turnOwner, turnToOrients, turnOrients = splitPairs(tnode_fnorient, tnode_turnorient, links, "turn")
+  laneOwner, laneTurnOrients, laneNos = splitPairs(tnode_laneturn_orients, tnode_laneturn_laneno, links, "lane turn")
+  orientNames, orientCodes = codeTokens(numpy.concatenate((turnToOrients, laneTurnOrients)))
+  numOrients = max(len(orientNames), 1)
+
+  #lane turns get the movement (1=R,2=T,3=L) of the last right, thru or left turn to their orientation
+  movement = numpy.array([MOVEMENTS.get(t[-1:], 0) for t in turnOrients.tolist()], dtype=numpy.int64)
+  turnKeys = (turnOwner * numOrients + orientCodes[:len(turnOwner)])[movement > 0]
+  order = numpy.argsort(turnKeys, kind="stable")
+  last = order[lastOfRuns(turnKeys[order])]
+  turnKeys, movement = turnKeys[last], movement[movement > 0][last]
+  laneTurnKeys = laneOwner * numOrients + orientCodes[len(turnOwner):]
+  ltr = numpy.zeros(len(laneTurnKeys), dtype=numpy.int64)
+  if len(turnKeys) > 0:
+    found = numpy.minimum(numpy.searchsorted(turnKeys, laneTurnKeys), len(turnKeys) - 1)
+    matched = turnKeys[found] == laneTurnKeys
+    ltr[matched] = movement[found[matched]]
+
+  #count up lanes by movement
+  laneNames, laneCodes = codeTokens(laneNos)
+  lanes, laneIndex = numpy.unique(laneOwner * max(len(laneNames), 1) + laneCodes, return_inverse=True)
+  hasR, hasT, hasL = [numpy.bincount(laneIndex, weights=(ltr == code), minlength=len(lanes)) > 0 for code in [1,2,3]]
+  laneLink = lanes // max(len(laneNames), 1)
+  rl = numpy.bincount(laneLink, weights=hasR & ~hasT & ~hasL, minlength=numLinks).astype(numpy.int64) #exclusive
+  tl = numpy.bincount(laneLink, weights=hasT, minlength=numLinks).astype(numpy.int64) #shared ok
+  ll = numpy.bincount(laneLink, weights=hasL & ~hasR & ~hasT, minlength=numLinks).astype(numpy.int64) #exclusive
+  return(rl[links], tl[links], ll[links])
+
+def linkVdfData(vdf_lookup, planNo, progression_factor, lanes, al, m, mid_link_cap_adj, numlegs, cType, tnOrient,
+  tnMajFlw1, tnMajFlw2, tnode_fcs, tnode_orient, tnode_fnorient, tnode_turnorient, tnode_laneturn_orients, tnode_laneturn_laneno):
+  """
+    VDF data of each link from its attributes and those of its (main) to node:
+    intersecting facility class, exclusive right, thru and exclusive left lanes,
+    mid-link capacity, uncongested signal delay (x100) and intersection capacity.
+    The tnode_ arguments are the comma separated in link, turn and lane turn
+    lists and vdf_lookup a VdfLookupTable.  Returns a dict of lists, 0 where a
+    value does not apply.  All lookup values are gathered at once, before any
+    results are computed, and LinkError is raised for missing lookup values or
+    inconsistent link data.
+  """
+  numLinks = len(planNo)
+  planNo = numpy.array(planNo, dtype=numpy.float64)
+  planValues, planCodes = numpy.unique(planNo, return_inverse=True)
+  planNames = numpy.array([str(int(p)) for p in planValues], dtype=object)
+  planStr = planNames[planCodes]
+  tnOrient = numpy.array(tnOrient)
+  cType = numpy.array(cType)
+  numlegs = numpy.array(numlegs)
+
+  int_fc = numpy.zeros(numLinks, dtype=object) #intersecting facility type
+  rl = numpy.zeros(numLinks, dtype=numpy.int64) #out exclusive right lanes
+  tl = numpy.zeros(numLinks, dtype=numpy.int64) #out shared or exclusive thru lanes
+  ll = numpy.zeros(numLinks, dtype=numpy.int64) #out exclusive left lanes
+  mid_link_cap = numpy.zeros(numLinks) #mid link capacity
+  unc_sig_delay = numpy.zeros(numLinks) #uncongested signal delay
+  int_cap = numpy.zeros(numLinks) #intersection capacity
+
+  #skip if link closed
+  links = numpy.flatnonzero((tnOrient != 0) & (planNo != 998))
+  interstate = links[planNo[links] == 1]
+
+  #intersections
+  intLinks = links[numlegs[links] >= 3]
+  int_fc[intLinks] = intersectingClass(intLinks, planStr, tnOrient, tnode_fcs, tnode_orient)
+
+  #controlled intersection approaches
+  majorFlow = (tnOrient == numpy.array(tnMajFlw1)) | (tnOrient == numpy.array(tnMajFlw2))
+  intLinks = intLinks[~numpy.isin(cType[intLinks], [0,1]) & ~((cType[intLinks] == 2) & majorFlow[intLinks])]
+  gc_type = numpy.array([GC_TYPES.get(c, None) for c in cType[intLinks]], dtype=object)
+  gc_type[cType[intLinks] == 3] = numpy.where(numlegs[intLinks][cType[intLinks] == 3] == 3, "gc3leg", "gc4leg")
+
+  #other control types keep the green time type of the link before, as the link loop did
+  known = numpy.flatnonzero(gc_type != None)
+  previous = numpy.searchsorted(known, numpy.arange(len(intLinks)), side="right") - 1
+  if (previous < 0).any():
+    raise LinkError(intLinks[numpy.argmax(previous < 0)], "no green time type for control type " + str(cType[intLinks][numpy.argmax(previous < 0)]))
+  gc_type = gc_type[known[previous]]
+
+  #all vdf lookup values
+  plans = (planNames, planCodes[links])
+  intPlans = (planNames, planCodes[intLinks])
+  intFcs = codeTokens([str(f) for f in int_fc[intLinks]])
+  mlc, freeway_cap_per_auxlane, cyclelength, gc, tlf, int_app_cap_per_lane = lookupValues(vdf_lookup, [
+    (links, plans, named("thru_cap_per_lane", len(links)), plans),
+    (interstate, (planNames, planCodes[interstate]), named("freeway_cap_per_auxlane", len(interstate)), (planNames, planCodes[interstate])),
+    (intLinks, intPlans, named("cyclelength", len(intLinks)), intFcs),
+    (intLinks, intPlans, codeTokens(gc_type), intFcs),
+    (intLinks, intPlans, named("turn_cap_per_lane", len(intLinks)), intPlans),
+    (intLinks, intPlans, named("int_app_cap_per_lane", len(intLinks)), intPlans)])
+
+  #mid link capacity, adjusted by subtracting user-input adjustment
+  linkLanes = numpy.array(lanes, dtype=numpy.float64)[links]
+  noMedian = numpy.array(numpy.array(m, dtype=object)[links] == 0, dtype=numpy.int64)
+  mid_link_cap[links] = linkLanes * mlc - 300 - 200 * noMedian
+  mid_link_cap[interstate] = numpy.array(lanes, dtype=numpy.float64)[interstate] * mlc[planNo[links] == 1] + numpy.asarray(al, dtype=numpy.float64)[interstate] * freeway_cap_per_auxlane
+  mid_link_cap[links] = mid_link_cap[links] - numpy.array(mid_link_cap_adj, dtype=numpy.float64)[links]
+
+  #uncongested signal delay
+  uniqGc, gcIndex = numpy.unique(gc, return_inverse=True)
+  gcFactor = numpy.array([(1 - g)**2 for g in uniqGc])[gcIndex] #python float power, as the link loop
+  unc_sig_delay[intLinks] = numpy.array(progression_factor, dtype=numpy.float64)[intLinks] * (cyclelength / 2) * gcFactor
+  unc_sig_delay[intLinks] = unc_sig_delay[intLinks] * 100 #scale up since AddVal2 only supports ints
+
+  #right lanes, thru lanes, left lanes at intersection
+  rl[intLinks], tl[intLinks], ll[intLinks] = approachLanes(intLinks, tnode_fnorient, tnode_turnorient, tnode_laneturn_orients, tnode_laneturn_laneno)
+  int_cap[intLinks] = gc * (tl[intLinks] * int_app_cap_per_lane + (rl[intLinks] + ll[intLinks]) * tlf)
+
+  return({"int_fc":int_fc.tolist(), "rl":rl.tolist(), "tl":tl.tolist(), "ll":ll.tolist(),
+    "mid_link_cap":mid_link_cap.tolist(), "unc_sig_delay":unc_sig_delay.tolist(), "int_cap":int_cap.tolist()})
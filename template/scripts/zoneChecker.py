@@ -1,6 +1,7 @@
 import sys, pandas as pd
 sys.path.append("scripts")
 from Properties import Properties
+import zoneCrosswalk
 
 #read properties file
 properties = Properties()
@@ -16,9 +17,8 @@ hhs = pd.read_csv(hhFilename.strip("/"))
 #for hhs, get mazseq and copy maz to maz_initial
 if "maz_initial" not in hhs.columns:
   print("for hhs, get mazseq and copy maz to maz_initial")
-  mazs.index = mazs.NO
   hhs["maz_initial"] = hhs.maz
-  hhs.maz = mazs.loc[hhs.maz].MAZ.tolist()
+  hhs.maz = zoneCrosswalk.fromMazTable(mazs).mazToSeqMaz(hhs.maz)
 else:
   print("maz_initial column already in hhs table so do not renumber mazs")
 
@@ -0,0 +1,111 @@
+#Southern Oregon ABM zone system crosswalk
+#MAZ, SEQMAZ, TAZ and TAP numbers and their matrix positions as dense lookup
+#arrays, built once per run and saved with the outputs for later steps and scripts
+
+############################################################
+
+import os
+import numpy
+
+############################################################
+
+def createLookup(ids):
+  #dense id -> position lookup array, -1 where the id is not found
+  ids = numpy.asarray(ids, dtype=numpy.int64)
+  lookup = numpy.full(ids.max() + 1 if len(ids) > 0 else 1, -1, dtype=numpy.int64)
+  lookup[ids[::-1]] = numpy.arange(len(ids) - 1, -1, -1) #first occurrence wins, like list.index
+  return(lookup)
+
+def applyLookup(lookup, ids, name=None):
+  #translate ids to positions, -1 if not found or raise if a name is given
+  ids = numpy.asarray(ids, dtype=numpy.int64)
+  inRange = (ids >= 0) & (ids < len(lookup))
+  pos = numpy.full(len(ids), -1, dtype=numpy.int64)
+  pos[inRange] = lookup[ids[inRange]]
+  if name is not None and (pos < 0).any():
+    missing = numpy.unique(ids[pos < 0])
+    raise ValueError(name + " not found: " + ",".join(map(str, missing[0:10])))
+  return(pos)
+
+class ZoneCrosswalk:
+  """
+    Zone system crosswalk.  mazs, seqMazs and mazTazs are the MAZ number,
+    sequential MAZ (CT-RAMP) and TAZ of each MAZ in MAZ matrix order.  tazs is
+    the TAZ matrix order (sorted MAZ TAZs if not given) and taps/tapTazs the
+    TAP matrix order and the TAZ of each TAP.  All translations take and return
+    whole arrays and raise ValueError for unknown ids.
+  """
+  def __init__(self, mazs, seqMazs, mazTazs, tazs=None, taps=None, tapTazs=None):
+    self.maz = numpy.asarray(mazs, dtype=numpy.int64)
+    self.seqMaz = numpy.asarray(seqMazs, dtype=numpy.int64)
+    self.mazTaz = numpy.asarray(mazTazs, dtype=numpy.int64)
+    self.mazLookup = createLookup(self.maz)
+    self.seqMazLookup = createLookup(self.seqMaz)
+    self.setTazs(numpy.unique(self.mazTaz) if tazs is None else tazs)
+    self.setTaps([] if taps is None else taps, [] if tapTazs is None else tapTazs)
+
+  def setTazs(self, tazs):
+    #TAZ matrix order, e.g. the zones of the TAZ version
+    self.taz = numpy.asarray(tazs, dtype=numpy.int64)
+    self.tazLookup = createLookup(self.taz)
+    self.mazTazIndex = applyLookup(self.tazLookup, self.mazTaz)
+    if hasattr(self, "tapTaz"):
+      self.tapTazIndex = applyLookup(self.tazLookup, self.tapTaz)
+
+  def setTaps(self, taps, tapTazs):
+    #TAP matrix order and TAZ of each TAP
+    self.tap = numpy.asarray(taps, dtype=numpy.int64)
+    self.tapTaz = numpy.asarray(tapTazs, dtype=numpy.int64)
+    self.tapLookup = createLookup(self.tap)
+    self.tapTazIndex = applyLookup(self.tazLookup, self.tapTaz)
+
+  #matrix positions
+  def mazIndex(self, mazs):
+    return(applyLookup(self.mazLookup, mazs, "MAZ"))
+
+  def seqMazIndex(self, seqMazs):
+    return(applyLookup(self.seqMazLookup, seqMazs, "SEQMAZ"))
+
+  def tazIndex(self, tazs):
+    return(applyLookup(self.tazLookup, tazs, "TAZ"))
+
+  def tapIndex(self, taps):
+    return(applyLookup(self.tapLookup, taps, "TAP"))
+
+  #translations
+  def mazToSeqMaz(self, mazs):
+    return(self.seqMaz[self.mazIndex(mazs)])
+
+  def seqMazToMaz(self, seqMazs):
+    return(self.maz[self.seqMazIndex(seqMazs)])
+
+  def mazToTaz(self, mazs):
+    return(self.mazTaz[self.mazIndex(mazs)])
+
+  def seqMazToTaz(self, seqMazs):
+    return(self.mazTaz[self.seqMazIndex(seqMazs)])
+
+  def seqMazToTazIndex(self, seqMazs):
+    return(applyLookup(self.mazTazIndex, self.seqMazIndex(seqMazs), "MAZ TAZ"))
+
+  def tapToTaz(self, taps):
+    return(self.tapTaz[self.tapIndex(taps)])
+
+  def tapIndexToTazIndex(self, tapIndexes):
+    return(applyLookup(self.tapTazIndex, tapIndexes, "TAP TAZ"))
+
+  def save(self, fileName):
+    folder = os.path.dirname(fileName)
+    if folder != "" and not os.path.exists(folder):
+      os.makedirs(folder)
+    with open(fileName, "wb") as f:
+      numpy.savez(f, maz=self.maz, seqMaz=self.seqMaz, mazTaz=self.mazTaz, taz=self.taz, tap=self.tap, tapTaz=self.tapTaz)
+
+def load(fileName):
+  #crosswalk saved by ZoneCrosswalk.save
+  with numpy.load(fileName) as data:
+    return(ZoneCrosswalk(data["maz"], data["seqMaz"], data["mazTaz"], data["taz"], data["tap"], data["tapTaz"]))
+
+def fromMazTable(mazs):
+  #crosswalk from a MAZ data table (maz_data_export.csv columns NO, MAZ, TAZ)
+  return(ZoneCrosswalk(mazs["NO"], mazs["MAZ"], mazs["TAZ"]))